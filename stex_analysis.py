@@ -9,26 +9,195 @@ This file defines the functions which perform the text analysis itself.
 
 Function Prefix Legend:
     invoke_* : Performs text analysis, returns values intended to map to TextFile
+    ingest_* : Performs every invoke_* pass and stores the results in the TextFile
+    load_* : Reads configuration from the resources directory
 
 Addendum - 
-    You will notice that I iterate through the file line-by-line several times,
-    in different "passes." This is because I reasoned that the performance cost
-    of iterating through every line several times was worth it for the readability
-    and modularity of the functions in this file.
+    You will notice that the analysis is split into several "passes", each
+    going through the file line-by-line. This is for the readability and
+    modularity of the functions in this file.
 
-    It would, technically, be more performant to do this all in a single pass
-    through the file. But for the datasets we're dealing with, which are in 
-    all likelihood <50MB, I reasoned that code quality mattered more.
+    Each pass is a generator which is fed blocks of lines (see _feed_passes),
+    so invoke_* functions can run a single pass, while ingest_file runs all
+    of them side by side and only reads the file once. That also means any
+    stream of text can be analysed, even one which can only be read once
+    (see ingest_stream).
 
 """
 
 # Imports
 import stex_filing as stex
-import stex_json as deserializer
+import stex_vocabulary as vocabulary
 import string
 import math
-from pathlib import Path
-from json import JSONDecodeError
+import functools
+import heapq
+import io
+import os
+import random
+import re
+from collections import Counter
+from typing import TYPE_CHECKING
+
+# stex_language (and with it NumPy) is only imported by the functions which
+# need it, so that importing this file stays cheap.
+if TYPE_CHECKING:
+    import numpy as np
+    from stex_sketch import CountMinSketch
+
+# Characters which make up words, after lowercasing. Everything else is
+# stripped from words before they are counted.
+# This can be expanded on to support other languages, or be
+# adjusted more granularly depending on what characters one
+# considers "part of a word."
+VALID_WORD_CHARACTERS = frozenset("abcdefghijklmnopqrstuvwxyzåäö'-")
+
+# Approximate mode: how many of the most frequent words are reported (with their
+# estimated counts) for frequency tables, how many times as many (but at least how
+# many) are tracked to get those right, and how many distinct words may pile up
+# in a buffer before they are added to the sketches. A full buffer takes up about
+# 200 KB, less than the summary of the tracked words (about 300 KB by default),
+# and flushing it more often than that costs no measurable time.
+DEFAULT_TRACKED_WORDS = 100
+_SPACE_SAVING_FACTOR = 10
+_MINIMUM_SPACE_SAVING_CAPACITY = 1000
+_SKETCH_BUFFER_SIZE = 2048
+
+# Quick-estimate mode: how many blocks of how many bytes are read from random
+# places in a file, and how likely each reported interval is to contain the true value.
+DEFAULT_SAMPLE_BLOCKS = 128
+DEFAULT_SAMPLE_BLOCK_SIZE = 16 * 1024
+DEFAULT_ESTIMATE_CONFIDENCE = 0.95
+
+# Used when resources/stopchars can't be found.
+DEFAULT_SENTENCE_TERMINATORS = '!?.‽'
+
+# When a sentence's text can't cheaply be read back later (see TextFile.is_seekable),
+# this many characters of the shortest and longest sentences are kept instead.
+_SENTENCE_PREVIEW_LENGTH = 1000
+
+# Characters which may come before an abbreviation without being part of it.
+_OPENING_CHARACTERS = '"\'([{«“‘'
+
+# Loaded sentence rules, per path, see load_sentence_rules.
+_SENTENCE_RULES_CACHE = {}
+
+def ingest_file(file: stex.TextFile, approximate: bool = False, top_words: int | None = None) -> stex.TextFile:
+    """
+    Performs every analysis pass on the provided TextFile and stores the results,
+    without printing anything. Used by non-interactive callers (e.g. stex_server.py);
+    the TUI runs the same passes itself to report progress along the way.
+    
+    Arguments:
+        file: TextFile to analyse
+        approximate: count words and trigrams with fixed-size sketches rather than
+                     exact dictionaries (see invoke_approximate_word_frequency_statistics)
+        top_words: only keep track of this many of the most frequent words, in a few hundred
+                   kilobytes at most, however large the file. Implied (with DEFAULT_TRACKED_WORDS)
+                   by approximate.
+    
+    Returns:
+        The same TextFile, now holding all results.
+    """
+    tracked_words = top_words or DEFAULT_TRACKED_WORDS
+    # Streams (and compressed files) can't cheaply be read back later, so the
+    # sentence pass has to keep the text of the sentences it reports.
+    keep_sentence_text = not file.is_seekable()
+    
+    # Every pass is fed the same lines, so the file is only read (and decoded) once.
+    passes = [
+        _basic_statistics_pass(),
+        _approximate_word_frequency_pass(None, None, None, tracked_words, approximate)
+            if approximate or top_words is not None else _word_frequency_pass(),
+        _sentence_pass(20, keep_text=keep_sentence_text, encoding=file.encoding),
+        _character_pass(),
+        _approximate_trigram_pass(65536, None, None) if approximate else _trigram_pass(65536)
+    ]
+    (
+        basic_statistics,
+        word_statistics,
+        sentence_statistics,
+        character_statistics,
+        trigram_statistics
+    ) = _run_passes(file, passes)
+    
+    file.append_basic_statistics(basic_statistics)
+    
+    if approximate or top_words is not None:
+        *word_statistics, word_sketch, distinct_words, top_word_summary = word_statistics
+        file.append_word_frequency_statistics(tuple(word_statistics))
+        file.append_word_frequency_sketches(word_sketch, distinct_words, top_word_summary)
+    else:
+        file.append_word_frequency_statistics(word_statistics)
+    
+    *sentence_statistics, sentence_previews = sentence_statistics
+    file.append_sentence_statistics(tuple(sentence_statistics))
+    if keep_sentence_text:
+        file.append_sentence_previews(sentence_previews)
+    
+    file.append_character_statistics(character_statistics)
+    file.append_language_probabilities(invoke_find_closest_trigram_sample(trigram_statistics))
+    
+    return file
+
+def ingest_stream(source, name: str = '<stream>', approximate: bool = False, top_words: int | None = None,
+                  encoding: str | None = None, strict: bool = False) -> stex.StreamedTextFile:
+    """
+    Counterpart of ingest_file for text which isn't a file on disk: stdin, a pipe,
+    a string in memory, or any iterable of lines. The text is only read once,
+    and never has to be held in memory all at once.
+    
+    Arguments:
+        source: binary stream (e.g. sys.stdin.buffer), text stream (e.g. io.StringIO),
+                or iterable of lines (str or bytes). See stex.StreamedTextFile.
+        name: what to call the text in results
+        approximate, top_words: see ingest_file
+        encoding, strict: how to decode bytes (see stex.TextFile)
+    
+    Returns:
+        StreamedTextFile holding all results, which can be used wherever a TextFile can.
+    """
+    return ingest_file(stex.StreamedTextFile(source, name, encoding, strict), approximate, top_words)
+
+def ingest_file_estimate(file: stex.TextFile, sample_blocks: int = DEFAULT_SAMPLE_BLOCKS,
+                         block_size: int = DEFAULT_SAMPLE_BLOCK_SIZE,
+                         confidence: float = DEFAULT_ESTIMATE_CONFIDENCE, seed: int | None = None) -> stex.TextFile:
+    """
+    Quick-estimate counterpart of ingest_file, for triage of files too large to
+    read in full: estimates the basic and character statistics from a sample of
+    the file (see invoke_estimated_basic_statistics) and stores them, along with
+    their confidence intervals. The other passes are not performed.
+
+    Files no larger than the sample are analysed in full with ingest_file instead.
+    Streams, compressed files and files in archives can't be sampled, since
+    there's no cheap way of skipping ahead in them (see TextFile.is_seekable).
+
+    Returns:
+        The same TextFile, now holding the estimates.
+    """
+    # A file which is in memory already is small enough to simply analyse in full.
+    if file.data is not None:
+        return ingest_file(file)
+    if not file.is_seekable():
+        raise ValueError(f"{file.shortname} can't be estimated, since it can't be read from random places "
+                         "(streams, compressed files and files in archives can only be analysed in full).")
+    if os.path.getsize(file.path) <= sample_blocks * block_size:
+        return ingest_file(file)
+
+    # Both passes should look at the same blocks.
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    basic_statistics, basic_intervals, sampled_bytes = invoke_estimated_basic_statistics(
+        file, sample_blocks, block_size, confidence, seed)
+    character_statistics, character_intervals, _ = invoke_estimated_character_statistics(
+        file, sample_blocks, block_size, confidence, seed)
+
+    file.append_basic_statistics(basic_statistics)
+    file.append_character_statistics(character_statistics)
+    file.append_estimate_intervals(basic_intervals | character_intervals, confidence, sampled_bytes)
+
+    return file
 
 def invoke_basic_statistics(file: stex.TextFile) -> tuple:
     """
@@ -45,43 +214,75 @@ def invoke_basic_statistics(file: stex.TextFile) -> tuple:
         • Total number of characters which are spaces
     """
     
-    file_number_of_lines = 0
-    file_number_of_words = 0
-    file_number_of_characters = 0
-    file_number_of_spaces = 0
-
     # Read file line by line (*not* all at once in memory :D)
-    # Note: errors='replace' will replace faulty unicode characters with a fallback character.
-    with open(file.path, 'r', encoding='utf-8', errors='replace') as f:
-        for line in f:
-            # Remove trailing newline but keep internal spaces
-            line = line.rstrip('\n')
+    # Note: faulty characters are replaced with a fallback character (see TextFile.read_lines).
+    return _run_passes(file, [_basic_statistics_pass()])[0]
 
-            file_number_of_lines += 1
+def invoke_estimated_basic_statistics(file: stex.TextFile, sample_blocks: int = DEFAULT_SAMPLE_BLOCKS,
+                                      block_size: int = DEFAULT_SAMPLE_BLOCK_SIZE,
+                                      confidence: float = DEFAULT_ESTIMATE_CONFIDENCE,
+                                      seed: int | None = None) -> tuple[tuple, dict[str, tuple[float, float]], int]:
+    """
+    Estimates the basic statistics of a (huge) file from randomly placed blocks,
+    rather than reading all of it. The counts in the blocks are scaled up by the
+    size of the file (a ratio estimate, per byte), and the spread between blocks
+    gives a confidence interval for each of them.
 
-            # Split into words (whitespace delimiter)
-            words = line.split()
-            line_number_of_words = len(words)
+    Files smaller than the sample itself are simply read in full.
 
-            # Count spaces. I'm also going to count each
-            # line itself as a space (LF) to better approximate actual
-            # character counts. CRLF need not apply - do not use Windows.
-            file_number_of_spaces += (line.count(' ') + 1)
+    Arguments:
+        file: TextFile to consider
+        sample_blocks: amount of blocks to read
+        block_size: size of each block, in bytes
+        confidence: probability that each interval contains the true value
+        seed: seed of the random block placement, for repeatable estimates
 
-            # Count characters in all words (excluding spaces)
-            line_number_of_characters = sum(len(word) for word in words)
+    Returns:
+        Tuple containing:
+            the same tuple as invoke_basic_statistics, with estimated counts
+            dictionary of intervals (key: TextFile attribute name, value: (low, high)),
+                also for 'average_words_per_line'. Empty if the file was read in full.
+            amount of bytes read (int)
+    """
+    blocks, file_size = _read_sample_blocks(file.path, sample_blocks, block_size, seed)
+    if blocks is None:
+        # Small enough to simply read in full.
+        return invoke_basic_statistics(file), {}, file_size
 
-            # Apply local variables for this line to the file scope
-            file_number_of_words += line_number_of_words
-            file_number_of_characters += line_number_of_characters
+    block_bytes = []
+    block_counts = []
+    for block, is_partial_line in blocks:
+        counts = list(_feed_passes([(block, _decode_block(file, block))], [_basic_statistics_pass()])[0])
+        if is_partial_line:
+            # The last line continues past the block, so it belongs to
+            # (and is counted by) whichever block reaches its end.
+            counts[0] -= 1
+            counts[3] -= 1
+        block_bytes.append(len(block))
+        block_counts.append(counts)
 
-    # Return final ordered tuple
-    return (
-        file_number_of_lines,
-        file_number_of_words,
-        file_number_of_characters,
-        file_number_of_spaces
-    )
+    sampled_bytes = sum(block_bytes)
+    z = _normal_quantile(confidence)
+
+    names = ('number_of_lines', 'number_of_words', 'number_of_characters', 'number_of_spaces')
+    estimates = []
+    intervals = {}
+    for index, name in enumerate(names):
+        sample = [counts[index] for counts in block_counts]
+        estimate, low, high = _ratio_estimate(sample, block_bytes, file_size, sampled_bytes / file_size, z)
+        estimates.append(round(estimate))
+        # Whatever was actually counted is certainly there.
+        intervals[name] = (max(low, sum(sample)), high)
+
+    # Words per line is a ratio of two estimates; its interval comes from the same
+    # blocks, but is scaled by lines rather than bytes.
+    lines = [counts[0] for counts in block_counts]
+    if sum(lines) > 0:
+        words = [counts[1] for counts in block_counts]
+        _, low, high = _ratio_estimate(words, lines, 1, sampled_bytes / file_size, z)
+        intervals['average_words_per_line'] = (max(low, 0.0), high)
+
+    return tuple(estimates), intervals, sampled_bytes
 
 def invoke_word_frequency_statistics(file: stex.TextFile) -> tuple[dict[str,int], dict[int,int]]:
     """    
@@ -93,127 +294,107 @@ def invoke_word_frequency_statistics(file: stex.TextFile) -> tuple[dict[str,int]
             - dictionary of word occurrences (key: word(str), value: occurrences(int))
             - dictionary of word lengths (key: length(int), value: occurrences(int))
     """
+    return _run_passes(file, [_word_frequency_pass()])[0]
 
-    # Since we're analyzing words, let's normalize each word.
-    # We'll convert everything to lowercase, but beyond that,
-    # we only care about characters which actually make up words.
-    # 
-    # This can be expanded on to support other languages, or be
-    # adjusted more granularly depending on what characters one
-    # considers "part of a word."
-    VALID_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzåäö'-")
-
-    # Key: word in lowercase
-    # Value: number of occurrences
-    word_count = {}
-
-    # Key: word length
-    # Value: number of occurrences
-    word_lengths = {}
-
-    # Iterate through text file and populate dictionaries.
-    with open(file.path, 'r', encoding='utf-8', errors='replace') as f:
-        for line in f:
-            words = line.split()
-            for word in words:
-                # Normalize by uncapitalizing and subsequently checking against frozen set.
-                word = word.lower()
-                
-                # NOTE: This used to be a regex check until constrained.
-                # Quote: "Do everything you can to avoid regex" -Tobias Andersson Gidlund (2025-10-31 10:15AM GMT+1)
-                clean_word = "".join(
-                    char for char in word if char in VALID_CHARS
-                )
-                
-                if clean_word:
-                    # Append to both dictionaries
-                    word_count[clean_word] = word_count.get(clean_word, 0) + 1
-                    
-                    length = len(clean_word)
-                    word_lengths[length] = word_lengths.get(length, 0) + 1
+def invoke_approximate_word_frequency_statistics(file: stex.TextFile, error: float | None = None, confidence: float | None = None,
+                                                 precision: int | None = None, tracked_words: int = DEFAULT_TRACKED_WORDS,
+                                                 count_sketch: bool = True) -> tuple:
+    """
+    Approximate counterpart of invoke_word_frequency_statistics, for text with
+    so many distinct words (URLs, hashes, ...) that counting them all exactly
+    doesn't fit in memory. Memory use is fixed by the arguments, no matter how
+    large the file is.
     
-    # Dictionaries are fully populated.
-    # Sort them by values (https://stackoverflow.com/questions/613183/how-do-i-sort-a-dictionary-by-value)
-    sorted_word_count = dict(sorted(word_count.items(), key=lambda item: item[1], reverse=True))
-    sorted_word_lengths = dict(sorted(word_lengths.items(), key=lambda item: item[1], reverse=True))
-
-    return (
-        sorted_word_count,
-        sorted_word_lengths,
-    )
+    Only the most frequent words are kept by name, in a Space-Saving summary
+    (see stex_sketch.py), which guarantees bounds on their counts. Distinct
+    words are counted in a HyperLogLog, and, unless count_sketch is False,
+    all word occurrences in a Count-Min sketch.
+    
+    Arguments:
+        file: TextFile object
+        error: Count-Min estimates are at most error * (total words) too high...
+        confidence: ...with this probability
+        precision: HyperLogLog precision (2^precision registers)
+        None uses the defaults in stex_sketch.
+        tracked_words: how many of the most frequent words to report
+        count_sketch: also count every word in a Count-Min sketch (about 1 MB by default).
+                      Without it, only a few hundred kilobytes are used (about 400 KB
+                      by default), mostly by the Space-Saving summary.
     
-def invoke_sentence_statistics(file: stex.TextFile) -> tuple[str, str, dict[int, int]]:
+    Returns:
+        Tuple of the following:
+            - dictionary of the most frequent words (key: word(str), value: estimated occurrences(int))
+            - dictionary of word lengths (key: length(int), value: occurrences(int)), exact
+            - CountMinSketch of all word occurrences, or None if count_sketch is False
+            - HyperLogLog of all distinct words
+            - SpaceSaving summary of the most frequent words
+    """
+    return _run_passes(file, [_approximate_word_frequency_pass(error, confidence, precision, tracked_words, count_sketch)])[0]
+
+def invoke_sentence_statistics(file: stex.TextFile, extreme_sentences: int = 20) -> tuple[list[tuple[int, int, int]], list[tuple[int, int, int]], dict[int, int]]:
     """
     Performs rudimentary sentence analysis on the provided text file.
     
+    Sentences are not kept in memory. Instead, the shortest and longest
+    sentences are tracked as spans of the file, and their text is only
+    read back from disk once it's actually needed (see TextFile.get_sentence_text).
+    (ingest_file keeps their text for streams and compressed files, see _sentence_pass.)
+    
     Arguments:
         file: TextFile object to consider.
+        extreme_sentences: how many of the shortest and longest sentences to keep.
         
     Returns:
         tuple containing:
-            shortest identified sentence (str)
-            longest identified sentence (str)
+            spans of the shortest identified sentences, shortest first
+            spans of the longest identified sentences, longest first
             dictionary of sentence length distribution (key: length(int), value: occurrences(int))
+        where a span is (start byte, end byte, word count), or for a StreamedTextFile
+        of text rather than bytes, (start character, end character, word count). Of sentences
+        with the same length, the earliest ones in the file are kept.
     """
-    
-    # So, sentence analysis doesn't play nicely with the system we've built so far.
-    # Sentences can spill over across lines, so if we naïvely only check line-by-line
-    # we won't get any valid data.
-    #
-    # My approach here will leave a lot to be desired if I'm honest, since this exact 
-    # breed of "stringbuilder shenanigans" is something I have explicitly avoided up until now.
-    
-    # Define which characters denote the end of a sentence.
-    # Using a set here for O(1) lookup time.
-    # TODO: This is still a little fragile in case this punctuation is used
-    # but not intended to be a full stop, e.g. abbreviations (see what I did there?)
-    # This works for now but word detection could be improved.
-    STOP_CHARS = frozenset('!?.‽')
-    
-    # This stores the current sentence we're working our way through.
-    working_sentence = []
-    
-    # These three will be our 'finals' which are returned as a tuple.
-    shortest_sentence = []
-    longest_sentence = []
-    sentence_distribution = {}
-    
-    # Load file and iterate through it as before.
-    with open(file.path, 'r', encoding='utf-8', errors='replace') as f:
-        for line in f:
-            for word in line.split():
-                # Sentence is still ongoing. Add our word to the building list.
-                working_sentence.append(word)
-                
-                # Here, our standard procedure diverges greatly.
-                for character in word:
-                    if character in STOP_CHARS and len(working_sentence) > 0:
-                        # Commit working sentence to final variables.
-                        finished_sentence_length = len(working_sentence)
-
-                        # TODO: Messy conditional.. updates shortest_sentence if it was empty or if our last finished sentence is shorter.
-                        # Also note that we are only considering sentence length by words, not characters.
-                        # Via this logic, "Greetings, fellow!" is just as long as "Hi Jim."
-                        if finished_sentence_length < len(shortest_sentence) or len(shortest_sentence) == 0:
-                            shortest_sentence = working_sentence.copy()
-                        if finished_sentence_length > len(longest_sentence):
-                            longest_sentence = working_sentence.copy()
-                        
-                        # Update sentence distribution dictionary
-                        sentence_distribution[finished_sentence_length] = sentence_distribution.get(finished_sentence_length, 0) + 1
-                        
-                        # Reset working sentence.
-                        working_sentence = []
-    
-    # Sort distribution directory by frequency of values.
-    sorted_sentence_distribution = dict(sorted(sentence_distribution.items(), key=lambda item: item[1], reverse=True))
+    shortest_sentences, longest_sentences, sentence_distribution, _ = _run_passes(
+        file, [_sentence_pass(extreme_sentences, encoding=file.encoding)])[0]
+    return shortest_sentences, longest_sentences, sentence_distribution
 
-    return (
-        " ".join(shortest_sentence),
-        " ".join(longest_sentence),
-        sorted_sentence_distribution
+def load_sentence_rules(path: str = 'resources/stopchars') -> tuple[tuple[str, ...], frozenset[str]]:
+    """
+    Reads the characters which end a sentence, and the abbreviations which end
+    in one of them without ending the sentence. Results are cached per path.
+
+    The first line of the file lists the terminators, without separators.
+    Every following line holds a single abbreviation (e.g. "Mr."), matched
+    case-sensitively against whole words. Lines starting with # are ignored.
+    If the file doesn't exist, DEFAULT_SENTENCE_TERMINATORS is used with no
+    abbreviations.
+
+    Arguments:
+        path: file to read the rules from
+
+    Returns:
+        Tuple containing:
+            terminator characters (tuple of str)
+            abbreviations (frozenset of str)
+    """
+    if path in _SENTENCE_RULES_CACHE:
+        return _SENTENCE_RULES_CACHE[path]
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        lines = [DEFAULT_SENTENCE_TERMINATORS]
+
+    # dict.fromkeys drops duplicates while keeping the order.
+    terminators = tuple(dict.fromkeys(''.join(lines[0].split()))) if lines else ()
+    abbreviations = frozenset(
+        line.strip() for line in lines[1:]
+        if line.strip() and not line.lstrip().startswith('#')
     )
 
+    _SENTENCE_RULES_CACHE[path] = (terminators, abbreviations)
+    return terminators, abbreviations
+
 def invoke_character_statistics(file: stex.TextFile) -> tuple[dict[str, int], int, int, int, int, int]:
     """
     Iterates through the provided TextFile and returns a dictionary
@@ -232,44 +413,61 @@ def invoke_character_statistics(file: stex.TextFile) -> tuple[dict[str, int], in
             int of other count
     """
 
+    return _run_passes(file, [_character_pass()])[0]
+    
+def invoke_estimated_character_statistics(file: stex.TextFile, sample_blocks: int = DEFAULT_SAMPLE_BLOCKS,
+                                          block_size: int = DEFAULT_SAMPLE_BLOCK_SIZE,
+                                          confidence: float = DEFAULT_ESTIMATE_CONFIDENCE,
+                                          seed: int | None = None) -> tuple[tuple, dict[str, tuple[float, float]], int]:
+    """
+    Estimates the character statistics of a (huge) file from randomly placed
+    blocks, in the same way as invoke_estimated_basic_statistics.
+
+    Characters which never occur in the sampled blocks are missing from the
+    occurrences entirely, so rare characters are best counted exactly.
+
+    Returns:
+        Tuple containing:
+            the same tuple as invoke_character_statistics, with estimated counts
+            dictionary of intervals (key: TextFile attribute name, value: (low, high)).
+                Empty if the file was read in full.
+            amount of bytes read (int)
+    """
+    blocks, file_size = _read_sample_blocks(file.path, sample_blocks, block_size, seed)
+    if blocks is None:
+        return invoke_character_statistics(file), {}, file_size
+
+    block_bytes = []
+    block_counts = []
     character_occurrences = {}
+    for block, _ in blocks:
+        occurrences, *counts = _feed_passes([(block, _decode_block(file, block))], [_character_pass()])[0]
+        for character, occurrences_in_block in occurrences.items():
+            character_occurrences[character] = character_occurrences.get(character, 0) + occurrences_in_block
+        block_bytes.append(len(block))
+        block_counts.append(counts)
 
-    letter_count = 0        # .isalpha()
-    digit_count = 0         # .isdigit()
-    punctuation_count = 0   # in string.punctuation
-    space_count = 0         # .isspace()
-    other_count = 0         # catch-all
+    sampled_bytes = sum(block_bytes)
+    z = _normal_quantile(confidence)
 
-    with open(file.path, 'r', encoding='utf-8', errors='replace') as f:
-        for line in f:
-            for character in line:
-                if character in string.ascii_letters:
-                    letter_count += 1
-                elif character.isspace():
-                    space_count += 1
-                elif character.isdigit():
-                    digit_count += 1
-                elif character in string.punctuation:
-                    punctuation_count += 1
-                else:
-                    other_count += 1
-
-                # Add to occurrences dictionary.
-                character_occurrences[character] = character_occurrences.get(character, 0) + 1
-    
-    # Sort dictionary by values.
-    sorted_character_occurrences = dict(sorted(character_occurrences.items(), key=lambda item: item[1], reverse=True))
+    # Every character is scaled up by the same factor; the intervals
+    # are only worked out for the character types.
+    scale = file_size / sampled_bytes
+    estimated_occurrences = {character: round(occurrences * scale) for character, occurrences in character_occurrences.items()}
+    sorted_character_occurrences = dict(sorted(estimated_occurrences.items(), key=lambda item: item[1], reverse=True))
 
-    return (
-        sorted_character_occurrences,
-        letter_count,
-        digit_count,
-        punctuation_count,
-        space_count,
-        other_count
-    )
-    
-def invoke_trigram_analysis(file: stex.TextFile, maximum_words: int = 65536) -> dict[str, int]:
+    names = ('letter_count', 'digit_count', 'punctuation_count', 'space_count', 'other_count')
+    estimates = []
+    intervals = {}
+    for index, name in enumerate(names):
+        sample = [counts[index] for counts in block_counts]
+        estimate, low, high = _ratio_estimate(sample, block_bytes, file_size, sampled_bytes / file_size, z)
+        estimates.append(round(estimate))
+        intervals[name] = (max(low, sum(sample)), high)
+
+    return (sorted_character_occurrences, *estimates), intervals, sampled_bytes
+
+def invoke_trigram_analysis(file: stex.TextFile, maximum_words: int | None = 65536) -> dict[str, int]:
     """
     Performs trigram analysis on the given TextFile, looking at the beginnings
     and ends of words to obtain word boundary trigrams.
@@ -277,108 +475,106 @@ def invoke_trigram_analysis(file: stex.TextFile, maximum_words: int = 65536) ->
     Arguments:
         file: TextFile to consider
         maximum_words: int, the amount of words to process. diminishing returns after a while.
+                       None processes the entire file.
         
     Returns:
         Tuple containing:
             Dictionary containing trigram occurrences, which can be compared to
             samples of known languages.
     """
+    return _run_passes(file, [_trigram_pass(maximum_words)])[0]
+
+def invoke_approximate_trigram_analysis(file: stex.TextFile, maximum_words: int | None = 65536,
+                                       error: float | None = None, confidence: float | None = None) -> 'CountMinSketch':
+    """
+    Approximate counterpart of invoke_trigram_analysis: counts the same word
+    boundary trigrams, but into a Count-Min sketch of fixed size.
+    The result can be passed to invoke_find_closest_trigram_sample as-is.
     
-    word_boundary_trigrams_occurrences = {}
-    
-    # Keep track of the amount of words we've processed so we break if we exceed maximum_length
-    processed_words = 0
-    
-    with open(file.path, 'r', encoding='utf-8', errors='replace') as f:
-        for line in f:
-            # Strip everything which isn't lowercase ascii (or space)
-            # from the line before proceeding.
-            cleaned_line = "".join(ch.lower() if ch.isalpha() or ch.isspace() else "" for ch in line)
-            
-            if processed_words > maximum_words:
-                # We've reached our limit, abort.
-                break
-            
-            # Proceed as planned
-            for word in cleaned_line.split():
-                processed_words += 1
-                
-                # Is the word too small to be meaningfully split into trigrams?
-                if len(word) <= 3:
-                    # Treat the entire word as a trigram.
-                    # Trust me on this.
-                    word_boundary_trigrams_occurrences[word] = word_boundary_trigrams_occurrences.get(word, 0) + 1
-                    continue
-                
-                # Take both the beginning and ending of the word and append them.
-                # Yes, a word like 'else' will be appended both as '$els' and '$lse',
-                # but this will work for our analysis.
-                beginning_trigram = f'${word[0:3]}'
-                ending_trigram = f'{word[-3:]}$'
-                
-                # Check if the key exists in the dictionary and increment it. Otherwise, add it.
-                word_boundary_trigrams_occurrences[beginning_trigram] = word_boundary_trigrams_occurrences.get(beginning_trigram, 0) + 1
-                word_boundary_trigrams_occurrences[ending_trigram] = word_boundary_trigrams_occurrences.get(ending_trigram, 0) + 1
-    
-    sorted_dict = dict(sorted(word_boundary_trigrams_occurrences.items(), key=lambda item: item[1], reverse=True))
+    Arguments:
+        file: TextFile to consider
+        maximum_words: the amount of words to process, None processes the entire file.
+        error, confidence: see invoke_approximate_word_frequency_statistics
     
-    return sorted_dict
+    Returns:
+        CountMinSketch of trigram occurrences
+    """
+    return _run_passes(file, [_approximate_trigram_pass(maximum_words, error, confidence)])[0]
 
-def invoke_find_closest_trigram_sample(trigrams: dict) -> dict[str, float]:
+def invoke_find_closest_trigram_sample(trigrams: 'dict | CountMinSketch', scorer: str = 'cosine') -> dict[str, float]:
     """
-    Iterates through all language sample Json files available
-    and attempts to find a closest match in terms of trigram distribution
-    to the provided sample dictionary.
+    Compares the provided trigram dictionary against all language sample Json
+    files available, and scores how closely each language matches it in terms
+    of trigram distribution.
     
     This is extensible by adding more language sample files under resources/
     with the naming convention "lang_sample_[x].json" where [x] is the language
     name and the file is generated by the auxiliary trigram_sample_generator.py script.
     
+    All samples are packed into a single matrix (see stex_language.py), so every
+    language is scored in one go rather than one dictionary comparison at a time.
+    
     Arguments:
-        trigrams: dict[str, int] containing keys: trigrams and values: occurrences
+        trigrams: dict[str, int] containing keys: trigrams and values: occurrences,
+                  or a CountMinSketch from invoke_approximate_trigram_analysis
+        scorer: 'cosine' (cosine similarity, default) or 'naive_bayes'
+                (smoothed log-probabilities, converted to posterior probabilities)
     
     Returns:
         Dictionary with key: language name, value: percentage confidence in float
     """
-    # Start by normalizing our unknown trigram dictionary.
-    # This is what we'll compare all candidates to.
-    normalized_trigrams = _normalize_dictionary(trigrams)
+    import stex_language as language
     
-    # We're about to read some pretty large JSON blobs into memory.
-    # First, get a list of paths to the lang_sample_x.json files.
-    resources_directory = Path("resources")
-    # Gets a list of all lang_sample files.
-    paths = list(resources_directory.rglob("lang_sample_*.json"))
+    # The profiles are only read from disk the first time; after that
+    # they are kept in memory by stex_language.
+    profiles = language.load_language_profiles()
     
-    # This will hold our final mappings.
-    results = {}
+    if not isinstance(trigrams, dict):
+        return profiles.score_sketch(trigrams, scorer)
     
-    for lang_sample_path in paths:
-        try:
-            candidate_trigram_sample = deserializer.deserialize_from_file(lang_sample_path)
-        except JSONDecodeError:
-            # File was not valid json, ignore it!
-            continue
-        
-        # candidate_trigram_sample contains mappings of word boundary trigram frequencies
-        # for a known language. The dictionary may look something like this.
-        # '$ste': 3, 'tep$': 3
-        # We want to convert these mappings to percentages in regards to the total
-        # amount of trigrams in the file.
-        normalized_candidate = _normalize_dictionary(candidate_trigram_sample)
-        
-        language_name = lang_sample_path.stem.replace("lang_sample_", "")
+    return profiles.score_trigrams(trigrams, scorer)
+
+def invoke_hashed_ngram_analysis(file: stex.TextFile, n_features: int | None = None, maximum_words: int | None = 65536) -> 'np.ndarray':
+    """
+    Alternative to invoke_trigram_analysis. Counts every character 1-4-gram
+    of every word, hashed into a fixed-length vector. Both the vector and the
+    cost of comparing it to language samples are constant, regardless of
+    how large the file is.
+    
+    Arguments:
+        file: TextFile to consider
+        n_features: length of the resulting vector (default: stex_language.DEFAULT_NGRAM_FEATURES)
+        maximum_words: int, the amount of words to process. diminishing returns after a while.
+                       None processes the entire file.
         
-        # Use cosine similarity to map the similarity of the candidate
-        # to the unknown dictionary. The more equal trigram distribution, 
-        # the higher likelihood of the languages being the same.
-        similarity = _cosine_similarity(normalized_trigrams, normalized_candidate)
-        results[language_name] = similarity
+    Returns:
+        np.ndarray of length n_features, which can be compared to
+        lang_ngrams_*.npy samples of known languages.
+    """
+    import stex_language as language
+    
+    if n_features is None:
+        n_features = language.DEFAULT_NGRAM_FEATURES
+    
+    return language.count_hashed_ngrams(file.read_lines(), n_features, maximum_words)
 
-    # As is customary, sort before returning to avoid restorting later.
-    sorted_results = dict(sorted(results.items(), key=lambda item: item[1], reverse=True))
+def invoke_find_closest_ngram_sample(ngram_vector: 'np.ndarray', scorer: str = 'cosine') -> dict[str, float]:
+    """
+    Counterpart of invoke_find_closest_trigram_sample for hashed n-gram vectors,
+    comparing against the lang_ngrams_[x].npy samples under resources/.
+    
+    Arguments:
+        ngram_vector: np.ndarray as returned by invoke_hashed_ngram_analysis
+        scorer: 'cosine' (default) or 'naive_bayes'
+    
+    Returns:
+        Dictionary with key: language name, value: percentage confidence in float
+    """
+    import stex_language as language
+    
+    profiles = language.load_ngram_profiles()
     
-    return sorted_results
+    return profiles.score_vector(ngram_vector, scorer)
 
 def invoke_cosine_similarity(dictionary_a: dict[any, int], dictionary_b: dict[any, int]) -> float:
     """
@@ -392,11 +588,749 @@ def invoke_cosine_similarity(dictionary_a: dict[any, int], dictionary_b: dict[an
     Returns:
         Similarity.
     """
+    # Word counts of TextFiles share a vocabulary, so they can be compared by
+    # word id - integers are much cheaper to hash than the words themselves.
+    if (isinstance(dictionary_a, vocabulary.WordCounts) and isinstance(dictionary_b, vocabulary.WordCounts)
+            and dictionary_a.vocabulary is dictionary_b.vocabulary):
+        dictionary_a = dictionary_a.id_counts()
+        dictionary_b = dictionary_b.id_counts()
+    
     normalized_dict_a = _normalize_dictionary(dictionary_a)
     normalized_dict_b = _normalize_dictionary(dictionary_b)
     return _cosine_similarity(normalized_dict_a, normalized_dict_b)
 
 # helper functions
+def _normalize_token(token: str) -> tuple[str, tuple[str, ...], int]:
+    """
+    Normalizes a single whitespace-separated token, for both the word and the
+    trigram passes. The same tokens recur all the time, so this is only done
+    once per distinct token in every block (see _Block.token_counts).
+
+    Arguments:
+        token: token as it appears in the text, e.g. "The" or "the,"
+
+    Returns:
+        Tuple containing:
+            clean word, as counted by invoke_word_frequency_statistics (str, may be empty)
+            word boundary trigrams, as counted by invoke_trigram_analysis (tuple, may be empty)
+            length of the clean word (int)
+    """
+    # NOTE: This used to be a regex check until constrained.
+    # Quote: "Do everything you can to avoid regex" -Tobias Andersson Gidlund (2025-10-31 10:15AM GMT+1)
+    clean_word = "".join(
+        char for char in token.lower() if char in VALID_WORD_CHARACTERS
+    )
+    
+    # Trigrams are made from letters only (so "don't" becomes "dont"), exactly
+    # like stex_language.count_word_boundary_trigrams does for a whole line.
+    letters = "".join(char.lower() for char in token if char.isalpha())
+    if not letters:
+        trigrams = ()
+    elif len(letters) <= 3:
+        # Too small to be split, so the entire word is treated as a trigram.
+        trigrams = (letters,)
+    else:
+        trigrams = (f'${letters[0:3]}', f'{letters[-3:]}$')
+    
+    return clean_word, trigrams, len(clean_word)
+
+def _run_passes(file: stex.TextFile, passes: list) -> list:
+    """
+    Reads the file once, feeding every block of lines to every pass.
+    See _feed_passes.
+    """
+    return _feed_passes(file.read_blocks(), passes)
+
+def _feed_passes(blocks, passes: list) -> list:
+    """
+    Runs analysis passes side by side over the same blocks.
+
+    A pass is a generator which is sent one block at a time, as a tuple of
+    (raw bytes of the block, or None if there are none, list of lines),
+    and then None once there are no more. It returns its results when it
+    receives None, or as soon as it has seen enough (e.g. _trigram_pass).
+
+    Arguments:
+        blocks: iterable of blocks, e.g. TextFile.read_blocks()
+        passes: pass generators, not started yet
+
+    Returns:
+        List of the results of every pass, in the same order as passes.
+    """
+    results = [None] * len(passes)
+    unfinished = dict(enumerate(passes))
+    for analysis_pass in passes:
+        next(analysis_pass)
+
+    for block in blocks:
+        # Lets the passes share the work of splitting the block into tokens.
+        block = _Block(block)
+        for index, analysis_pass in list(unfinished.items()):
+            try:
+                analysis_pass.send(block)
+            except StopIteration as finished:
+                results[index] = finished.value
+                del unfinished[index]
+        if not unfinished:
+            # Every pass has what it needs, no point in reading any further.
+            break
+
+    for index, analysis_pass in unfinished.items():
+        try:
+            analysis_pass.send(None)
+        except StopIteration as finished:
+            results[index] = finished.value
+
+    return results
+
+class _Block(tuple):
+    """
+    A block as sent to the passes: (raw bytes, or None, list of lines).
+
+    It also counts the distinct tokens in its lines, and normalizes each of
+    them (see _normalize_token), the first time a pass asks for them. The word
+    and trigram passes then both use the same counts, and a token which occurs
+    a thousand times in the block is still only normalized once.
+    """
+
+    @functools.cached_property
+    def token_counts(self) -> dict[str, tuple[int, str, tuple[str, ...], int]]:
+        """
+        Dictionary with key: token, as split from the lines (e.g. "The" or "the,"),
+        value: tuple of its occurrences in the block, followed by what _normalize_token
+        returns for it. Tokens are in the order they first occur in.
+        """
+        # Splitting the whole block at once gives the same tokens as splitting
+        # every line, and Counter counts them in C.
+        occurrences = Counter(" ".join(self[1]).split())
+        return {token: (count, *_normalize_token(token)) for token, count in occurrences.items()}
+
+    def has_token_counts(self) -> bool:
+        """
+        Returns whether some pass has already asked for token_counts.
+        """
+        return 'token_counts' in self.__dict__
+
+def _word_frequency_pass():
+    """
+    The counting behind invoke_word_frequency_statistics, as a pass (see _run_passes).
+    """
+    # Since we're analyzing words, let's normalize each word.
+    # We'll convert everything to lowercase, but beyond that,
+    # we only care about characters which actually make up words
+    # (see VALID_WORD_CHARACTERS, and _normalize_token which does the work).
+
+    # Key: word in lowercase
+    # Value: number of occurrences
+    word_count = {}
+
+    # Key: word length
+    # Value: number of occurrences
+    word_lengths = {}
+
+    # Iterate through text file and populate dictionaries, a block of
+    # already normalized tokens at a time (see _Block.token_counts).
+    while (block := (yield)) is not None:
+        for occurrences, clean_word, _, length in block.token_counts.values():
+            if length:
+                # Append to both dictionaries
+                word_count[clean_word] = word_count.get(clean_word, 0) + occurrences
+                word_lengths[length] = word_lengths.get(length, 0) + occurrences
+    
+    # Dictionaries are fully populated.
+    # Sort them by values (https://stackoverflow.com/questions/613183/how-do-i-sort-a-dictionary-by-value)
+    sorted_word_count = dict(sorted(word_count.items(), key=lambda item: item[1], reverse=True))
+    sorted_word_lengths = dict(sorted(word_lengths.items(), key=lambda item: item[1], reverse=True))
+
+    return (
+        sorted_word_count,
+        sorted_word_lengths,
+    )
+
+def _approximate_word_frequency_pass(error: float | None, confidence: float | None, precision: int | None,
+                                     tracked_words: int, count_sketch: bool):
+    """
+    The counting behind invoke_approximate_word_frequency_statistics, as a pass (see _run_passes).
+    """
+    import stex_sketch as sketch
+    
+    word_sketch = None
+    if count_sketch:
+        word_sketch = sketch.CountMinSketch.from_error(error or sketch.DEFAULT_ERROR, confidence or sketch.DEFAULT_CONFIDENCE)
+    distinct_words = sketch.HyperLogLog(precision or sketch.DEFAULT_PRECISION)
+    
+    # Tracking more words than we report makes the top ones reliable.
+    top_words = sketch.SpaceSaving(max(tracked_words * _SPACE_SAVING_FACTOR, _MINIMUM_SPACE_SAVING_CAPACITY))
+    
+    # Word lengths are few enough to always be counted exactly.
+    word_lengths = {}
+    
+    # Words are first counted exactly in a small buffer, and only added to the
+    # summaries once the buffer is full. Common words then only have to be
+    # hashed (and looked up) once per buffer rather than once per occurrence.
+    buffer = {}
+    
+    def flush_buffer() -> None:
+        for word, count in buffer.items():
+            # Hash each word once for both sketches.
+            hashed = sketch.hash_item(word)
+            distinct_words.add_hash(hashed)
+            if word_sketch is not None:
+                word_sketch.add_hash(hashed, count)
+        top_words.update(buffer)
+        buffer.clear()
+    
+    while (block := (yield)) is not None:
+        # Same normalized tokens as invoke_word_frequency_statistics
+        for occurrences, clean_word, _, length in block.token_counts.values():
+            if length:
+                buffer[clean_word] = buffer.get(clean_word, 0) + occurrences
+                word_lengths[length] = word_lengths.get(length, 0) + occurrences
+                
+                if len(buffer) >= _SKETCH_BUFFER_SIZE:
+                    flush_buffer()
+    
+    flush_buffer()
+    
+    # Both the Space-Saving count and the Count-Min estimate are upper bounds,
+    # so whichever is lower is the better estimate.
+    most_frequent_words = {}
+    for word, count, _ in top_words.top(tracked_words):
+        if word_sketch is not None:
+            count = min(count, word_sketch.estimate(word))
+        most_frequent_words[word] = count
+    
+    sorted_most_frequent_words = dict(sorted(most_frequent_words.items(), key=lambda item: item[1], reverse=True))
+    sorted_word_lengths = dict(sorted(word_lengths.items(), key=lambda item: item[1], reverse=True))
+    
+    return (
+        sorted_most_frequent_words,
+        sorted_word_lengths,
+        word_sketch,
+        distinct_words,
+        top_words
+    )
+
+def _trigram_pass(maximum_words: int | None):
+    """
+    The counting behind invoke_trigram_analysis, as a pass (see _run_passes).
+    Finishes early once maximum_words have been processed.
+    """
+    
+    word_boundary_trigrams_occurrences = {}
+    
+    # Keep track of the amount of words we've processed so we break if we exceed maximum_length
+    processed_words = 0
+    
+    while (block := (yield)) is not None:
+        # The trigrams of every token come from _normalize_token, which gives
+        # exactly the same features as stex_language.count_word_boundary_trigrams
+        # (used for in-memory strings), but only works them out once per token.
+        for trigrams, occurrences in _get_block_trigrams(block, processed_words, maximum_words):
+            processed_words += occurrences
+            for trigram in trigrams:
+                word_boundary_trigrams_occurrences[trigram] = word_boundary_trigrams_occurrences.get(trigram, 0) + occurrences
+        
+        if maximum_words is not None and processed_words > maximum_words:
+            # We've reached our limit, abort.
+            break
+    
+    sorted_dict = dict(sorted(word_boundary_trigrams_occurrences.items(), key=lambda item: item[1], reverse=True))
+    
+    return sorted_dict
+
+def _approximate_trigram_pass(maximum_words: int | None, error: float | None, confidence: float | None):
+    """
+    The counting behind invoke_approximate_trigram_analysis, as a pass (see _run_passes).
+    Finishes early once maximum_words have been processed.
+    """
+    import stex_sketch as sketch
+    
+    trigram_sketch = sketch.CountMinSketch.from_error(error or sketch.DEFAULT_ERROR, confidence or sketch.DEFAULT_CONFIDENCE)
+    
+    # Counted in a small buffer first, as in invoke_approximate_word_frequency_statistics.
+    buffer = {}
+    processed_words = 0
+    
+    while (block := (yield)) is not None:
+        # Same trigrams as _trigram_pass
+        for trigrams, occurrences in _get_block_trigrams(block, processed_words, maximum_words):
+            processed_words += occurrences
+            for trigram in trigrams:
+                buffer[trigram] = buffer.get(trigram, 0) + occurrences
+            
+            if len(buffer) >= _SKETCH_BUFFER_SIZE:
+                trigram_sketch.update(buffer)
+                buffer.clear()
+        
+        if maximum_words is not None and processed_words > maximum_words:
+            break
+    
+    trigram_sketch.update(buffer)
+    return trigram_sketch
+
+def _get_block_trigrams(block: _Block, processed_words: int, maximum_words: int | None):
+    """
+    Yields the word boundary trigrams of the tokens in a block, for the trigram passes.
+
+    As long as the whole block fits within maximum_words, every distinct token is
+    yielded once with its occurrences (see _Block.token_counts). Otherwise it's
+    gone through line by line, one occurrence at a time, stopping after the line
+    which goes over maximum_words, as the passes always have.
+
+    Whether the block fits is only checked if some other pass (e.g. the word pass,
+    in ingest_file) has already counted its tokens. On its own, a trigram pass with
+    a limit goes line by line straight away, as it may only need part of the block.
+
+    Arguments:
+        block: _Block to go through
+        processed_words: words (with trigrams) processed before this block
+        maximum_words: words to process in total, or None for all of them
+
+    Yields:
+        Tuples of (trigrams of a token, occurrences)
+    """
+    if maximum_words is not None:
+        if block.has_token_counts():
+            token_counts = block.token_counts
+            block_words = sum(occurrences for occurrences, _, trigrams, _ in token_counts.values() if trigrams)
+            fits = processed_words + block_words <= maximum_words
+        else:
+            # Filled in as tokens come up, like _Block.token_counts (without the occurrences).
+            token_counts = {}
+            fits = False
+        
+        if not fits:
+            for line in block[1]:
+                if processed_words > maximum_words:
+                    return
+                for word in line.split():
+                    normalized = token_counts.get(word)
+                    if normalized is None:
+                        normalized = token_counts[word] = (None, *_normalize_token(word))
+                    trigrams = normalized[2]
+                    if trigrams:
+                        processed_words += 1
+                        yield trigrams, 1
+            return
+    
+    for occurrences, _, trigrams, _ in block.token_counts.values():
+        if trigrams:
+            yield trigrams, occurrences
+
+def _basic_statistics_pass():
+    """
+    The counting behind invoke_basic_statistics, as a pass (see _run_passes).
+    Also used on the blocks sampled by invoke_estimated_basic_statistics.
+    """
+    file_number_of_lines = 0
+    file_number_of_words = 0
+    file_number_of_characters = 0
+    file_number_of_spaces = 0
+
+    while (block := (yield)) is not None:
+        _, lines = block
+        for line in lines:
+            # Remove trailing newline but keep internal spaces
+            line = line.rstrip('\n')
+
+            file_number_of_lines += 1
+
+            # Split into words (whitespace delimiter)
+            words = line.split()
+            line_number_of_words = len(words)
+
+            # Count spaces. I'm also going to count each
+            # line itself as a space (LF) to better approximate actual
+            # character counts. CRLF need not apply - do not use Windows.
+            file_number_of_spaces += (line.count(' ') + 1)
+
+            # Count characters in all words (excluding spaces)
+            line_number_of_characters = sum(len(word) for word in words)
+
+            # Apply local variables for this line to the file scope
+            file_number_of_words += line_number_of_words
+            file_number_of_characters += line_number_of_characters
+
+    # Return final ordered tuple
+    return (
+        file_number_of_lines,
+        file_number_of_words,
+        file_number_of_characters,
+        file_number_of_spaces
+    )
+
+def _character_pass():
+    """
+    The counting behind invoke_character_statistics, as a pass (see _run_passes).
+    Also used on the blocks sampled by invoke_estimated_character_statistics.
+    """
+    # Characters are only counted while reading - a whole block at a time,
+    # which Counter does in C. What type of character each one is, is worked
+    # out afterwards, once per distinct character rather than once per occurrence.
+    character_occurrences = Counter()
+
+    while (block := (yield)) is not None:
+        _, lines = block
+        character_occurrences.update("".join(lines))
+
+    letter_count = 0        # .isalpha(), so å, é and ő are letters too
+    digit_count = 0         # .isdigit()
+    punctuation_count = 0   # in string.punctuation
+    space_count = 0         # .isspace()
+    other_count = 0         # catch-all
+
+    PUNCTUATION = string.punctuation
+    for character, occurrences in character_occurrences.items():
+        if character.isalpha():
+            letter_count += occurrences
+        elif character.isspace():
+            space_count += occurrences
+        elif character.isdigit():
+            digit_count += occurrences
+        elif character in PUNCTUATION:
+            punctuation_count += occurrences
+        else:
+            other_count += occurrences
+
+    # Sort dictionary by values.
+    sorted_character_occurrences = dict(sorted(character_occurrences.items(), key=lambda item: item[1], reverse=True))
+
+    return (
+        sorted_character_occurrences,
+        letter_count,
+        digit_count,
+        punctuation_count,
+        space_count,
+        other_count
+    )
+
+def _sentence_pass(extreme_sentences: int, keep_text: bool = False, encoding: str | None = None):
+    """
+    The analysis behind invoke_sentence_statistics, as a pass (see _run_passes).
+    Raw blocks are decoded like the file decodes them for the other passes, so
+    encoding is the file's declared encoding, if any (see TextFile.encoding).
+
+    Since a StreamedTextFile can't be read back, keep_text makes the pass hold on
+    to the beginnings of the sentences it keeps, which are returned as a fourth
+    element (dictionary with key: (start, end) of a span, value: text). Otherwise
+    the fourth element is None.
+    """
+    
+    # So, sentence analysis doesn't play nicely with the system we've built so far.
+    # Sentences can spill over across lines, so if we naïvely only check line-by-line
+    # we won't get any valid data.
+    #
+    # This used to build each sentence as a list of words, copying it whenever a new
+    # shortest or longest sentence turned up. A file without punctuation would end up
+    # with the entire document in that list, so now we only remember where the current
+    # sentence started and how many words it has.
+    
+    # Which characters denote the end of a sentence, and which words end in
+    # one without ending the sentence (abbreviations, see what I did there?)
+    terminators, abbreviations = load_sentence_rules()
+    # A terminator, followed by the rest of the word it's in. Matches nothing
+    # at all if there are no terminators.
+    boundary_pattern = re.compile(f'[{re.escape("".join(terminators))}]\\S*' if terminators else r'(?!)')
+    
+    # The sentence we're currently working our way through. Its text is only
+    # kept track of (up to _SENTENCE_PREVIEW_LENGTH) if keep_text is set.
+    sentence_start = 0
+    sentence_words = 0
+    sentence_text = []
+    sentence_text_length = 0
+    
+    # These three will be our 'finals' which are returned as a tuple.
+    # Bounded heaps of (length, -start byte, end byte, text or None), so that no matter how many
+    # sentences there are, we only ever hold on to extreme_sentences of each.
+    # The root of the longest heap is the shortest of the long sentences (and of
+    # those, the latest in the file) - which is exactly the one to replace next.
+    # The shortest heap is the same thing mirrored, with lengths negated.
+    longest_heap = []
+    shortest_heap = []
+    sentence_distribution = {}
+    
+    # Sentences spill over across lines anyway, so rather than going line by line,
+    # we work through blocks of whole lines at a time. Line breaks are just
+    # whitespace between words, as far as sentences are concerned.
+    #
+    # Blocks from a file come with their raw bytes, so we know the byte offset
+    # of everything in them. They're decoded just like the other passes see them
+    # (see _decode_sentence_block), keeping track of which lines were decoded how,
+    # so a part of the block can be encoded back into exactly the bytes it came from.
+    # Blocks of text (from a StreamedTextFile) have no bytes, and their offsets
+    # are counted in characters instead.
+    block_offset = 0
+    while (raw_block_and_lines := (yield)) is not None:
+        raw_block, lines = raw_block_and_lines
+        
+        if raw_block is not None:
+            block, runs = _decode_sentence_block(raw_block, encoding)
+            block_length = len(raw_block)
+        else:
+            block = ''.join(lines)
+            runs = [(0, 0, 'utf-8')]
+            block_length = len(block)
+        # For pure ASCII text (or any text with one byte per character), characters and bytes line up.
+        is_ascii = len(block) == block_length
+        
+        # Otherwise, we convert character positions into byte positions by
+        # encoding the text between the previous position and the next.
+        # Positions only ever move forward, so every character is encoded once.
+        known_character = 0
+        known_byte = 0
+        run_index = 0
+        
+        def to_byte(position: int) -> int:
+            nonlocal known_character, known_byte, run_index
+            # Skip ahead to the run of lines the position is in, whose start is known.
+            while run_index + 1 < len(runs) and runs[run_index + 1][0] <= position:
+                run_index += 1
+                known_character, known_byte, _ = runs[run_index]
+            known_byte += len(block[known_character:position].encode(runs[run_index][2], errors='surrogateescape'))
+            known_character = position
+            return known_byte
+        
+        # Rather than looking at every character of every word, let the regular
+        # expression engine find the terminators (and the rest of the word each
+        # one is in), so only those positions need any further work in Python.
+        # A word with several terminators (e.g. "Really?!") is a single match.
+        cursor = 0
+        for boundary in boundary_pattern.finditer(block):
+            # The whole word containing the terminator is part of the sentence.
+            word_end = boundary.end()
+            segment = block[cursor:word_end]
+            
+            if abbreviations:
+                # Strip any opening quotes or brackets, e.g. "(e.g." is still "e.g."
+                last_word = segment.rsplit(None, 1)[-1].lstrip(_OPENING_CHARACTERS)
+                if last_word in abbreviations:
+                    # Not the end of the sentence after all. Leave the segment
+                    # to be counted along with the rest of the sentence.
+                    continue
+            
+            if sentence_words == 0:
+                # New sentence, starting at its first word.
+                start = cursor + len(segment) - len(segment.lstrip())
+                if not is_ascii:
+                    start = to_byte(start)
+                sentence_start = block_offset + start
+            
+            if keep_text and sentence_text_length < _SENTENCE_PREVIEW_LENGTH:
+                sentence_text.append(segment)
+                sentence_text_length += len(segment)
+            
+            sentence_words += len(segment.split())
+            cursor = word_end
+            
+            end = word_end
+            if not is_ascii:
+                end = to_byte(end)
+            end += block_offset
+            
+            # The text only matters if the sentence is kept (see _sentence_preview).
+            preview = _sentence_preview(sentence_text) if keep_text else None
+            
+            # Note that we are only considering sentence length by words, not characters.
+            # Via this logic, "Greetings, fellow!" is just as long as "Hi Jim."
+            if len(longest_heap) < extreme_sentences:
+                heapq.heappush(longest_heap, (sentence_words, -sentence_start, end, preview))
+            elif sentence_words > longest_heap[0][0]:
+                heapq.heapreplace(longest_heap, (sentence_words, -sentence_start, end, preview))
+            
+            if len(shortest_heap) < extreme_sentences:
+                heapq.heappush(shortest_heap, (-sentence_words, -sentence_start, end, preview))
+            elif sentence_words < -shortest_heap[0][0]:
+                heapq.heapreplace(shortest_heap, (-sentence_words, -sentence_start, end, preview))
+            
+            # Update sentence distribution dictionary
+            sentence_distribution[sentence_words] = sentence_distribution.get(sentence_words, 0) + 1
+            
+            # Reset working sentence.
+            sentence_words = 0
+            if keep_text:
+                sentence_text = []
+                sentence_text_length = 0
+        
+        # Whatever is left of the block belongs to a sentence which continues in the next one.
+        remainder = block[cursor:]
+        remaining_words = len(remainder.split())
+        if remaining_words > 0:
+            if sentence_words == 0:
+                start = cursor + len(remainder) - len(remainder.lstrip())
+                if not is_ascii:
+                    start = to_byte(start)
+                sentence_start = block_offset + start
+            sentence_words += remaining_words
+            if keep_text and sentence_text_length < _SENTENCE_PREVIEW_LENGTH:
+                sentence_text.append(remainder)
+                sentence_text_length += len(remainder)
+        
+        block_offset += block_length
+    
+    # Sort distribution directory by frequency of values.
+    sorted_sentence_distribution = dict(sorted(sentence_distribution.items(), key=lambda item: item[1], reverse=True))
+
+    # Turn the heaps back into spans, most extreme first.
+    shortest_sentences = [(-negative_start, end, -negative_length) for negative_length, negative_start, end, _ in sorted(shortest_heap, reverse=True)]
+    longest_sentences = [(-negative_start, end, length) for length, negative_start, end, _ in sorted(longest_heap, key=lambda item: (-item[0], -item[1]))]
+    
+    previews = None
+    if keep_text:
+        previews = {(-negative_start, end): preview for _, negative_start, end, preview in shortest_heap + longest_heap}
+
+    return (
+        shortest_sentences,
+        longest_sentences,
+        sorted_sentence_distribution,
+        previews
+    )
+
+def _decode_sentence_block(raw_block: bytes, encoding: str | None) -> tuple[str, list[tuple[int, int, str]]]:
+    """
+    Decodes a raw block for the sentence pass the way TextFile.read_lines does:
+    in the declared encoding, or as UTF-8 with stex.FALLBACK_ENCODING for lines
+    which aren't valid UTF-8. Unlike read_lines, line endings are left as they are,
+    and bytes which still can't be decoded become one (surrogate) character each,
+    so that every part of the text encodes back into exactly the bytes it came from.
+
+    Arguments:
+        raw_block: whole lines read from the file
+        encoding: the file's declared encoding, or None
+
+    Returns:
+        Tuple containing:
+            the decoded text (str)
+            list of (character offset, byte offset, encoding) where each run
+            of lines decoded in the same encoding starts, first one at (0, 0)
+    """
+    primary = encoding or 'utf-8'
+    try:
+        # The usual case, the whole block at once.
+        return raw_block.decode(primary), [(0, 0, primary)]
+    except UnicodeDecodeError:
+        pass
+
+    fallback = primary if encoding is not None else stex.FALLBACK_ENCODING
+    parts = []
+    runs = []
+    character_offset = 0
+    byte_offset = 0
+    for raw_line in io.BytesIO(raw_block):
+        try:
+            line, line_encoding = raw_line.decode(primary), primary
+        except UnicodeDecodeError:
+            line, line_encoding = raw_line.decode(fallback, errors='surrogateescape'), fallback
+        
+        if not runs or runs[-1][2] != line_encoding:
+            runs.append((character_offset, byte_offset, line_encoding))
+        parts.append(line)
+        character_offset += len(line)
+        byte_offset += len(raw_line)
+
+    return ''.join(parts), runs
+
+def _sentence_preview(sentence_text: list[str]) -> str:
+    """
+    Joins the parts of a sentence kept by _sentence_pass, with whitespace
+    collapsed (as in TextFile.get_sentence_text), and cut short if need be.
+    """
+    preview = ' '.join(''.join(sentence_text).split())
+    if len(preview) > _SENTENCE_PREVIEW_LENGTH:
+        preview = preview[:_SENTENCE_PREVIEW_LENGTH] + '…'
+    return preview
+
+def _read_sample_blocks(path: str, sample_blocks: int, block_size: int,
+                        seed: int | None = None) -> tuple[list[tuple[bytes, bool]] | None, int]:
+    """
+    Reads blocks from random places in a file: one from each of sample_blocks
+    equally sized stretches of it, so the blocks never overlap and cover the
+    whole file. Each block is trimmed to start at the beginning of a line and
+    to end at the end of one, unless a line is longer than the block.
+
+    Returns:
+        Tuple containing:
+            list of (block, whether it ends partway through a line),
+                or None if the file isn't larger than the sample
+            size of the file in bytes (int)
+    """
+    file_size = os.path.getsize(path)
+    if file_size <= sample_blocks * block_size:
+        return None, file_size
+
+    generator = random.Random(seed)
+    stretch = file_size // sample_blocks
+    blocks = []
+
+    with open(path, 'rb') as f:
+        for index in range(sample_blocks):
+            offset = index * stretch + generator.randrange(stretch - block_size + 1)
+            f.seek(offset)
+            block = f.read(block_size)
+            reaches_end = offset + len(block) >= file_size
+
+            # The first line most likely started before the block, and is counted
+            # by the block it started in (if any). Skip past it.
+            if offset > 0 and b'\n' in block:
+                block = block[block.index(b'\n') + 1:]
+
+            # Likewise, the last line most likely continues past the block.
+            is_partial_line = not reaches_end and not block.endswith(b'\n')
+            if is_partial_line and b'\n' in block:
+                block = block[:block.rindex(b'\n') + 1]
+                is_partial_line = False
+
+            blocks.append((block, is_partial_line))
+
+    return blocks, file_size
+
+def _decode_block(file: stex.TextFile, block: bytes) -> list[str]:
+    """
+    Returns the lines of a sampled block, decoded the same way as a whole file is.
+    """
+    return io.StringIO(file.decode(block), newline=None).readlines()
+
+def _normal_quantile(confidence: float) -> float:
+    """
+    Returns how many standard errors wide (on either side) a confidence interval
+    of the given confidence is, e.g. 1.96 for 0.95.
+    """
+    # statistics (and the fractions and decimal modules it brings along) is only
+    # needed here, so it isn't imported along with this file.
+    import statistics
+    return statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+
+def _ratio_estimate(sample: list[int], sizes: list[int], population_size: float,
+                    sampled_fraction: float, z: float) -> tuple[float, float, float]:
+    """
+    Scales up the amounts counted in a few samples (clusters) of known size to a
+    population of population_size, and works out a confidence interval from how
+    much the ratio varies between samples.
+
+    Arguments:
+        sample: amount counted in each sample
+        sizes: size of each sample (e.g. bytes, or lines)
+        population_size: size of the whole population (1 for the ratio itself)
+        sampled_fraction: how much of the population was sampled (finite population correction)
+        z: standard normal quantile of the interval's confidence
+
+    Returns:
+        Tuple of (estimate, lower bound, upper bound)
+    """
+    count = len(sample)
+    ratio = sum(sample) / sum(sizes)
+    estimate = ratio * population_size
+
+    if count < 2:
+        return estimate, estimate, estimate
+
+    mean_size = sum(sizes) / count
+    residual_variance = sum((amount - ratio * size) ** 2 for amount, size in zip(sample, sizes)) / (count - 1)
+    standard_error = math.sqrt(max(0.0, 1 - sampled_fraction) * residual_variance / count) / mean_size
+
+    margin = z * standard_error * population_size
+    return estimate, max(0.0, estimate - margin), estimate + margin
+
 def _normalize_dictionary(dictionary: dict) -> dict:
     """
     Given a dictionary of type [x, int], this will
@@ -0,0 +1,487 @@
+"""
+
+1DV501 Final Project - SimpleTextAnalysis
+stex_batch.py
+
+Author: Daniel Lind
+
+Non-interactive counterpart of stex_main.py. Analyses any number of
+text files (or directories of them) in parallel worker processes and
+writes the results of each file to an output directory: the same JSON
+as the <E>xport option, and optionally every chart as an image file.
+
+Text files inside tar and zip archives are analysed without extracting them,
+each written to its own results (named after the archive and the file).
+A path of - reads text from standard input, e.g. the output of another program.
+
+Usage:
+    python3 stex_batch.py [files or directories...] <options>
+    some_program | python3 stex_batch.py - <options>
+
+"""
+
+# Imports
+import argparse
+import copy
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import stex_analysis as analyse
+import stex_filing as stex
+import stex_json as serializer
+import stex_prefetch as prefetch
+
+# The path which stands for standard input, and what its results are called.
+STDIN_PATH = '-'
+STDIN_NAME = 'stdin.txt'
+
+# For directories of lots of tiny files, opening, reading and dispatching each
+# file costs as much as analysing it. Files of at most this many bytes are read
+# into memory with a single read (see stex.TextFile), and workers are handed
+# up to this many files at a time.
+DEFAULT_SMALL_FILE_SIZE = 256 * 1024
+MAXIMUM_FILES_PER_TASK = 64
+
+def main(arguments: list[str]) -> int:
+    """
+    Parses command line arguments and processes every file.
+
+    Returns:
+        Exit code (0 if every file was processed)
+    """
+    parser = argparse.ArgumentParser(description='Analyses text files without user interaction.')
+    parser.add_argument('inputs', nargs='+',
+                        help='text files (which may be compressed with gzip, bz2 or xz), or directories to '
+                             'search for .txt files (- reads text from standard input)')
+    parser.add_argument('--output-directory', '-o', default='stex_output',
+                        help='where to write results (default: stex_output)')
+    parser.add_argument('--charts', action='store_true', help='also render every chart to an image file')
+    parser.add_argument('--format', choices=('png', 'svg'), default='png', help='image format of charts')
+    parser.add_argument('--compare', metavar='IMAGE_PATH', default=None,
+                        help='also save a chart comparing the distributions of all files')
+    parser.add_argument('--approximate', action='store_true',
+                        help='count words and trigrams in fixed-size sketches (for huge or messy corpora)')
+    parser.add_argument('--top-words', type=int, default=None, metavar='K',
+                        help='only track the K most frequent words per file, and also write the K '
+                             'most frequent words of all files combined to corpus_top_words.json')
+    parser.add_argument('--estimate', action='store_true',
+                        help='only estimate the basic and character statistics from a sample of each '
+                             'file, with confidence intervals (for quick triage of huge files)')
+    parser.add_argument('--encoding', default=None,
+                        help='encoding of every input file (default: UTF-8, with CP1252 for any '
+                             'line which is not valid UTF-8)')
+    parser.add_argument('--strict', action='store_true',
+                        help='fail files which are not valid in their encoding, rather than '
+                             'replacing what cannot be decoded')
+    parser.add_argument('--small-file-size', type=int, default=DEFAULT_SMALL_FILE_SIZE, metavar='BYTES',
+                        help='read files of at most this many bytes into memory at once (default: 256 KiB, '
+                             '0 to read every file in blocks)')
+    parser.add_argument('--io-concurrency', type=int, default=prefetch.DEFAULT_IO_CONCURRENCY, metavar='N',
+                        help='files read ahead at the same time while others are analysed, shared out '
+                             'between the workers (at least 1 each) (default: %(default)s, 0 to read every '
+                             'file only once it is analysed). Raise it for network filesystems')
+    parser.add_argument('--read-size', type=int, default=prefetch.DEFAULT_READ_SIZE, metavar='BYTES',
+                        help='bytes asked for per read when reading ahead (default: 1 MiB)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes (default: one per CPU)')
+    options = parser.parse_args(arguments)
+
+    if options.estimate and (options.charts or options.compare or options.approximate or options.top_words is not None):
+        parser.error('--estimate only covers the basic and character statistics, and cannot be combined '
+                     'with --charts, --compare, --approximate or --top-words')
+
+    paths = find_text_files(options.inputs)
+    if not paths:
+        print('No text files found.')
+        return 1
+
+    os.makedirs(options.output_directory, exist_ok=True)
+
+    start_time = time.perf_counter()
+    # Counted as they're processed, since an archive holds any number of files.
+    processed = 0
+    failures = 0
+    summaries = []
+
+    results = process_files(paths, options.output_directory, options.charts, options.format,
+                            options.workers, options.approximate, options.top_words,
+                            options.estimate, options.encoding, options.strict,
+                            options.small_file_size, options.io_concurrency, options.read_size)
+    try:
+        # Fails before anything is analysed if two files would overwrite each other's results.
+        results = itertools.chain([next(results)], results)
+    except StopIteration:
+        pass
+    except ValueError as e:
+        print(e)
+        return 1
+
+    for path, error, summary in results:
+        processed += 1
+        if error is None:
+            print(f'  done: {path}')
+            summaries.append(summary)
+        else:
+            failures += 1
+            print(f'FAILED: {path} ({error})')
+
+    if options.top_words is not None and summaries:
+        path = os.path.join(options.output_directory, 'corpus_top_words.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(merge_top_words(summaries, options.top_words), ensure_ascii=False, indent=4))
+        print(f'Saved the {options.top_words:,} most frequent words of all files to {path}')
+
+    if options.compare is not None and summaries:
+        import stex_plotting
+        stex_plotting.use_headless_backend()
+        stex_plotting.plot_comparison(summaries, output_path=options.compare)
+        print(f'Saved comparison of {len(summaries):,} files to {options.compare}')
+
+    elapsed = time.perf_counter() - start_time
+    print(f'Processed {processed - failures:,} of {processed:,} files in {elapsed:.2f}s '
+          f'({processed / elapsed:.1f} files/s). Results are in {options.output_directory}')
+
+    return 0 if failures == 0 else 1
+
+def find_text_files(inputs: list[str]) -> list[str]:
+    """
+    Expands directories into the .txt files (compressed or not, see
+    stex.TEXT_FILE_PATTERNS) and archives of them they contain, recursively.
+    Files (and STDIN_PATH) are passed through as-is.
+    """
+    patterns = stex.TEXT_FILE_PATTERNS + stex.ARCHIVE_PATTERNS
+    paths = []
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            found = (path for pattern in patterns for path in Path(input_path).rglob(pattern))
+            paths.extend(str(path) for path in sorted(found))
+        else:
+            paths.append(input_path)
+    return paths
+
+def process_files(paths: list[str], output_directory: str, charts: bool = False, image_format: str = 'png',
+                  workers: int | None = None, approximate: bool = False, top_words: int | None = None,
+                  estimate: bool = False, encoding: str | None = None, strict: bool = False,
+                  small_file_size: int = DEFAULT_SMALL_FILE_SIZE,
+                  io_concurrency: int = prefetch.DEFAULT_IO_CONCURRENCY, read_size: int = prefetch.DEFAULT_READ_SIZE):
+    """
+    Analyses every file and writes its results, in worker processes if workers > 1.
+
+    Arguments:
+        paths: text files to process
+        output_directory: where to write results
+        charts: also render every chart of every file
+        image_format: 'png' or 'svg'
+        workers: number of worker processes
+        approximate: use the approximate analysis mode (see analyse.ingest_file)
+        top_words: only track this many of the most frequent words (see analyse.ingest_file)
+        estimate: only estimate the basic and character statistics (see analyse.ingest_file_estimate)
+        encoding, strict: how to decode every file (see stex.TextFile)
+        small_file_size: read files of at most this many bytes into memory at once (see stex.TextFile)
+        io_concurrency, read_size: how files are read ahead (see prefetch.read_files_ahead).
+                                   io_concurrency is the limit for all worker processes together,
+                                   each of which gets an equal share of it (but at least 1).
+                                   An io_concurrency of 0 reads every file only once it's analysed.
+
+    Returns:
+        Iterator of (path, error message or None, distribution summary or None),
+        in the same order as paths. See TextFile.get_distribution_summary.
+        Every text file in an archive gets its own result, with the archive
+        and the file within it as its path (e.g. corpus.zip/texts/novel.txt).
+
+    Results are named after the path of each file relative to the directory all
+    files are in (e.g. d1_x.json and d2_x.json for d1/x.txt and d2/x.txt). Raises a
+    ValueError (before anything is analysed) if two files would still get the same name.
+    """
+    # Archives are listed here, so their text files can be handed out to the
+    # workers one by one, like any other file. Each worker reads its own
+    # file straight out of the archive.
+    items = _expand_archives(paths, encoding, strict)
+    output_root = _get_output_root(paths)
+    _check_output_names(items, output_root)
+    options = (output_directory, charts, image_format, approximate, top_words, estimate, encoding, strict,
+               small_file_size, output_root)
+    read_options = (io_concurrency, read_size)
+
+    if workers is None or workers <= 1 or len(items) == 1:
+        _initialize_worker(charts)
+        yield from _process_items(items, options, read_options)
+        return
+
+    # Worker processes can't read our standard input, and compressed tar archives
+    # can only be read from start to end, so those are analysed here while the
+    # workers get on with everything else.
+    worker_items = [item for item in items if not _is_local(item)]
+    if len(worker_items) < len(items):
+        _initialize_worker(charts)
+
+    # Every worker reads ahead in its own thread pool, so the limit is shared out between them.
+    if io_concurrency > 0:
+        read_options = (max(1, io_concurrency // workers), read_size)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker, initargs=(charts,)) as executor:
+        # Several files per task, so dispatching them doesn't cost more than analysing them
+        # (and so that each worker has files to read ahead). A few tasks per worker are
+        # left, so that the work is still spread evenly.
+        files_per_task = max(1, min(MAXIMUM_FILES_PER_TASK, len(worker_items) // (workers * 4)))
+        tasks = [worker_items[start:start + files_per_task] for start in range(0, len(worker_items), files_per_task)]
+        results = itertools.chain.from_iterable(
+            executor.map(_process_task, tasks, [options] * len(tasks), [read_options] * len(tasks)))
+        for item in items:
+            if _is_local(item):
+                yield from _process_item(item, *options)
+            else:
+                yield next(results)
+
+def merge_top_words(summaries: list[dict], top_n: int) -> dict:
+    """
+    Combines the Space-Saving summaries of many files (see get_distribution_summary)
+    into the most frequent words of all of them together.
+
+    Returns:
+        JSON formatted dictionary containing the words (word, occurrences, and the
+        maximum overestimate of those occurrences) and the total number of words.
+    """
+    merged = None
+    for summary in summaries:
+        if merged is None:
+            merged = copy.deepcopy(summary['top_words'])
+        else:
+            merged.merge(summary['top_words'])
+
+    return {
+        'total_words': merged.total,
+        'words': [
+            {'word': word, 'occurrences': count, 'maximum_error': error}
+            for word, count, error in merged.top(top_n)
+        ]
+    }
+
+# helper functions
+def _expand_archives(paths: list[str], encoding: str | None, strict: bool) -> list:
+    """
+    Replaces every archive which can be read in any order (see stex.read_archive)
+    with the text files in it. Other archives (and archives which can't be read,
+    so that the error is reported when they're processed) are left as paths.
+
+    Returns:
+        List of paths and ArchiveMemberTextFiles
+    """
+    items = []
+    for path in paths:
+        if path == STDIN_PATH or not stex.is_archive(path):
+            items.append(path)
+            continue
+
+        try:
+            members = stex.read_archive(path, encoding, strict)
+        except stex.READ_ERRORS:
+            items.append(path)
+            continue
+
+        if isinstance(members, list):
+            items.extend(members)
+        else:
+            # Only readable from start to end, so it's processed as a whole (see _process_item).
+            members.close()
+            items.append(path)
+    return items
+
+def _get_output_root(paths: list[str]) -> str | None:
+    """
+    Returns the directory which every file (or archive) is in, directly or not,
+    which results are named relative to (see _get_output_name). None if there are no files.
+    """
+    directories = [os.path.dirname(os.path.abspath(path)) for path in paths if path != STDIN_PATH]
+    return os.path.commonpath(directories) if directories else None
+
+def _get_output_name(base_name: str, source_path: str | None, output_root: str | None) -> str:
+    """
+    Returns what the results of a file are called: its base name (see TextFile.get_base_name),
+    prefixed by the directories between output_root and the file (or archive) at source_path.
+    """
+    if source_path is None or output_root is None:
+        return base_name
+
+    directory = os.path.relpath(os.path.dirname(os.path.abspath(source_path)), output_root)
+    if directory == os.curdir:
+        return base_name
+    return '_'.join(directory.split(os.sep) + [base_name])
+
+def _check_output_names(items: list, output_root: str | None) -> None:
+    """
+    Raises a ValueError if the results of two items of _expand_archives would be
+    written to the same file. (The text files in compressed tar archives aren't
+    known until they're read, so those can't be checked up front.)
+    """
+    sources = {}
+    for item in items:
+        if isinstance(item, stex.TextFile):
+            base_name, source_path = item.get_base_name(), item.path
+        elif item == STDIN_PATH:
+            base_name, source_path = stex.to_base_name(STDIN_NAME), None
+        elif stex.is_archive(item):
+            continue
+        else:
+            base_name, source_path = stex.to_base_name(os.path.basename(item)), item
+
+        name = _get_output_name(base_name, source_path, output_root)
+        if name in sources:
+            raise ValueError(f'The results of {_get_item_name(sources[name])} and {_get_item_name(item)} '
+                             f'would both be written to {name}.json. Rename one of them, or process them separately.')
+        sources[name] = item
+
+def _is_local(item) -> bool:
+    """
+    Returns True if an item of _expand_archives has to be processed in the main process.
+    """
+    return isinstance(item, str) and (item == STDIN_PATH or stex.is_archive(item))
+
+def _get_item_name(item) -> str:
+    return item.shortname if isinstance(item, stex.TextFile) else item
+
+def _process_task(items: list, options: tuple, read_options: tuple) -> list[tuple[str, str | None, dict | None]]:
+    """
+    Processes a task of several items in a worker process, see _process_items.
+    """
+    return list(_process_items(items, options, read_options))
+
+def _process_items(items: list, options: tuple, read_options: tuple):
+    """
+    Processes items of _expand_archives in this process. Files given by path are
+    read ahead in a thread pool (see prefetch.read_files_ahead) while others are analysed.
+
+    Returns:
+        Iterator of (path, error message or None, distribution summary or None)
+    """
+    io_concurrency, read_size = read_options
+    if io_concurrency <= 0:
+        for item in items:
+            yield from _process_item(item, *options)
+        return
+
+    _, _, _, _, _, _, encoding, strict, small_file_size, _ = options
+    # Only files which would be read into memory anyway (see --small-file-size) are
+    # read ahead; larger ones are only opened ahead, and read in blocks as usual.
+    paths = [item for item in items if _is_prefetchable(item)]
+    read_files = prefetch.read_files_ahead(paths, io_concurrency, read_size, maximum_file_size=small_file_size,
+                                           encoding=encoding, strict=strict)
+
+    for item in items:
+        if not _is_prefetchable(item):
+            yield from _process_item(item, *options)
+            continue
+
+        path, file, error = next(read_files)
+        if error is not None:
+            yield path, _describe_error(error), None
+        else:
+            yield (path, *_process_file(file, *options))
+
+def _is_prefetchable(item) -> bool:
+    """
+    Returns True if an item of _expand_archives is a text file given by path.
+    """
+    return isinstance(item, str) and not _is_local(item)
+
+def _describe_error(error: Exception) -> str:
+    """
+    Describes why a file couldn't be processed, for the output of main.
+    """
+    if isinstance(error, FileNotFoundError):
+        return 'no such file'
+    # Some (e.g. EOFError) come without a message.
+    return str(error) or type(error).__name__
+
+def _process_item(item, *options):
+    """
+    Processes an item of _expand_archives in this process, see _process_file.
+    An archive which is still a path is read from start to end, one text file after the other.
+
+    Returns:
+        Iterator of (path, error message or None, distribution summary or None)
+    """
+    if not _is_local(item) or item == STDIN_PATH:
+        yield (_get_item_name(item), *_process_file(item, *options))
+        return
+
+    _, _, _, _, _, _, encoding, strict, _, _ = options
+    try:
+        members = stex.read_archive(item, encoding, strict)
+    except stex.READ_ERRORS as e:
+        yield item, _describe_error(e), None
+        return
+
+    # A compressed archive may turn out to be truncated or corrupt halfway through,
+    # in which case the rest of it is reported as failed.
+    try:
+        for member in members:
+            # Streamed members don't know which archive they came from, which their results are named after.
+            yield (member.shortname, *_process_file(member, *options, source_path=item))
+    except stex.READ_ERRORS as e:
+        yield item, _describe_error(e), None
+
+def _initialize_worker(charts: bool) -> None:
+    """
+    Prepares a worker process. matplotlib is only imported if charts are rendered,
+    and then with a backend that doesn't need a display.
+    """
+    if charts:
+        import stex_plotting
+        stex_plotting.use_headless_backend()
+
+def _process_file(path: str | stex.TextFile, output_directory: str, charts: bool, image_format: str,
+                  approximate: bool = False, top_words: int | None = None,
+                  estimate: bool = False, encoding: str | None = None, strict: bool = False,
+                  small_file_size: int = 0, output_root: str | None = None,
+                  source_path: str | None = None) -> tuple[str | None, dict | None]:
+    """
+    Analyses a single file (a path, or a TextFile which has been opened already, e.g.
+    from an archive) and writes its results, named by _get_output_name.
+    source_path is the file (or archive) on disk, if the TextFile doesn't know it.
+
+    Returns:
+        Tuple containing:
+            None on success, otherwise a description of what went wrong
+            the file's distribution summary (small enough to send back
+            to the main process, unlike the TextFile), or None on failure
+            or in the quick-estimate mode (which doesn't count words)
+    """
+    try:
+        if isinstance(path, stex.TextFile):
+            file = path
+        elif path == STDIN_PATH:
+            file = stex.StreamedTextFile(sys.stdin.buffer, STDIN_NAME, encoding, strict)
+        else:
+            file = stex.TextFile(path, encoding, strict, small_file_size)
+        if estimate:
+            analyse.ingest_file_estimate(file)
+        else:
+            analyse.ingest_file(file, approximate, top_words)
+    except stex.READ_ERRORS as e:
+        # E.g. a truncated .txt.gz - the file fails, the batch goes on.
+        return _describe_error(e), None
+
+    if source_path is None:
+        source_path = file.path
+    base_name = _get_output_name(file.get_base_name(), source_path, output_root)
+    with open(os.path.join(output_directory, f'{base_name}.json'), 'w', encoding='utf-8') as f:
+        if estimate:
+            f.write(json.dumps(serializer.serialize_estimate_as_dict(file), ensure_ascii=False, indent=4))
+        else:
+            f.write(serializer.serialize_all(file))
+
+    if charts:
+        import stex_plotting
+        stex_plotting.render_file_charts(file, output_directory, image_format, base_name)
+
+    if estimate:
+        return None, None
+    return None, file.get_distribution_summary()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,233 @@
+"""
+
+1DV501 Final Project - SimpleTextAnalysis
+stex_benchmark.py
+
+Author: Daniel Lind
+
+Benchmark tooling. Not part of the program itself - this is used to keep
+an eye on how quickly things start up and how quickly files are analysed.
+
+Import times are measured in a fresh interpreter (python -X importtime),
+since anything already imported in this process would be free. Each module
+has an import-time budget; exceeding it, or dragging in one of the heavy
+modules (NumPy, matplotlib) at import time, makes the run fail.
+
+Function Prefix Legend:
+    measure_* : Performs a measurement and returns the results
+
+The analysis is also timed on compressed copies of the same files, once
+per compression format, to show what decompressing them on the fly costs,
+and on lots of tiny files cut from them, where the cost per file dominates.
+
+Usage:
+    python3 stex_benchmark.py                 (import times + sample_texts/)
+    python3 stex_benchmark.py file.txt ...    (import times + given files)
+
+"""
+
+# Imports
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import stex_analysis as analyse
+import stex_filing as stex
+
+# Maximum cumulative import time, in milliseconds, of modules which have to
+# start quickly. Generous compared to a warm run, since disk caches vary.
+IMPORT_TIME_BUDGETS = {
+    'stex_main': 150,
+    'stex_analysis': 100,
+    'stex_filing': 50,
+}
+
+# Modules which must not be imported until they are actually used.
+HEAVY_MODULES = ('numpy', 'matplotlib')
+
+# The files are cut into (at most) this many files of this many bytes
+# each, to measure how many tiny files are analysed per second.
+SMALL_FILE_COUNT = 1000
+SMALL_FILE_SIZE = 2048
+
+def measure_import_time(module: str, repeats: int = 5) -> tuple[float, list[str]]:
+    """
+    Imports a module in a fresh interpreter several times and
+    reports the fastest cumulative import time.
+
+    Arguments:
+        module: name of the module to import
+        repeats: number of fresh interpreters to start
+
+    Returns:
+        Tuple containing:
+            fastest cumulative import time in milliseconds (float)
+            heavy modules (see HEAVY_MODULES) which were imported along the way
+    """
+    best = None
+    heavy_imports = []
+
+    for _ in range(repeats):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f'Importing {module} failed:\n{completed.stderr}')
+
+        # Lines look like "import time:   self [us] | cumulative | name",
+        # with the name indented according to nesting depth.
+        cumulative = None
+        heavy_imports = []
+        for line in completed.stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative_field, name = line.split('|')
+            name = name.strip()
+            if name == module:
+                cumulative = int(cumulative_field) / 1000
+            if name in HEAVY_MODULES:
+                heavy_imports.append(name)
+
+        if cumulative is not None and (best is None or cumulative < best):
+            best = cumulative
+
+    return best, heavy_imports
+
+def measure_ingest(paths: list[str]) -> list[tuple[str, int, float]]:
+    """
+    Analyses every file with all passes.
+
+    Arguments:
+        paths: text files to analyse
+
+    Returns:
+        List of (file name, size in bytes, seconds taken)
+    """
+    results = []
+    for path in paths:
+        start = time.perf_counter()
+        analyse.ingest_file(stex.TextFile(path))
+        elapsed = time.perf_counter() - start
+        results.append((os.path.basename(path), os.path.getsize(path), elapsed))
+    return results
+
+def measure_compressed_ingest(paths: list[str]) -> list[tuple[str, int, int, float]]:
+    """
+    Compresses every file in each format of stex.COMPRESSION_MAGIC_BYTES (in a
+    temporary directory, not timed), and analyses the compressed copies with all passes.
+
+    Arguments:
+        paths: text files to analyse
+
+    Returns:
+        List of (compression format, total compressed bytes, total text bytes, seconds taken)
+    """
+    import bz2
+    import gzip
+    import lzma
+    openers = {'gzip': (gzip.open, '.gz'), 'bz2': (bz2.open, '.bz2'), 'xz': (lzma.open, '.xz')}
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for compression in stex.COMPRESSION_MAGIC_BYTES:
+            open_compressed, extension = openers[compression]
+            compressed_paths = []
+            for path in paths:
+                compressed_path = os.path.join(directory, os.path.basename(path) + extension)
+                with open(path, 'rb') as source, open_compressed(compressed_path, 'wb') as destination:
+                    shutil.copyfileobj(source, destination)
+                compressed_paths.append(compressed_path)
+
+            compressed_bytes = sum(os.path.getsize(path) for path in compressed_paths)
+            text_bytes = sum(os.path.getsize(path) for path in paths)
+            seconds = sum(seconds for _, _, seconds in measure_ingest(compressed_paths))
+            results.append((compression, compressed_bytes, text_bytes, seconds))
+
+            for path in compressed_paths:
+                os.remove(path)
+
+    return results
+
+def measure_small_files(paths: list[str], in_memory_limit: int) -> tuple[int, float]:
+    """
+    Cuts the files into tiny files (see SMALL_FILE_COUNT) in a temporary
+    directory, and analyses each with all passes.
+
+    Arguments:
+        paths: text files to cut up
+        in_memory_limit: see stex.TextFile
+
+    Returns:
+        Tuple of (number of files, seconds taken)
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        small_paths = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                while len(small_paths) < SMALL_FILE_COUNT and (chunk := f.read(SMALL_FILE_SIZE) + f.readline()):
+                    small_path = os.path.join(directory, f'{len(small_paths)}.txt')
+                    with open(small_path, 'wb') as small_file:
+                        small_file.write(chunk)
+                    small_paths.append(small_path)
+
+        start = time.perf_counter()
+        for path in small_paths:
+            analyse.ingest_file(stex.TextFile(path, in_memory_limit=in_memory_limit))
+        return len(small_paths), time.perf_counter() - start
+
+def main(arguments: list[str]) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks import times and analysis throughput.')
+    parser.add_argument('paths', nargs='*', help='text files to analyse (default: sample_texts/*.txt)')
+    parser.add_argument('--skip-ingest', action='store_true', help='only measure import times')
+    parser.add_argument('--skip-compressed', action='store_true',
+                        help="don't measure the analysis of compressed copies of the files")
+    parser.add_argument('--skip-small-files', action='store_true',
+                        help="don't measure the analysis of tiny files cut from the files")
+    options = parser.parse_args(arguments)
+
+    within_budget = True
+
+    print('Import times (fresh interpreter, best of 5):')
+    for module, budget in IMPORT_TIME_BUDGETS.items():
+        milliseconds, heavy_imports = measure_import_time(module)
+        verdict = 'ok' if milliseconds <= budget and not heavy_imports else 'OVER BUDGET'
+        if verdict != 'ok':
+            within_budget = False
+        note = f' (imports {", ".join(heavy_imports)})' if heavy_imports else ''
+        print(f'  {module:<20} {milliseconds:8.1f} ms  / {budget:4d} ms  {verdict}{note}')
+
+    if not options.skip_ingest:
+        paths = options.paths or [str(path) for path in sorted(Path('sample_texts').glob('*.txt'))]
+
+        print('\nFull analysis (all passes):')
+        total_bytes = 0
+        total_seconds = 0.0
+        for name, size, seconds in measure_ingest(paths):
+            total_bytes += size
+            total_seconds += seconds
+            print(f'  {name:<45} {size / 1e6:7.2f} MB  {seconds:7.2f} s  {size / 1e6 / seconds:6.2f} MB/s')
+        if total_seconds > 0:
+            print(f'  {"Total":<45} {total_bytes / 1e6:7.2f} MB  {total_seconds:7.2f} s  {total_bytes / 1e6 / total_seconds:6.2f} MB/s')
+
+        if not options.skip_compressed:
+            # Throughput is in MB of text (not of compressed data), so it compares directly with the above.
+            print('\nFull analysis of compressed copies (compressed size, MB/s of text):')
+            print(f'  {"none":<8} {total_bytes / 1e6:7.2f} MB  {total_seconds:7.2f} s  {total_bytes / 1e6 / total_seconds:6.2f} MB/s')
+            for compression, compressed_bytes, text_bytes, seconds in measure_compressed_ingest(paths):
+                print(f'  {compression:<8} {compressed_bytes / 1e6:7.2f} MB  {seconds:7.2f} s  {text_bytes / 1e6 / seconds:6.2f} MB/s')
+
+        if not options.skip_small_files:
+            print(f'\nFull analysis of tiny ({SMALL_FILE_SIZE / 1024:g} KiB) files:')
+            for label, in_memory_limit in (('read in blocks', 0), ('read into memory', SMALL_FILE_SIZE * 2)):
+                count, seconds = measure_small_files(paths, in_memory_limit)
+                print(f'  {label:<20} {count:7,} files  {seconds:7.2f} s  {count / seconds:8.1f} files/s')
+
+    return 0 if within_budget else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -11,12 +11,79 @@ and store analysis data.
 Function Prefix Legend:
     append_* : Store data in TextFile object
     get_* : Return some value based on data in TextFile object
+    read_* : Read (and decode) the file itself, or list the files in an archive
 
 """
 
 # Imports
+import codecs
+import io
+import itertools
 import os
-import numpy as np
+import math
+import struct
+import sys
+import zlib
+from array import array
+from lzma import LZMAError
+import stex_vocabulary as vocabulary
+
+# Lines which aren't valid UTF-8 are decoded as this instead,
+# unless the file was given an encoding (see TextFile.read_lines).
+# Most legacy text that isn't UTF-8 is Windows-1252 (or Latin-1, which it extends).
+FALLBACK_ENCODING = 'cp1252'
+
+# Files are read (and decoded) in blocks of whole lines of at least this many bytes.
+_READ_BLOCK_SIZE = 1024 * 1024
+
+# Compressed files are recognised by their first bytes rather than by their name,
+# and decompressed as they're read (see TextFile.open_binary).
+# key: compression format, value: magic bytes which every such file starts with
+COMPRESSION_MAGIC_BYTES = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'xz': b'\xfd7zXZ\x00'
+}
+
+# Everything which reading (and decompressing) a file may raise, for callers which
+# go on with the next file: missing or unreadable files and bad encodings (OSError,
+# ValueError), and truncated or corrupt compressed data (gzip.BadGzipFile is an OSError).
+READ_ERRORS = (OSError, EOFError, ValueError, LZMAError, zlib.error)
+
+# Extensions which compressed text files may have after .txt,
+# and the glob patterns which find all text files, compressed or not.
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.xz')
+TEXT_FILE_PATTERNS = ('*.txt', *(f'*.txt{extension}' for extension in COMPRESSED_EXTENSIONS))
+_MAGIC_BYTES_LENGTH = max(len(magic) for magic in COMPRESSION_MAGIC_BYTES.values())
+
+# Archives of text files which can be analysed without extracting them (see read_archive),
+# and the glob patterns which find them.
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+ARCHIVE_PATTERNS = tuple(f'*{extension}' for extension in ARCHIVE_EXTENSIONS)
+
+# How the members of zip archives may be compressed (as in the zipfile module, which
+# is only imported once an archive is read), and how many bytes are inflated at a time.
+_ZIP_STORED = 0
+_ZIP_DEFLATED = 8
+_INFLATE_CHUNK_SIZE = 64 * 1024
+
+# Letters whose casing is reported (see TextFile.get_count_of_lowercase_and_capitalized_ascii).
+_CASED_LOWERCASE_LETTERS = frozenset('abcdefghijklmnopqrstuvwxyzåäö')
+_CASED_UPPERCASE_LETTERS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZÅÄÖ')
+
+# The bulky analysis results, which TextFile.spill can move to disk. Everything
+# else (counts, averages, names) is small and stays, so listing files doesn't
+# have to read anything back.
+_SPILLABLE_ATTRIBUTES = (
+    'word_occurrences',
+    'word_length_occurrences',
+    'word_length_histogram',
+    'shortest_sentence_spans',
+    'longest_sentence_spans',
+    'sentence_length_distribution',
+    'sentence_length_histogram',
+    'character_occurrences'
+)
 
 class TextFile:
     """
@@ -26,33 +93,237 @@ class TextFile:
     from saved results.
     """
     
-    def __init__(self, filepath: str) -> None:
+    # Only set by the approximate analysis mode (see append_word_frequency_sketches).
+    # When present, word_occurrences only holds the most frequent words, with estimated counts.
+    word_sketch = None
+    distinct_word_sketch = None
+    top_word_summary = None
+
+    # Only set by the quick-estimate mode (see append_estimate_intervals). When present,
+    # the basic and character statistics are estimates from a sample of the file.
+    estimate_intervals = None
+    estimate_confidence = None
+    estimate_sampled_bytes = None
+
+    # Set once the file has been read to the end (see read_lines).
+    replaced_bytes = None
+    fallback_lines = None
+
+    # Compression format of the file (see COMPRESSION_MAGIC_BYTES), or None.
+    compression = None
+
+    # Only set for files which can't cheaply be read back (see is_seekable),
+    # see append_sentence_previews.
+    sentence_previews = None
+
+    # The whole (decompressed) file, for small files read into memory (see __init__).
+    data = None
+
+    # Built on first use, and forgotten whenever new word frequency statistics
+    # are appended (see get_orphan_words and get_unique_words).
+    _orphan_words = None
+    _unique_words = None
+
+    # Where the bulky results are while they're on disk (see spill), or None.
+    spill_path = None
+
+    def __init__(self, filepath: str, encoding: str | None = None, strict: bool = False,
+                 in_memory_limit: int = 0, read_size: int | None = None) -> None:
+        """
+        Arguments:
+            filepath: path to the text file, which may be compressed (see open_binary)
+            encoding: encoding of the file, if known. By default, the file is read as
+                      UTF-8, with FALLBACK_ENCODING for lines which aren't valid UTF-8.
+            strict: raise a ValueError while reading the file (see read_lines) rather
+                    than replacing anything which can't be decoded
+            in_memory_limit: files of at most this many bytes (on disk) are read into
+                             memory right away, with a single read, and never read from
+                             disk again. For lots of tiny files, opening and reading each
+                             one costs more than analysing it.
+            read_size: read files which are read into memory this many bytes at a time,
+                       rather than with a single read (see stex_prefetch)
+        """
         # Before creating an instance of this object, do some basic sanity checks.
         if(not os.path.exists(filepath)):
             raise FileNotFoundError
-        if(not filepath.lower().endswith('.txt')):
+        if(not _strip_compressed_extension(filepath).lower().endswith('.txt')):
             raise ValueError("Extension mismatch. Please provide a text file.")
         
-        # Just because a file ends with .txt doesn't mean it's valid text.
-        # To test it further, we'll open the file as UTF-8 and read the first
-        # few characters. 
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                # This is technically kind of janky, but in any case,
-                # if the final contains binary data in the first 512
-                # characters, we'll flag it as invalid.
-                #
-                # This is also not foolproof. The first 512 bytes could
-                # be perfectly valid while the rest is a corrupted mess.
-                # Short of reading through the entire file ahead of time,
-                # there's not a lot to do about that, so we'll have to
-                # rely on it being caught later.
-                f.read(512) 
-        except UnicodeDecodeError:
-            raise ValueError("File is not valid UTF-8 text. Please provide a valid text file.")
-        
+        # This used to read the first 512 characters as UTF-8 to make sure the file
+        # is valid text, which didn't say anything about the rest of the file (and
+        # turned away perfectly good Latin-1 text). The file is validated as it's
+        # read instead, see read_lines.
         self.path = filepath
         self.shortname = os.path.basename(self.path)
+        self.encoding = _normalize_encoding(encoding)
+        self.strict = strict
+
+        if in_memory_limit > 0:
+            self.data = _read_small_file(filepath, in_memory_limit, read_size)
+
+        if self.data is not None:
+            # Decompressed right away, so the rest works just as for any other file in memory.
+            self.compression = _detect_compression(self.data)
+            if self.compression is not None:
+                self.data = _decompress(self.data, self.compression)
+        else:
+            with open(filepath, 'rb') as f:
+                self.compression = _detect_compression(f.read(_MAGIC_BYTES_LENGTH))
+
+    # ----------- READING FUNCTIONS -----------
+    def open_binary(self):
+        """
+        Opens the file for reading bytes. Compressed files are decompressed as
+        they're read, so it's never necessary to decompress them to disk first.
+        Files read into memory (see __init__) are read from there.
+        """
+        if self.data is not None:
+            return io.BytesIO(self.data)
+
+        # The decompression modules are only imported when they're needed.
+        match self.compression:
+            case 'gzip':
+                import gzip
+                return gzip.open(self.path, 'rb')
+            case 'bz2':
+                import bz2
+                return bz2.open(self.path, 'rb')
+            case 'xz':
+                import lzma
+                return lzma.open(self.path, 'rb')
+            case _:
+                return open(self.path, 'rb')
+
+    def read_blocks(self):
+        """
+        Yields the file in blocks of whole lines (of at least _READ_BLOCK_SIZE bytes,
+        apart from the last one), as tuples of (raw bytes, list of decoded lines).
+        Analysis passes which are run together (see stex_analysis.ingest_file)
+        all work through the same blocks, so the file is only read once.
+
+        Lines are decoded as described in read_lines.
+        """
+        with self.open_binary() as f:
+            yield from self._decode_blocks(_read_raw_blocks(f))
+
+    def read_lines(self):
+        """
+        Yields every line of the file, decoded, with line endings turned into
+        '\n' (as when reading in text mode). Analysis passes which are run
+        by themselves read the file through this.
+
+        The file is decoded as it's read, so checking the encoding never costs a
+        pass of its own. A line which isn't valid UTF-8 is decoded as FALLBACK_ENCODING
+        instead (unless the file has a declared encoding), and any bytes which still
+        can't be decoded are replaced with U+FFFD. In strict mode, such a line raises
+        a ValueError instead.
+
+        Once the whole file has been read, the amount of replaced bytes and of lines
+        which needed the fallback are stored in replaced_bytes and fallback_lines.
+        """
+        for _, lines in self.read_blocks():
+            yield from lines
+
+    def _decode_blocks(self, raw_blocks):
+        """
+        Decodes blocks of whole lines, see read_blocks and read_lines.
+        """
+        encoding = self.encoding or 'utf-8'
+        replaced_bytes = 0
+        fallback_lines = 0
+        line_number = 0
+
+        for raw_block in raw_blocks:
+            # Decoding a block of whole lines at a time is much quicker than
+            # decoding every line by itself, which is only done for blocks
+            # which turn out not to be valid.
+            try:
+                lines = io.TextIOWrapper(io.BytesIO(raw_block), encoding=encoding).readlines()
+            except UnicodeDecodeError:
+                text, replaced, fell_back = self._decode_lines_leniently(raw_block, self.strict, line_number)
+                lines = io.StringIO(text, newline=None).readlines()
+                replaced_bytes += replaced
+                fallback_lines += fell_back
+
+            line_number += len(lines)
+            yield raw_block, lines
+
+        self.replaced_bytes = replaced_bytes
+        self.fallback_lines = fallback_lines
+
+    def decode(self, raw: bytes) -> str:
+        """
+        Decodes bytes read from the file (whole lines, or e.g. a sentence) the same
+        way read_lines does, but without raising in strict mode, or counting anything.
+        Line endings are left as they are.
+        """
+        try:
+            return raw.decode(self.encoding or 'utf-8')
+        except UnicodeDecodeError:
+            return self._decode_lines_leniently(raw, strict=False)[0]
+
+    def _decode_leniently(self, raw: bytes) -> tuple[str, int, bool]:
+        """
+        Decodes bytes which aren't valid in the file's encoding.
+
+        Returns:
+            Tuple containing:
+                the decoded text (str)
+                amount of bytes replaced with U+FFFD (int)
+                whether FALLBACK_ENCODING was used (bool)
+        """
+        encoding = self.encoding
+        fell_back = False
+        if encoding is None:
+            encoding = FALLBACK_ENCODING
+            fell_back = True
+            try:
+                return raw.decode(encoding), 0, fell_back
+            except UnicodeDecodeError:
+                # A few bytes aren't defined in CP1252 either.
+                pass
+
+        # surrogateescape turns every byte which can't be decoded into a
+        # single lone surrogate, which makes them easy to count.
+        escaped = raw.decode(encoding, errors='surrogateescape')
+        replaced = sum(1 for character in escaped if '\udc80' <= character <= '\udcff')
+        return raw.decode(encoding, errors='replace'), replaced, fell_back
+
+    def _decode_lines_leniently(self, raw_block: bytes, strict: bool, line_number: int = 0) -> tuple[str, int, int]:
+        """
+        Decodes a block of lines which isn't valid in the file's encoding,
+        line by line, so that only the offending lines are decoded differently.
+
+        Arguments:
+            raw_block: whole lines read from the file
+            strict: raise a ValueError at the first offending line instead
+            line_number: amount of lines before the block, for error messages
+
+        Returns:
+            Tuple containing:
+                the decoded text (str)
+                amount of bytes replaced with U+FFFD (int)
+                amount of lines decoded with FALLBACK_ENCODING (int)
+        """
+        encoding = self.encoding or 'utf-8'
+        decoded_lines = []
+        replaced_bytes = 0
+        fallback_lines = 0
+
+        for raw_line in io.BytesIO(raw_block):
+            line_number += 1
+            try:
+                decoded_lines.append(raw_line.decode(encoding))
+            except UnicodeDecodeError as e:
+                if strict:
+                    raise ValueError(f"{self.shortname} is not valid {encoding} text "
+                                     f"(line {line_number:,}, byte {e.start + 1:,}).") from None
+                line, replaced, fell_back = self._decode_leniently(raw_line)
+                decoded_lines.append(line)
+                replaced_bytes += replaced
+                fallback_lines += fell_back
+
+        return ''.join(decoded_lines), replaced_bytes, fallback_lines
 
     # ----------- DATA SAVING FUNCTIONS  -----------
     def append_basic_statistics(self, stats: tuple) -> None:
@@ -96,21 +367,73 @@ class TextFile:
                     word length occurrences (key: length(int), value: occurrences(int))
         """
         (
-            self.word_occurrences,
+            word_occurrences,
             self.word_length_occurrences
         ) = stats
         
-    def append_sentence_statistics(self, stats: tuple[str, str, dict[int, int]]) -> None:
+        # The words themselves are kept in the vocabulary shared by every TextFile,
+        # so that loading many files doesn't store the same words over and over.
+        # This still behaves like the (read-only) dictionary it was given.
+        self.word_occurrences = vocabulary.WordCounts(word_occurrences)
+        
+        # Dense copy (index = length) for plotting, see _dense_histogram.
+        self.word_length_histogram = _dense_histogram(self.word_length_occurrences)
+        
+        # Statistics derived from the above are worked out once, here, rather
+        # than every time they're viewed - vocabularies can be huge.
+        self.orphan_word_count = sum(1 for count in self.word_occurrences.values() if count == 1)
+        self.word_length_statistics = _word_length_statistics(self.word_length_occurrences)
+        self._orphan_words = None
+        self._unique_words = None
+        
+    def append_word_frequency_sketches(self, word_sketch, distinct_word_sketch, top_word_summary) -> None:
         """
-                    
+        Stores the sketches of an approximate Word Frequency Analysis
+        (see stex_analysis.invoke_approximate_word_frequency_statistics).
+
+        Arguments:
+            word_sketch: CountMinSketch of word occurrences, or None
+            distinct_word_sketch: HyperLogLog of distinct words
+            top_word_summary: SpaceSaving summary of the most frequent words
+        """
+        self.word_sketch = word_sketch
+        self.distinct_word_sketch = distinct_word_sketch
+        self.top_word_summary = top_word_summary
+
+    def append_sentence_statistics(self, stats: tuple) -> None:
+        """
+        Stores the results of a corresponding Sentence Analysis.
+
+        Arguments:
+            stats: tuple containing:
+                spans of the shortest sentences (start byte, end byte, word count), shortest first
+                spans of the longest sentences (start byte, end byte, word count), longest first
+                dictionary containing:
+                    sentence length occurrences (key: length(int), value: occurrences(int))
         """
         (
-            self.shortest_sentence_text,
-            self.longest_sentence_text,
+            self.shortest_sentence_spans,
+            self.longest_sentence_spans,
             self.sentence_length_distribution
         ) = stats
 
+        # The single most extreme sentences, or None if there were no sentences.
+        self.shortest_sentence_span = self.shortest_sentence_spans[0] if self.shortest_sentence_spans else None
+        self.longest_sentence_span = self.longest_sentence_spans[0] if self.longest_sentence_spans else None
+
         self.total_sentences = sum(self.sentence_length_distribution.values())
+        self.total_sentence_words = sum(length * count for length, count in self.sentence_length_distribution.items())
+        self.sentence_length_histogram = _dense_histogram(self.sentence_length_distribution)
+
+    def append_sentence_previews(self, previews: dict[tuple[int, int], str]) -> None:
+        """
+        Stores the beginnings of the shortest and longest sentences, for files which
+        can't cheaply be read back (see is_seekable and get_sentence_text).
+
+        Arguments:
+            previews: dictionary (key: (start, end) of a sentence span, value: text)
+        """
+        self.sentence_previews = previews
 
     def append_character_statistics(self, stats: tuple[dict[str, int], int, int, int, int, int]) -> None:
         """
@@ -136,7 +459,26 @@ class TextFile:
         ) = stats
 
         self.total_characters = sum(self.character_occurrences.values())
+        self.lowercase_count, self.uppercase_count = _count_cased_letters(self.character_occurrences)
         
+    def append_estimate_intervals(self, intervals: dict[str, tuple[float, float]], confidence: float, sampled_bytes: int) -> None:
+        """
+        Marks the basic and character statistics as estimates
+        (see stex_analysis.ingest_file_estimate).
+
+        Arguments:
+            intervals: dictionary with key: attribute name(str), value: (low, high) confidence interval.
+                       Empty if the whole file was read after all, in which case nothing is marked.
+            confidence: probability that each interval contains the true value
+            sampled_bytes: amount of bytes the estimates are based on
+        """
+        if not intervals:
+            return
+
+        self.estimate_intervals = intervals
+        self.estimate_confidence = confidence
+        self.estimate_sampled_bytes = sampled_bytes
+
     def append_language_probabilities(self, stats: dict[str, float]) -> None:
         """
         Stores the results of a trigram-based language probability analysis.
@@ -145,7 +487,8 @@ class TextFile:
             stats: sorted dictionary with key: language(str), value: probability(float)
         """
         self.language_probabilities = stats
-        self.most_likely_language = max(stats, key=stats.get)
+        # A file without a single word has nothing to compare.
+        self.most_likely_language = max(stats, key=stats.get) if stats else None
 
     # ----------- DATA RETRIEVAL FUNCTIONS -----------
     def get_average_words_per_line(self, round_to: int = 3) -> float:
@@ -160,23 +503,11 @@ class TextFile:
 
     def get_count_of_lowercase_and_capitalized_ascii(self) -> tuple[float, float]:
         """
-        Returns a tuple of how many uppercase contra lowercase ASCII characters
+        Returns a tuple of how many lowercase contra uppercase ASCII characters
         appeared. Only supports standard English or Swedish alphabets..
+        Counted when the character statistics are appended, see _count_cased_letters.
         """
-
-        lower_total = 0
-        upper_total = 0
-        
-        ASCII_LOWER = set('abcdefghijklmnopqrstuvwxyzåäö')
-        ASCII_UPPER = set('ABCDEFGHIJKLMNOPQRSTUVWXYZÅÄÖ')
-    
-        for character, count in self.character_occurrences.items():
-            if character.islower() and character in ASCII_LOWER:
-                lower_total += count
-            elif character.isupper() and character in ASCII_UPPER:
-                upper_total += count
-    
-        return lower_total, upper_total
+        return self.lowercase_count, self.uppercase_count
 
     def get_average_characters_per_word(self, round_to: int = 3) -> float:
         """
@@ -196,37 +527,204 @@ class TextFile:
             # No sentences? Weird.
             return 0
 
-        total_words = sum(length * count for length, count in self.sentence_length_distribution.items())
+        # Both totals are counted when the sentence statistics are appended.
+        total_words = self.total_sentence_words
         total_sentences = self.total_sentences
 
         average = total_words / total_sentences
         return round(average, round_to)
     
+    def get_sentence_length_percentiles(self, percentiles: tuple[int, ...] = (50, 90, 99)) -> dict[int, int]:
+        """
+        Finds sentence length percentiles from the sentence length histogram,
+        so no individual sentence lengths have to be stored. Uses the nearest-rank
+        method: the Pth percentile is the shortest length which at least P% of
+        all sentences are no longer than.
+
+        Arguments:
+            percentiles: percentiles to find, between 0 and 100
+
+        Returns:
+            Dictionary with key: percentile(int), value: sentence length in words(int).
+            Empty if there were no sentences.
+        """
+        if self.total_sentences == 0:
+            return {}
+
+        # Rank (1-based) of the sentence each percentile lands on, in order of length.
+        targets = sorted((max(1, math.ceil(percentile / 100 * self.total_sentences)), percentile) for percentile in percentiles)
+
+        result = {}
+        target_index = 0
+        sentences_so_far = 0
+
+        # Walk up through the lengths once, picking off each percentile as we pass it.
+        for length, occurrences in enumerate(self.sentence_length_histogram):
+            sentences_so_far += occurrences
+            while target_index < len(targets) and targets[target_index][0] <= sentences_so_far:
+                result[targets[target_index][1]] = length
+                target_index += 1
+            if target_index == len(targets):
+                break
+
+        return {percentile: result[percentile] for percentile in percentiles}
+
+    def get_sentence_text(self, span: tuple[int, int, int] | None) -> str:
+        """
+        Reads the text of a sentence span (see append_sentence_statistics) back from disk.
+        Line breaks and runs of whitespace are collapsed to single spaces.
+
+        For files which can't cheaply be read back (see is_seekable), the beginning
+        of the sentence is returned instead (see append_sentence_previews).
+
+        Returns:
+            The sentence, or an empty string if span is None.
+        """
+        if span is None:
+            return ''
+
+        if self.sentence_previews is not None:
+            return self.sentence_previews.get(span[:2], '')
+
+        start, end, _ = span
+        # Decompressing up to the span is slow, but only happens for compressed files
+        # whose sentences were analysed by themselves (see is_seekable).
+        with self.open_binary() as f:
+            f.seek(start)
+            raw_sentence = f.read(end - start)
+
+        return ' '.join(self.decode(raw_sentence).split())
+
+    def is_seekable(self) -> bool:
+        """
+        Returns True if any part of the file can be read back directly (see get_sentence_text).
+        A compressed file would have to be decompressed from the start (unless it has been
+        read into memory), and a stream can't be read back at all.
+        """
+        return self.data is not None or (self.path is not None and self.compression is None)
+
+    def get_base_name(self) -> str:
+        """
+        Returns the name of the file without its extension(s), e.g. "novel" for novel.txt.gz,
+        usable as a file name. Files in archives are named after the archive, e.g.
+        "corpus.zip_texts_novel" for texts/novel.txt in corpus.zip.
+        """
+        return to_base_name(self.shortname)
+
+    def is_approximate(self) -> bool:
+        """
+        Returns True if word frequencies are estimates from the approximate analysis mode.
+        """
+        return self.top_word_summary is not None
+
+    def get_encoding_description(self) -> str | None:
+        """
+        Returns a short description of how the file was decoded, e.g.
+        "utf-8" or "utf-8, 12 lines cp1252", or None if it hasn't been read in full yet.
+        """
+        if self.fallback_lines is None:
+            return None
+
+        description = self.encoding or 'utf-8'
+        if self.fallback_lines:
+            description += f', {self.fallback_lines:,} lines {FALLBACK_ENCODING}'
+        return description
+
+    def is_estimated(self, statistic: str | None = None) -> bool:
+        """
+        Returns True if the statistics (or the given statistic, by attribute
+        name) are estimates from the quick-estimate mode.
+        """
+        if self.estimate_intervals is None:
+            return False
+        return statistic is None or statistic in self.estimate_intervals
+
+    def get_estimate_interval(self, statistic: str) -> tuple[float, float] | None:
+        """
+        Returns the (low, high) confidence interval of an estimated statistic,
+        by attribute name, or None if it isn't an estimate.
+        """
+        if self.estimate_intervals is None:
+            return None
+        return self.estimate_intervals.get(statistic)
+
+    def get_unique_word_count(self) -> int:
+        """
+        Returns the number of distinct words. In the approximate analysis mode
+        this is an estimate, see get_unique_word_count_error.
+        """
+        if self.distinct_word_sketch is not None:
+            return self.distinct_word_sketch.cardinality()
+        return len(self.word_occurrences)
+
+    def get_unique_word_count_error(self) -> float:
+        """
+        Returns the relative standard error of get_unique_word_count (0 if exact).
+        """
+        if self.distinct_word_sketch is not None:
+            return self.distinct_word_sketch.relative_error
+        return 0.0
+
+    def get_word_occurrence_error_bound(self) -> tuple[float, float]:
+        """
+        Returns how far off the word occurrences may be.
+
+        Returns:
+            Tuple containing:
+                maximum overestimate of any word's occurrences (float, 0 if exact)
+                probability that the bound holds (float)
+        """
+        if not self.is_approximate():
+            return 0.0, 1.0
+
+        # The Space-Saving bound always holds. The Count-Min bound only holds with
+        # some probability, but may well be tighter. Report whichever is tighter.
+        bound, confidence = float(self.top_word_summary.error_bound), 1.0
+        if self.word_sketch is not None and self.word_sketch.error_bound < bound:
+            bound, confidence = self.word_sketch.error_bound, self.word_sketch.confidence
+        return bound, confidence
+
     def get_orphan_words(self) -> tuple[str]:
         """
         Finds words which only occurred a single time.
+        Not available in the approximate analysis mode, which doesn't keep every word.
 
         Returns:
             Tuple of every unique word which only has a single occurrence in this HyTextFile
         """
-        # Find amount of unique words (words with a count of only 1)
-        orphan_words = []
-        for word, count in self.word_occurrences.items():
-            if count == 1:
-                orphan_words.append(word)
+        if self.is_approximate():
+            raise ValueError("Orphan words are not tracked in the approximate analysis mode.")
+
+        # Only looked for once (until new statistics are appended).
+        if self._orphan_words is None:
+            # Find amount of unique words (words with a count of only 1)
+            orphan_words = []
+            for word, count in self.word_occurrences.items():
+                if count == 1:
+                    orphan_words.append(word)
+            self._orphan_words = tuple(orphan_words)
         
-        return tuple(orphan_words)
+        return self._orphan_words
+
+    def get_orphan_word_count(self) -> int:
+        """
+        Returns the number of words which only occurred a single time, without
+        listing them (see get_orphan_words). Not available in the approximate analysis mode.
+        """
+        if self.is_approximate():
+            raise ValueError("Orphan words are not tracked in the approximate analysis mode.")
+        return self.orphan_word_count
 
     def get_unique_words(self) -> tuple[str]:
         """
         Returns a tuple of every word which appears in the HyTextFile, with no duplicates,
         ordered by amount of appearances.
         """
-        unique_words = []
-        for word in self.word_occurrences.keys():
-            unique_words.append(word)
+        # Only built once (until new statistics are appended).
+        if self._unique_words is None:
+            self._unique_words = tuple(self.word_occurrences.keys())
         
-        return tuple(unique_words)
+        return self._unique_words
 
     
     def get_top_elements_of_dictionary(self, dictionary: dict, top_n: int, constraint: set | None = None) -> dict:
@@ -268,9 +766,37 @@ class TextFile:
             # dictionary is filtered and has been sliced to top_n values
             return filtered_dictionary
         else:
-            top_values = dict(list(dictionary.items())[:top_n])
+            top_values = dict(itertools.islice(dictionary.items(), top_n))
             return top_values
 
+    def get_distribution_summary(self) -> dict:
+        """
+        Collects the distributions used to compare many files with each other
+        (see stex_plotting.plot_comparison). The summary is small, so it can
+        be passed between processes cheaply, unlike the TextFile itself.
+
+        Returns:
+            Dictionary containing:
+                shortname (str)
+                word_length_histogram (array, index = length)
+                sentence_length_histogram (array, index = length)
+                character_types (dict, key: type, value: occurrences)
+                top_words (SpaceSaving summary, or None outside the approximate mode)
+        """
+        return {
+            'shortname': self.shortname,
+            'word_length_histogram': self.word_length_histogram,
+            'sentence_length_histogram': self.sentence_length_histogram,
+            'character_types': {
+                'Letters': self.letter_count,
+                'Digits': self.digit_count,
+                'Punctuation': self.punctuation_count,
+                'Spaces': self.space_count,
+                'Other': self.other_count
+            },
+            'top_words': self.top_word_summary
+        }
+
     def get_word_length_statistics(self) -> tuple[int, int, float]:
         """
         Get some basic statistics about word length.
@@ -283,24 +809,587 @@ class TextFile:
                 Length of shortest word (int)
                 Length of longest word (int)
                 Average word length (float)
+            All 0 if there were no words.
         """
-        
-        # keys: lengths, values: occurrences
-        word_length_dictionary = self.word_length_occurrences
-        # This is also already expected to be sorted (by occurrences; we've shot ourselves in the foot..)
+        # Worked out when the word frequency statistics are appended, see _word_length_statistics.
+        return self.word_length_statistics
 
-        # Since we only care about the keys, let's get a list of keys and sort it.
-        word_lengths = list(word_length_dictionary.keys())
-        sorted_word_lengths = sorted(word_lengths)
+    def get_memory_footprint(self) -> int:
+        """
+        Returns roughly how many bytes of memory the results which spill() can move
+        to disk take up. Words themselves are shared between files (see stex_vocabulary),
+        so they aren't counted.
+        """
+        footprint = sum(_approximate_size(self.__dict__[name]) for name in _SPILLABLE_ATTRIBUTES if name in self.__dict__)
 
-        # Now, let's get the weighted average.
-        occurrences = list(word_length_dictionary.values())
+        # Built on demand, and only hold words (which are already counted elsewhere).
+        for cached_words in (self._orphan_words, self._unique_words):
+            if cached_words is not None:
+                footprint += sys.getsizeof(cached_words)
 
-        # https://stackoverflow.com/questions/72700130/calculating-weighted-average-using-two-different-list-of-lists
-        average = float(np.average(word_lengths, weights=occurrences))
-        
-        return (
-            int(sorted_word_lengths[0]),
-            int(sorted_word_lengths[-1]),
-            average
-        )
+        return footprint
+
+    # ----------- SPILLING FUNCTIONS -----------
+    def spill(self, path: str) -> None:
+        """
+        Moves the bulky analysis results (see _SPILLABLE_ATTRIBUTES) to a file, to
+        free up memory. They're read back as soon as any of them is used (see __getattr__).
+
+        Arguments:
+            path: file to write the results to (overwritten)
+        """
+        # Only imported when the first file is spilled.
+        import pickle
+
+        results = {name: self.__dict__[name] for name in _SPILLABLE_ATTRIBUTES if name in self.__dict__}
+
+        # Written (and compressed, quickly) before anything is let go of,
+        # so nothing is lost if the disk is full.
+        with open(path, 'wb') as f:
+            f.write(zlib.compress(pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL), 1))
+
+        for name in results:
+            del self.__dict__[name]
+
+        # Cached word lists are simply built again when needed.
+        self.__dict__.pop('_orphan_words', None)
+        self.__dict__.pop('_unique_words', None)
+
+        self.spill_path = path
+
+    def restore(self) -> None:
+        """
+        Reads the results which were moved to disk by spill() back into memory,
+        and removes the file. Does nothing if they weren't spilled.
+        """
+        if self.spill_path is None:
+            return
+
+        import pickle
+
+        with open(self.spill_path, 'rb') as f:
+            results = pickle.loads(zlib.decompress(f.read()))
+        self.__dict__.update(results)
+
+        os.remove(self.spill_path)
+        self.spill_path = None
+
+    def is_spilled(self) -> bool:
+        """
+        Returns True if the bulky results are on disk right now (see spill).
+        """
+        return self.spill_path is not None
+
+    def __getattr__(self, name: str):
+        # Only called for attributes which don't exist. For a spilled TextFile,
+        # those may be results which are on disk, so read them back first.
+        if name in _SPILLABLE_ATTRIBUTES and self.spill_path is not None:
+            self.restore()
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+
+class StreamedTextFile(TextFile):
+    """
+    A TextFile whose text doesn't come from a file on disk, but from a stream
+    (standard input, a pipe, a decompressor, ...) or any iterable of lines.
+    It can only be read once, so all analysis passes have to run in the same
+    traversal (see stex_analysis.ingest_file, which does exactly that).
+
+    As the text can't be read back later, the beginnings of the shortest and
+    longest sentences are kept in memory instead (see get_sentence_text).
+    """
+
+    def __init__(self, source, name: str = '<stream>', encoding: str | None = None, strict: bool = False) -> None:
+        """
+        Arguments:
+            source: binary stream, text stream, or iterable of lines (str or bytes).
+                    Lines of an iterable which don't end in a line break are given one.
+            name: what to call the text, in place of a file name
+            encoding, strict: how to decode bytes, see TextFile. Text is used as-is.
+        """
+        # There's no file on disk to check, so TextFile.__init__ doesn't apply.
+        self.path = None
+        self.shortname = name
+        self.encoding = _normalize_encoding(encoding)
+        self.strict = strict
+        self.source = source
+        self.sentence_previews = {}
+        self.consumed = False
+
+    def read_blocks(self):
+        """
+        Same as TextFile.read_blocks, but reads from the source. Blocks of text
+        (rather than bytes) have None in place of their raw bytes.
+        Raises a ValueError if the source has been read before.
+        """
+        if self.consumed:
+            raise ValueError(f"{self.shortname} is a stream, and can only be read once.")
+        self.consumed = True
+
+        source = self.source
+        if hasattr(source, 'read') and not isinstance(source, io.TextIOBase):
+            yield from self._decode_blocks(_read_raw_blocks(source))
+            return
+
+        # Whether the lines of an iterable are bytes or text only shows once there is one.
+        lines = iter(source)
+        first_line = next(lines, None)
+        if first_line is None:
+            self.replaced_bytes = 0
+            self.fallback_lines = 0
+            return
+        lines = itertools.chain((first_line,), lines)
+
+        if isinstance(first_line, bytes):
+            yield from self._decode_blocks(_batch_raw_lines(lines))
+            return
+
+        # Already text, so there's nothing to decode.
+        for batch in _batch_lines(lines, add_line_breaks=not isinstance(source, io.TextIOBase)):
+            yield None, batch
+        self.replaced_bytes = 0
+        self.fallback_lines = 0
+
+
+class ArchiveMemberTextFile(TextFile):
+    """
+    A text file inside a zip or (uncompressed) tar archive, read straight out of
+    the archive without extracting it (see read_archive). Only the archive path and
+    the byte range of the member are kept, so instances are cheap to send to worker
+    processes, which then each read their own member directly.
+
+    The text is only read through open_binary, so the beginnings of the shortest
+    and longest sentences are kept while it's read, as for a StreamedTextFile.
+    """
+
+    def __init__(self, archive_path: str, member_name: str, offset: int, size: int,
+                 zip_method: int = _ZIP_STORED, encoding: str | None = None, strict: bool = False) -> None:
+        """
+        Arguments:
+            archive_path: path to the archive
+            member_name: path of the text file within the archive
+            offset: where the (possibly compressed) data of the member starts in the archive
+            size: length of that data, in bytes
+            zip_method: how the data is compressed (_ZIP_STORED or _ZIP_DEFLATED)
+            encoding, strict: how to decode the text, see TextFile
+        """
+        # The archive has been checked by read_archive, so TextFile.__init__ doesn't apply.
+        self.path = archive_path
+        self.member_name = member_name
+        self.shortname = f'{os.path.basename(archive_path)}/{member_name}'
+        self.offset = offset
+        self.size = size
+        self.zip_method = zip_method
+        self.encoding = _normalize_encoding(encoding)
+        self.strict = strict
+        self.sentence_previews = {}
+
+    def open_binary(self):
+        """
+        Opens the member for reading bytes, inflating it if it's compressed in the zip archive.
+        """
+        member = io.BufferedReader(_ByteRangeReader(self.path, self.offset, self.size))
+        if self.zip_method == _ZIP_DEFLATED:
+            return io.BufferedReader(_InflatingReader(member))
+        if self.zip_method != _ZIP_STORED:
+            member.close()
+            raise ValueError(f"{self.shortname} is compressed in a way which isn't supported "
+                             f"(zip method {self.zip_method}).")
+        return member
+
+    def is_seekable(self) -> bool:
+        return False
+
+
+def read_archive(path: str, encoding: str | None = None, strict: bool = False):
+    """
+    Lists the text files (.txt) in a tar or zip archive, without extracting anything.
+
+    Members of zip archives and uncompressed tar archives are ArchiveMemberTextFiles,
+    which can be analysed in any order (and in any process). A compressed tar archive
+    can only be read from start to end, so its members are StreamedTextFiles, and each
+    has to be analysed in full (see stex_analysis.ingest_file) before the next one is
+    taken from the iterator.
+
+    Arguments:
+        path: path to the archive, see ARCHIVE_EXTENSIONS
+        encoding, strict: how to decode every text file, see TextFile
+
+    Returns:
+        List of ArchiveMemberTextFiles, or for a compressed tar archive an iterator of
+        StreamedTextFiles, in the order of the archive.
+        Raises FileNotFoundError, or ValueError if the file isn't a tar or zip archive.
+    """
+    # Only imported when an archive is actually read, as they take a while to import.
+    import tarfile
+    import zipfile
+
+    if not os.path.exists(path):
+        raise FileNotFoundError
+    encoding = _normalize_encoding(encoding)
+
+    if zipfile.is_zipfile(path):
+        return _read_zip_members(path, encoding, strict)
+
+    with open(path, 'rb') as f:
+        compression = _detect_compression(f.read(_MAGIC_BYTES_LENGTH))
+    try:
+        if compression is None:
+            return _read_tar_members(path, encoding, strict)
+        # Checks that it actually is a tar archive before anything is handed out.
+        tarfile.open(path, 'r:*').close()
+    except tarfile.TarError:
+        raise ValueError(f"{os.path.basename(path)} is not a tar or zip archive.")
+    return _stream_tar_members(path, encoding, strict)
+
+def to_base_name(shortname: str) -> str:
+    """
+    Returns the name of a file (as in TextFile.shortname) without its extension(s),
+    usable as a file name, see TextFile.get_base_name.
+    """
+    return os.path.splitext(_strip_compressed_extension(shortname))[0].replace('/', '_')
+
+def is_archive(path: str) -> bool:
+    """
+    Returns True if the path is named like an archive of text files (see read_archive).
+    """
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+# helper functions
+def _read_zip_members(path: str, encoding: str | None, strict: bool) -> list[ArchiveMemberTextFile]:
+    """
+    Lists the text files in a zip archive, see read_archive.
+    """
+    import zipfile
+    members = []
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"{os.path.basename(path)} is not a valid zip archive: {e}") from e
+    with archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith('.txt'):
+                continue
+            if info.flag_bits & 0x1:
+                raise ValueError(f"{info.filename} in {os.path.basename(path)} is encrypted.")
+
+            # The data starts after the member's local header, whose file name and
+            # extra field may differ in length from those in the central directory.
+            f.seek(info.header_offset)
+            header = f.read(30)
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            offset = info.header_offset + 30 + name_length + extra_length
+
+            members.append(ArchiveMemberTextFile(path, info.filename, offset, info.compress_size,
+                                                 info.compress_type, encoding, strict))
+    return members
+
+def _read_tar_members(path: str, encoding: str | None, strict: bool) -> list[ArchiveMemberTextFile]:
+    """
+    Lists the text files in an uncompressed tar archive, see read_archive.
+    """
+    import tarfile
+    with tarfile.open(path, 'r:') as archive:
+        return [
+            ArchiveMemberTextFile(path, member.name.removeprefix('./'), member.offset_data, member.size,
+                                  encoding=encoding, strict=strict)
+            for member in archive
+            if member.isfile() and not member.issparse() and member.name.lower().endswith('.txt')
+        ]
+
+def _stream_tar_members(path: str, encoding: str | None, strict: bool):
+    """
+    Yields the text files in a compressed tar archive as StreamedTextFiles, see read_archive.
+    """
+    import tarfile
+    # Stream mode ('|') never seeks backwards, so the archive is decompressed exactly once.
+    # A truncated archive is reported as an EOFError (one of READ_ERRORS), both when
+    # reading a member and when looking for the next one.
+    try:
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith('.txt'):
+                    member_file = io.BufferedReader(_TarMemberReader(archive.extractfile(member)))
+                    yield StreamedTextFile(member_file, f'{os.path.basename(path)}/{member.name.removeprefix("./")}',
+                                           encoding, strict)
+    except tarfile.ReadError as e:
+        raise EOFError(f"{os.path.basename(path)}: {e}") from e
+
+def _detect_compression(head: bytes) -> str | None:
+    """
+    Returns the compression format (see COMPRESSION_MAGIC_BYTES) of a file
+    starting with the given bytes (at least _MAGIC_BYTES_LENGTH of them), or None.
+    """
+    for compression, magic in COMPRESSION_MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    """
+    Decompresses a whole file in memory, see _detect_compression.
+    """
+    match compression:
+        case 'gzip':
+            import gzip
+            return gzip.decompress(data)
+        case 'bz2':
+            import bz2
+            return bz2.decompress(data)
+        case 'xz':
+            import lzma
+            return lzma.decompress(data)
+
+def _read_small_file(path: str, limit: int, read_size: int | None = None) -> bytes | None:
+    """
+    Reads a whole file, if it's at most limit bytes. Otherwise returns None.
+    Unless a read_size is given, the file is read with a single read.
+    """
+    descriptor = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        size = os.fstat(descriptor).st_size
+        if size > limit:
+            return None
+        if read_size is None or size <= read_size:
+            return os.read(descriptor, size)
+
+        chunks = []
+        while chunk := os.read(descriptor, read_size):
+            chunks.append(chunk)
+        return b''.join(chunks)
+    finally:
+        os.close(descriptor)
+
+def _strip_compressed_extension(path: str) -> str:
+    """
+    Removes a compression extension (see COMPRESSED_EXTENSIONS) from a path, if it has one.
+    """
+    for extension in COMPRESSED_EXTENSIONS:
+        if path.lower().endswith(extension):
+            return path[:-len(extension)]
+    return path
+
+def _normalize_encoding(encoding: str | None) -> str | None:
+    """
+    Checks that an encoding (see TextFile) exists and can be used,
+    and returns its canonical name. None stays None.
+    """
+    if encoding is None:
+        return None
+
+    try:
+        encoding = codecs.lookup(encoding).name
+    except LookupError:
+        raise ValueError(f"Unknown encoding '{encoding}'.")
+    # Files are split into lines before decoding, so the encoding has
+    # to write line breaks the same way ASCII does (UTF-16 doesn't).
+    if '\n'.encode(encoding) != b'\n':
+        raise ValueError(f"Encoding '{encoding}' is not supported, as it isn't ASCII compatible.")
+    return encoding
+
+class _ByteRangeReader(io.RawIOBase):
+    """
+    Reads a range of bytes of a file, as if it were a file by itself.
+    """
+
+    def __init__(self, path: str, offset: int, size: int) -> None:
+        self._file = open(path, 'rb')
+        self._file.seek(offset)
+        self._remaining = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self._remaining)
+        if length == 0:
+            return 0
+        length = self._file.readinto(memoryview(buffer)[:length])
+        self._remaining -= length
+        return length
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+class _InflatingReader(io.RawIOBase):
+    """
+    Inflates a (raw, headerless) deflate stream, as found in zip archives.
+    """
+
+    def __init__(self, compressed) -> None:
+        self._compressed = compressed
+        self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._pending = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and self._inflater is not None:
+            chunk = self._compressed.read(_INFLATE_CHUNK_SIZE)
+            if chunk:
+                self._pending = self._inflater.decompress(chunk)
+            else:
+                self._pending = self._inflater.flush()
+                self._inflater = None
+
+        length = min(len(buffer), len(self._pending))
+        buffer[:length] = self._pending[:length]
+        self._pending = self._pending[length:]
+        return length
+
+    def close(self) -> None:
+        self._compressed.close()
+        super().close()
+
+class _TarMemberReader(io.RawIOBase):
+    """
+    Reads a member of a streamed tar archive, reporting a truncated archive as
+    an EOFError (one of READ_ERRORS) instead of tarfile's own ReadError.
+    """
+
+    def __init__(self, member_file) -> None:
+        self._member_file = member_file
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        import tarfile
+        try:
+            return self._member_file.readinto(buffer)
+        except tarfile.ReadError as e:
+            raise EOFError(str(e)) from e
+
+    def close(self) -> None:
+        self._member_file.close()
+        super().close()
+
+def _read_raw_blocks(stream):
+    """
+    Yields blocks of whole lines (bytes) from a binary stream, see TextFile.read_blocks.
+    """
+    while True:
+        raw_block = stream.read(_READ_BLOCK_SIZE) + stream.readline()
+        if not raw_block:
+            break
+        yield raw_block
+
+def _batch_raw_lines(lines):
+    """
+    Joins an iterable of lines (bytes) into blocks, see TextFile.read_blocks.
+    """
+    batch = []
+    size = 0
+    for line in lines:
+        if not line.endswith(b'\n'):
+            line += b'\n'
+        batch.append(line)
+        size += len(line)
+        if size >= _READ_BLOCK_SIZE:
+            yield b''.join(batch)
+            batch = []
+            size = 0
+    if batch:
+        yield b''.join(batch)
+
+def _batch_lines(lines, add_line_breaks: bool = True):
+    """
+    Collects an iterable of lines (str) into lists of about the
+    size of a block, see TextFile.read_blocks.
+    """
+    batch = []
+    size = 0
+    for line in lines:
+        if add_line_breaks and not line.endswith('\n'):
+            line += '\n'
+        batch.append(line)
+        size += len(line)
+        if size >= _READ_BLOCK_SIZE:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+def _approximate_size(value) -> int:
+    """
+    Roughly how many bytes a result takes up in memory, including what it holds
+    (see TextFile.get_memory_footprint).
+    """
+    if isinstance(value, vocabulary.WordCounts):
+        # Just its arrays, the words are in the shared vocabulary (see WordCounts.__sizeof__).
+        return sys.getsizeof(value)
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_approximate_size(key) + _approximate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_approximate_size(item) for item in value)
+    return size
+
+def _word_length_statistics(word_length_occurrences: dict[int, int]) -> tuple[int, int, float]:
+    """
+    Works out the statistics behind TextFile.get_word_length_statistics.
+
+    Arguments:
+        word_length_occurrences: dict with key: word length, value: occurrences
+
+    Returns:
+        Tuple of (shortest length, longest length, average length), all 0 if there are no words.
+    """
+    if not word_length_occurrences:
+        return 0, 0, 0.0
+
+    # The dictionary is sorted by occurrences (we've shot ourselves in the foot..),
+    # but we only care about the keys here.
+    word_lengths = word_length_occurrences.keys()
+
+    # Now, let's get the weighted average. This used to be np.average,
+    # but importing NumPy just for this cost more than the sum itself.
+    total_words = sum(word_length_occurrences.values())
+    total_length = sum(length * count for length, count in word_length_occurrences.items())
+    average = total_length / total_words
+
+    return int(min(word_lengths)), int(max(word_lengths)), average
+
+def _count_cased_letters(character_occurrences: dict[str, int]) -> tuple[int, int]:
+    """
+    Counts the lowercase and uppercase letters of the standard English or Swedish
+    alphabets, for TextFile.get_count_of_lowercase_and_capitalized_ascii.
+
+    Arguments:
+        character_occurrences: dict with key: character, value: occurrences
+
+    Returns:
+        Tuple of (lowercase letters, uppercase letters)
+    """
+    lower_total = 0
+    upper_total = 0
+
+    for character, count in character_occurrences.items():
+        if character in _CASED_LOWERCASE_LETTERS:
+            lower_total += count
+        elif character in _CASED_UPPERCASE_LETTERS:
+            upper_total += count
+
+    return lower_total, upper_total
+
+def _dense_histogram(distribution: dict[int, int]) -> array:
+    """
+    Converts a length distribution (key: length, value: occurrences) into a
+    dense array of occurrences where the index is the length. Lengths which
+    never occurred are 0.
+
+    An array.array rather than a NumPy array, so ingesting files doesn't
+    require NumPy; stex_plotting views it as a NumPy array without copying.
+    """
+    size = (max(distribution) + 1) if distribution else 0
+    histogram = array('Q', [0]) * size
+    for length, occurrences in distribution.items():
+        histogram[length] = occurrences
+    return histogram
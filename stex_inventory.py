@@ -0,0 +1,150 @@
+"""
+
+1DV501 Final Project - SimpleTextAnalysis
+stex_inventory.py
+
+Author: Daniel Lind
+
+Defines the inventory of loaded files used by the TUI. It's used just like
+the list it replaces, but it keeps track of roughly how much memory the
+results of every file take up (see TextFile.get_memory_footprint). Once
+they add up to more than the memory budget, the results of the files which
+were used least recently are moved to disk (see TextFile.spill), and read
+back as soon as one of them is selected, or otherwise used, again.
+
+Function Prefix Legend:
+    get_* : Return some value based on the files in the inventory
+
+"""
+
+# Imports
+import itertools
+import os
+import tempfile
+from collections import OrderedDict
+import stex_filing as stex
+
+# How many bytes of results may be held in memory before some are moved to disk.
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+class Inventory:
+    """
+    List of loaded TextFiles with a memory budget.
+
+    Getting a file by index (e.g. through tui.select_file_prompt) counts as using
+    it: its results are read back from disk if need be, and it becomes the most
+    recently used file. Iterating over the inventory (e.g. to list the names of
+    the files) doesn't read anything back; use_each does, one file at a time.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET) -> None:
+        """
+        Arguments:
+            memory_budget: bytes of results which may be held in memory. The most
+                           recently used file always stays, even if it's bigger.
+        """
+        self.memory_budget = memory_budget
+        self._files = []
+
+        # Files whose results are in memory, with their footprints,
+        # least recently used first.
+        self._in_memory = OrderedDict()
+
+        # Created when the first file is spilled, and removed when the program exits.
+        self._spill_directory = None
+        self._spill_numbers = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __getitem__(self, index: int) -> stex.TextFile:
+        file = self._files[index]
+        self._use(file)
+        return file
+
+    def use_each(self):
+        """
+        Yields every file in turn, using each one as if it had been selected.
+        The budget is kept while going through them: files whose results had to
+        be read back are moved to disk again as the next ones are read back,
+        rather than all of them ending up in memory at once. So whatever is
+        needed from a file (e.g. get_distribution_summary) should be taken
+        from it before moving on to the next one.
+        """
+        for file in list(self._files):
+            self._use(file)
+            yield file
+
+            # Getting results may have built more of them (e.g. cached word lists).
+            if file in self._in_memory:
+                self._in_memory[file] = file.get_memory_footprint()
+
+    def append(self, file: stex.TextFile) -> None:
+        """
+        Adds a file, which should already hold its results, as the most recently used one.
+        """
+        self._files.append(file)
+        self._use(file)
+
+    def remove(self, file: stex.TextFile) -> None:
+        """
+        Removes a file, and its results from disk (if they were spilled).
+        Raises ValueError if it isn't in the inventory, like list.remove.
+        """
+        self._files.remove(file)
+        self._in_memory.pop(file, None)
+        if file.is_spilled():
+            os.remove(file.spill_path)
+            file.spill_path = None
+
+    def get_memory_usage(self) -> tuple[int, int, int]:
+        """
+        Returns how much memory the results take up, after moving some
+        to disk if they've grown beyond the budget.
+
+        Returns:
+            Tuple containing:
+                bytes of results in memory (int)
+                memory budget in bytes (int)
+                number of files whose results are on disk (int)
+        """
+        self._enforce_budget()
+        spilled_files = sum(1 for file in self._files if file.is_spilled())
+        return sum(self._in_memory.values()), self.memory_budget, spilled_files
+
+    # helper functions
+    def _use(self, file: stex.TextFile) -> None:
+        """
+        Reads the results of a file back if need be, and makes it the most recently used one.
+        """
+        file.restore()
+        self._in_memory[file] = file.get_memory_footprint()
+        self._in_memory.move_to_end(file)
+        self._enforce_budget()
+
+    def _enforce_budget(self) -> None:
+        """
+        Spills the least recently used files until the rest fit in the budget.
+        """
+        # Results may also have been read back by simply using them (see
+        # TextFile.__getattr__); those files count as recently used, with
+        # their footprints as they are now that they're back in memory.
+        for file in self._files:
+            if file not in self._in_memory and not file.is_spilled():
+                self._in_memory[file] = file.get_memory_footprint()
+
+        while sum(self._in_memory.values()) > self.memory_budget and len(self._in_memory) > 1:
+            file, _ = self._in_memory.popitem(last=False)
+            file.spill(self._get_spill_path())
+
+    def _get_spill_path(self) -> str:
+        """
+        Returns a new path in the spill directory, creating the directory if need be.
+        """
+        if self._spill_directory is None:
+            # Cleaned up (along with anything in it) when the program exits.
+            self._spill_directory = tempfile.TemporaryDirectory(prefix='stex-')
+        return os.path.join(self._spill_directory.name, f'{next(self._spill_numbers)}.results')
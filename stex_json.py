@@ -27,6 +27,21 @@ def serialize_all(file: stex.TextFile) -> str:
     Returns:
         Export-ready JSON string.
     """
+    result = serialize_all_as_dict(file)
+    
+    return json.dumps(result, ensure_ascii=False, indent=4)
+
+def serialize_all_as_dict(file: stex.TextFile) -> dict:
+    """
+    Same as serialize_all, but returns the dictionary rather than a JSON
+    string, for callers which embed it in a larger response.
+    
+    Arguments:
+        file: TextFile to consider
+    
+    Returns:
+        JSON formatted dictionary of all analysis results.
+    """
     result = {
         'basic_analysis': serialize_basic_statistics(file),
         'word_analysis': serialize_word_frequency_statistics(file),
@@ -35,7 +50,34 @@ def serialize_all(file: stex.TextFile) -> str:
         'language_analysis': serialize_language_probabilities(file)
     }
     
-    return json.dumps(result, ensure_ascii=False, indent=4)
+    return result
+
+def serialize_estimate_as_dict(file: stex.TextFile) -> dict:
+    """
+    Serializes the results of the quick-estimate mode (see
+    stex_analysis.ingest_file_estimate), which only covers the
+    basic and character statistics. Small files are analysed in
+    full by that mode, and are serialized like serialize_all_as_dict.
+
+    Arguments:
+        file: TextFile to consider
+
+    Returns:
+        JSON formatted dictionary of the estimated results.
+    """
+    if not file.is_estimated():
+        return serialize_all_as_dict(file)
+
+    result = {
+        'basic_analysis': serialize_basic_statistics(file),
+        'character_analysis': serialize_character_statistics(file),
+        'estimate': {
+            'confidence': file.estimate_confidence,
+            'sampled_bytes': file.estimate_sampled_bytes
+        }
+    }
+
+    return result
 
 def serialize_basic_statistics(file: stex.TextFile) -> dict:
     """
@@ -52,13 +94,30 @@ def serialize_basic_statistics(file: stex.TextFile) -> dict:
     result = {
         'line_count': file.number_of_lines,
         'word_count': file.number_of_words,
-        'unique_words': len(file.get_unique_words()),
+        # The quick-estimate mode doesn't count words individually.
+        'unique_words': None if file.is_estimated() else file.get_unique_word_count(),
         'character_count_basic': file.number_of_characters,
         'character_count_with_spaces_basic': file.number_of_characters_and_spaces,
         'average_words_per_line': file.get_average_words_per_line(),
-        'average_characters_per_word': file.get_average_characters_per_word()
+        'average_characters_per_word': file.get_average_characters_per_word(),
+        'encoding': file.encoding or 'utf-8',
+        'fallback_encoding_lines': file.fallback_lines,
+        'replaced_bytes': file.replaced_bytes
     }
 
+    if file.is_estimated():
+        result['estimated'] = True
+        result['confidence_intervals'] = _serialize_intervals(file, {
+            'number_of_lines': 'line_count',
+            'number_of_words': 'word_count',
+            'number_of_characters': 'character_count_basic',
+            'average_words_per_line': 'average_words_per_line'
+        })
+
+    # In the approximate analysis mode, unique_words is an estimate.
+    if file.is_approximate():
+        result['unique_words_relative_error'] = file.get_unique_word_count_error()
+
     # Return a JSON dump of the dictionary, effectively serializing it.
     return result
 
@@ -75,10 +134,20 @@ def serialize_word_frequency_statistics(file: stex.TextFile) -> dict:
 
     # Dictionary
     result = {
-        'word_occurrences': file.word_occurrences,
+        # A WordCounts (see stex_vocabulary), not a dict, so json can't take it as is.
+        'word_occurrences': dict(file.word_occurrences.items()),
         'word_length_occurrences': file.word_length_occurrences
     }
     
+    # In the approximate analysis mode, word_occurrences only holds the most
+    # frequent words, and their occurrences are estimates.
+    if file.is_approximate():
+        error_bound, confidence = file.get_word_occurrence_error_bound()
+        result['approximate'] = {
+            'occurrence_error_bound': error_bound,
+            'confidence': confidence
+        }
+    
     return result
 
 def serialize_sentence_statistics(file: stex.TextFile) -> dict:
@@ -93,18 +162,27 @@ def serialize_sentence_statistics(file: stex.TextFile) -> dict:
         and a distribution of sentence lengths.
     """
     
+    longest_span = file.longest_sentence_span
+    shortest_span = file.shortest_sentence_span
+    
     result = {
         'sentence_count': file.total_sentences,
         'longest_sentence':
             {
-            'length': len(file.longest_sentence_text),
-            'text': file.longest_sentence_text
+            'length': longest_span[2] if longest_span else 0, # in words
+            'text': file.get_sentence_text(longest_span)
             },
         'shortest_sentence':
             {
-            'length': len(file.shortest_sentence_text),
-            'text': file.shortest_sentence_text
+            'length': shortest_span[2] if shortest_span else 0,
+            'text': file.get_sentence_text(shortest_span)
             },
+        'sentence_length_percentiles': file.get_sentence_length_percentiles(),
+        'longest_sentences':
+            [
+            {'length': length, 'start_byte': start, 'end_byte': end}
+            for start, end, length in file.longest_sentence_spans
+            ],
         'sentence_length_occurrences': file.sentence_length_distribution
     }
     
@@ -134,6 +212,16 @@ def serialize_character_statistics(file: stex.TextFile) -> dict:
             },
         'character_occurrences': file.character_occurrences
     }
+
+    if file.is_estimated():
+        result['estimated'] = True
+        result['confidence_intervals'] = _serialize_intervals(file, {
+            'letter_count': 'letters',
+            'digit_count': 'digits',
+            'punctuation_count': 'punctuation',
+            'space_count': 'spaces',
+            'other_count': 'other'
+        })
     
     return result
 
@@ -169,4 +257,23 @@ def deserialize_from_file(path: str) -> dict:
     """
     with open(path, 'r', encoding='utf-8', errors='replace') as file:
         data = json.load(file)
-    return data
\ No newline at end of file
+    return data
+
+# helper functions
+def _serialize_intervals(file: stex.TextFile, names: dict[str, str]) -> dict:
+    """
+    Fetches the confidence intervals of estimated statistics.
+
+    Arguments:
+        file: TextFile holding estimates
+        names: dictionary with key: TextFile attribute name, value: name in the JSON
+
+    Returns:
+        JSON formatted dictionary with key: name in the JSON, value: [low, high]
+    """
+    result = {}
+    for attribute, name in names.items():
+        interval = file.get_estimate_interval(attribute)
+        if interval is not None:
+            result[name] = [round(bound, 3) for bound in interval]
+    return result
@@ -0,0 +1,628 @@
+"""
+
+1DV501 Final Project - SimpleTextAnalysis
+stex_language.py
+
+Author: Daniel Lind
+
+This file contains the language profiles used for language detection.
+
+Rather than comparing an unknown text against one lang_sample_*.json
+dictionary at a time, every profile is packed into a single matrix over a
+shared trigram vocabulary (one row per language, one column per trigram).
+Scoring a text against every known language is then a single
+matrix-vector product, no matter how many languages are installed.
+
+For large amounts of short, in-memory strings (chat lines, tweets, ...)
+score_texts hashes trigrams into a fixed feature space and scores whole
+blocks of strings at a time, optionally spread across worker processes.
+
+There is also an alternative feature set: every character 1-4-gram of
+every word, hashed into a fixed-length vector (lang_ngrams_*.npy profiles).
+Unlike the trigram dictionaries, these vectors are the same size no
+matter how much text went into them.
+
+Function Prefix Legend:
+    count_* : Extracts language features from text
+    load_* : Reads language profiles from disk
+    score_* : Scores texts or trigram occurrences against loaded profiles
+
+"""
+
+# Imports
+import math
+import zlib
+import numpy as np
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+import stex_json as deserializer
+from pathlib import Path
+from json import JSONDecodeError
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from stex_sketch import CountMinSketch
+
+# Scorers understood by score_trigrams.
+#   cosine: cosine similarity between trigram distributions (the original method)
+#   naive_bayes: multinomial naive Bayes with additive (Laplace) smoothing,
+#                converted to posterior probabilities assuming equal priors
+SCORERS = ('cosine', 'naive_bayes')
+
+# Reported by score_texts for strings which can't be compared to any
+# language, because no profiles were found.
+UNKNOWN_LANGUAGE = 'unknown'
+
+# Size of the hashed feature space used by score_texts.
+DEFAULT_HASHED_FEATURES = 65536
+
+# Size of the hashed character n-gram vectors, and which n-grams go into them.
+DEFAULT_NGRAM_FEATURES = 16384
+NGRAM_RANGE = (1, 4)
+
+# Character n-grams are accumulated as a list of columns, and folded into the
+# vector whenever this many have piled up. This bounds memory per document.
+_NGRAM_FLUSH_THRESHOLD = 1 << 20
+
+# Loaded profiles are kept per resources directory, so the JSON files
+# are only parsed once per process.
+_PROFILE_CACHE = {}
+_NGRAM_PROFILE_CACHE = {}
+
+class LanguageProfileMatrix:
+    """
+    Holds every known language profile as rows of a dense matrix
+    over a shared trigram vocabulary.
+    """
+
+    def __init__(self, languages: list[str], vocabulary: dict[str, int] | None, counts: np.ndarray, smoothing: float = 1.0) -> None:
+        """
+        Arguments:
+            languages: language names, one per matrix row
+            vocabulary: mapping of trigram -> matrix column, or None if the
+                        columns are hashed trigrams (see hashed())
+            counts: matrix of shape (languages, vocabulary) holding trigram occurrences
+            smoothing: additive smoothing constant used by the naive Bayes scorer
+        """
+        self.languages = languages
+        self.vocabulary = vocabulary
+        self.counts = counts
+        self.smoothing = smoothing
+
+        # Everything below is derived once here, so scoring only has to
+        # build the document vector and do the products.
+
+        # Cosine: rows scaled to unit length. Cosine similarity doesn't care about
+        # scale, so there is no need to convert counts to percentages first.
+        row_norms = np.linalg.norm(counts, axis=1, keepdims=True)
+        row_norms[row_norms == 0] = 1.0
+        self.unit_rows = counts / row_norms
+
+        # Naive Bayes: log P(trigram | language). One extra slot is reserved
+        # for trigrams which appear in none of the profiles.
+        totals = counts.sum(axis=1, keepdims=True)
+        denominators = totals + smoothing * (counts.shape[1] + 1)
+        self.log_probabilities = np.log(counts + smoothing) - np.log(denominators)
+        self.unknown_log_probabilities = np.log(smoothing) - np.log(denominators[:, 0])
+
+        # Hashed copies of this matrix, keyed by number of features.
+        self._hashed = {}
+
+        # Positions of every vocabulary trigram in a CountMinSketch table,
+        # keyed by (width, depth) of the sketch. See score_sketch.
+        self._sketch_indices = {}
+
+    def hashed(self, n_features: int) -> 'LanguageProfileMatrix':
+        """
+        Returns a copy of this matrix with its vocabulary folded into
+        n_features hashed columns (see _hash_feature). Colliding trigrams
+        simply share a column. The result is cached.
+
+        Arguments:
+            n_features: number of columns in the hashed feature space
+        
+        Returns:
+            LanguageProfileMatrix without a vocabulary
+        """
+        if n_features in self._hashed:
+            return self._hashed[n_features]
+
+        # Column index -> hashed column index
+        hashed_columns = np.zeros(len(self.vocabulary), dtype=np.int64)
+        for trigram, column in self.vocabulary.items():
+            hashed_columns[column] = _hash_feature(trigram, n_features)
+
+        hashed_counts = np.zeros((len(self.languages), n_features), dtype=np.float64)
+        for row in range(len(self.languages)):
+            hashed_counts[row] = np.bincount(hashed_columns, weights=self.counts[row], minlength=n_features)
+
+        matrix = LanguageProfileMatrix(self.languages, None, hashed_counts, self.smoothing)
+        self._hashed[n_features] = matrix
+        return matrix
+
+    def vectorize(self, trigrams: dict[str, int]) -> tuple[np.ndarray, int]:
+        """
+        Maps a trigram dictionary onto the shared vocabulary.
+
+        Arguments:
+            trigrams: dict with key: trigram, value: occurrences
+
+        Returns:
+            Tuple containing:
+                document vector over the vocabulary (np.ndarray)
+                total occurrences of trigrams outside the vocabulary (int)
+        """
+        vector = np.zeros(len(self.vocabulary), dtype=np.float64)
+        unknown = 0
+
+        for trigram, count in trigrams.items():
+            column = self.vocabulary.get(trigram)
+            if column is None:
+                unknown += count
+            else:
+                vector[column] += count
+
+        return vector, unknown
+
+    def score_trigrams(self, trigrams: dict[str, int], scorer: str = 'cosine') -> dict[str, float]:
+        """
+        Scores a trigram dictionary against every language at once.
+
+        Arguments:
+            trigrams: dict with key: trigram, value: occurrences
+            scorer: one of SCORERS
+
+        Returns:
+            Dictionary with key: language name, value: score (float),
+            sorted by score in descending order.
+        """
+        _check_scorer(scorer)
+        if len(trigrams) == 0:
+            return {}
+
+        vector, unknown = self.vectorize(trigrams)
+
+        # The document's magnitude has to include trigrams outside the
+        # vocabulary too, otherwise the cosine would differ from comparing
+        # the two dictionaries directly.
+        document_norm = math.sqrt(sum(count * count for count in trigrams.values()))
+
+        return self._score(vector, unknown, document_norm, scorer)
+
+    def score_sketch(self, sketch: 'CountMinSketch', scorer: str = 'cosine') -> dict[str, float]:
+        """
+        Scores trigram occurrences which were counted in a CountMinSketch
+        (see stex_sketch.py) rather than a dictionary. The sketch is queried
+        for every trigram in the vocabulary.
+
+        Arguments:
+            sketch: CountMinSketch of trigram occurrences
+            scorer: one of SCORERS
+
+        Returns:
+            Dictionary with key: language name, value: score (float),
+            sorted by score in descending order.
+        """
+        _check_scorer(scorer)
+        if sketch.total == 0:
+            return {}
+
+        key = (sketch.width, sketch.depth)
+        if key not in self._sketch_indices:
+            # Hashing the whole vocabulary is the expensive part, so only do it once.
+            indices = np.zeros((sketch.depth, len(self.vocabulary)), dtype=np.int64)
+            for trigram, column in self.vocabulary.items():
+                indices[:, column] = sketch.indices(trigram)
+            self._sketch_indices[key] = indices
+
+        table = np.frombuffer(sketch.table, dtype=np.uint64)
+        vector = table[self._sketch_indices[key]].min(axis=0).astype(np.float64)
+
+        # Estimates are never too low, so the trigrams outside the vocabulary
+        # are at most what's left over.
+        unknown = max(0, sketch.total - int(vector.sum()))
+
+        # The document's magnitude, estimated from the sketch itself.
+        document_norm = math.sqrt(sketch.inner_product(sketch))
+
+        return self._score(vector, unknown, document_norm, scorer)
+
+    def score_vector(self, vector: np.ndarray, scorer: str = 'cosine') -> dict[str, float]:
+        """
+        Scores a document vector which is already laid out like the
+        matrix columns (e.g. a hashed n-gram vector) against every language.
+
+        Arguments:
+            vector: np.ndarray with one occurrence count per column
+            scorer: one of SCORERS
+
+        Returns:
+            Dictionary with key: language name, value: score (float),
+            sorted by score in descending order.
+        """
+        _check_scorer(scorer)
+        if len(vector) != self.counts.shape[1]:
+            raise ValueError(f"Vector has {len(vector)} features, profiles have {self.counts.shape[1]}.")
+
+        document_norm = float(np.linalg.norm(vector))
+        if document_norm == 0:
+            return {}
+
+        return self._score(vector, 0, document_norm, scorer)
+
+    def _score(self, vector: np.ndarray, unknown: int, document_norm: float, scorer: str) -> dict[str, float]:
+        """
+        Shared implementation of score_trigrams, score_sketch and score_vector,
+        which have already checked the scorer.
+        """
+        if len(self.languages) == 0:
+            return {}
+
+        if scorer == 'cosine':
+            scores = (self.unit_rows @ vector) / document_norm
+        else:
+            log_likelihoods = (self.log_probabilities @ vector) + (self.unknown_log_probabilities * unknown)
+            # Softmax, shifted by the maximum to avoid overflowing exp()
+            shifted = np.exp(log_likelihoods - log_likelihoods.max())
+            scores = shifted / shifted.sum()
+
+        results = {language: float(score) for language, score in zip(self.languages, scores)}
+
+        # As is customary, sort before returning to avoid resorting later.
+        return dict(sorted(results.items(), key=lambda item: item[1], reverse=True))
+
+
+def count_word_boundary_trigrams(text: str, occurrences: dict[str, int]) -> int:
+    """
+    Extracts word boundary trigrams from a piece of text and adds them
+    to the provided dictionary. This is the feature set which language
+    samples are made of.
+
+    Arguments:
+        text: text to consider, typically one line
+        occurrences: dict with key: trigram, value: occurrences. Modified in place.
+    
+    Returns:
+        Number of words processed (int)
+    """
+    # Strip everything which isn't a letter (or space)
+    # from the text before proceeding.
+    cleaned_text = "".join(ch.lower() if ch.isalpha() or ch.isspace() else "" for ch in text)
+
+    processed_words = 0
+
+    # Proceed as planned
+    for word in cleaned_text.split():
+        processed_words += 1
+        
+        # Is the word too small to be meaningfully split into trigrams?
+        if len(word) <= 3:
+            # Treat the entire word as a trigram.
+            # Trust me on this.
+            occurrences[word] = occurrences.get(word, 0) + 1
+            continue
+        
+        # Take both the beginning and ending of the word and append them.
+        # Yes, a word like 'else' will be appended both as '$els' and '$lse',
+        # but this will work for our analysis.
+        beginning_trigram = f'${word[0:3]}'
+        ending_trigram = f'{word[-3:]}$'
+        
+        # Check if the key exists in the dictionary and increment it. Otherwise, add it.
+        occurrences[beginning_trigram] = occurrences.get(beginning_trigram, 0) + 1
+        occurrences[ending_trigram] = occurrences.get(ending_trigram, 0) + 1
+
+    return processed_words
+
+def count_hashed_ngrams(lines: Iterable[str], n_features: int = DEFAULT_NGRAM_FEATURES, maximum_words: int | None = None,
+                        return_words: bool = False) -> 'np.ndarray | tuple[np.ndarray, int]':
+    """
+    Counts every character n-gram (see NGRAM_RANGE) of every word into a
+    fixed-length vector using the hashing trick. Words are padded with a
+    space on either side, so n-grams at word boundaries are distinct
+    from those inside words (' th' vs 'th').
+
+    Arguments:
+        lines: iterable of text, typically the lines of a file
+        n_features: length of the resulting vector
+        maximum_words: stop after roughly this many words (None = no limit)
+        return_words: also return the number of words processed, counted the same
+                      way as count_word_boundary_trigrams counts them
+    
+    Returns:
+        np.ndarray of length n_features holding n-gram occurrences,
+        or a tuple of it and the number of words processed (int) if return_words is set
+    """
+    vector = np.zeros(n_features, dtype=np.float64)
+
+    # Because of Zipf's law, most words repeat over and over. Remember the
+    # hashed columns of each word rather than slicing and hashing it again.
+    columns_of_word = {}
+    pending_columns = []
+    processed_words = 0
+    smallest, largest = NGRAM_RANGE
+
+    for line in lines:
+        if maximum_words is not None and processed_words > maximum_words:
+            # We've reached our limit, abort.
+            break
+
+        # Same cleaning as the word boundary trigrams: letters only, lowercase.
+        cleaned_line = "".join(ch.lower() if ch.isalpha() or ch.isspace() else "" for ch in line)
+
+        for word in cleaned_line.split():
+            processed_words += 1
+
+            columns = columns_of_word.get(word)
+            if columns is None:
+                padded = f' {word} '
+                columns = []
+                for n in range(smallest, largest + 1):
+                    for start in range(len(padded) - n + 1):
+                        ngram = padded[start:start + n]
+                        # A lone space is not a meaningful feature.
+                        if ngram != ' ':
+                            columns.append(_hash_feature(ngram, n_features))
+                columns_of_word[word] = columns
+
+            pending_columns.extend(columns)
+
+        if len(pending_columns) >= _NGRAM_FLUSH_THRESHOLD:
+            vector += np.bincount(pending_columns, minlength=n_features)
+            pending_columns = []
+
+    if pending_columns:
+        vector += np.bincount(pending_columns, minlength=n_features)
+
+    if return_words:
+        return vector, processed_words
+    return vector
+
+def score_texts(texts: Iterable[str], scorer: str = 'cosine', block_size: int = 4096, processes: int | None = None,
+                n_features: int = DEFAULT_HASHED_FEATURES, resources_directory: str = 'resources') -> Iterator[tuple[str | None, float]]:
+    """
+    Identifies the language of every string in texts. Strings are read
+    lazily and scored in blocks of block_size, so arbitrarily many strings
+    can be classified without holding them all in memory.
+
+    Arguments:
+        texts: iterable of strings, e.g. chat lines
+        scorer: one of SCORERS
+        block_size: number of strings scored per matrix product
+        processes: if set to more than 1, blocks are scored in this many worker processes
+        n_features: size of the hashed feature space
+        resources_directory: directory to search for language samples
+    
+    Returns:
+        Iterator of (best language, score) tuples in the same order as texts.
+        Strings without a single usable word yield (None, 0.0), and if no
+        profiles were found, every other string yields (UNKNOWN_LANGUAGE, 0.0).
+    """
+    # Checked (and the profiles loaded) right away, rather than once the
+    # first string is scored, so a mistake is reported by the call itself.
+    _check_scorer(scorer)
+    load_language_profiles(resources_directory).hashed(n_features)
+    
+    return _score_text_blocks(_split_into_blocks(texts, block_size), scorer, processes, n_features, resources_directory)
+
+def load_language_profiles(resources_directory: str = 'resources') -> LanguageProfileMatrix:
+    """
+    Reads every lang_sample_*.json file in the resources directory and packs
+    them into a LanguageProfileMatrix. Results are cached per directory.
+
+    Arguments:
+        resources_directory: directory to search for language samples
+
+    Returns:
+        LanguageProfileMatrix
+    """
+    if resources_directory in _PROFILE_CACHE:
+        return _PROFILE_CACHE[resources_directory]
+
+    languages = []
+    profiles = []
+    vocabulary = {}
+
+    # Sorted, so the row order (and thereby the ordering of ties) is stable.
+    for lang_sample_path in sorted(Path(resources_directory).rglob('lang_sample_*.json')):
+        try:
+            profile = deserializer.deserialize_from_file(lang_sample_path)
+        except JSONDecodeError:
+            # File was not valid json, ignore it!
+            continue
+
+        languages.append(lang_sample_path.stem.replace('lang_sample_', ''))
+        profiles.append(profile)
+
+        # Every trigram gets a column the first time any profile mentions it.
+        for trigram in profile:
+            if trigram not in vocabulary:
+                vocabulary[trigram] = len(vocabulary)
+
+    counts = np.zeros((len(languages), len(vocabulary)), dtype=np.float64)
+    for row, profile in enumerate(profiles):
+        for trigram, count in profile.items():
+            counts[row, vocabulary[trigram]] = count
+
+    matrix = LanguageProfileMatrix(languages, vocabulary, counts)
+    _PROFILE_CACHE[resources_directory] = matrix
+    return matrix
+
+
+def load_ngram_profiles(resources_directory: str = 'resources') -> LanguageProfileMatrix:
+    """
+    Reads every lang_ngrams_*.npy file (hashed character n-gram profiles,
+    generated by trigram_sample_generator.py) in the resources directory and
+    packs them into a LanguageProfileMatrix. Results are cached per directory.
+
+    Profiles whose length differs from the first profile found are ignored,
+    since they were hashed into a different feature space.
+
+    Arguments:
+        resources_directory: directory to search for n-gram profiles
+
+    Returns:
+        LanguageProfileMatrix without a vocabulary
+    """
+    if resources_directory in _NGRAM_PROFILE_CACHE:
+        return _NGRAM_PROFILE_CACHE[resources_directory]
+
+    languages = []
+    rows = []
+
+    for profile_path in sorted(Path(resources_directory).rglob('lang_ngrams_*.npy')):
+        try:
+            profile = np.load(profile_path)
+        except ValueError:
+            # Not a valid .npy file, ignore it!
+            continue
+
+        if profile.ndim != 1 or (rows and len(profile) != len(rows[0])):
+            continue
+
+        languages.append(profile_path.stem.replace('lang_ngrams_', ''))
+        rows.append(profile.astype(np.float64))
+
+    if rows:
+        counts = np.vstack(rows)
+    else:
+        counts = np.zeros((0, DEFAULT_NGRAM_FEATURES), dtype=np.float64)
+
+    matrix = LanguageProfileMatrix(languages, None, counts)
+    _NGRAM_PROFILE_CACHE[resources_directory] = matrix
+    return matrix
+
+
+# helper functions
+def _check_scorer(scorer: str) -> None:
+    """
+    Raises a ValueError if scorer isn't one of SCORERS.
+    """
+    if scorer not in SCORERS:
+        raise ValueError(f"Unknown scorer '{scorer}'. Expected one of: {', '.join(SCORERS)}")
+
+def _hash_feature(trigram: str, n_features: int) -> int:
+    """
+    Maps a trigram (or any other n-gram) to a column of the hashed feature space.
+    crc32 is used rather than hash(), since hash() is randomized per process
+    and worker processes have to agree on the columns.
+    """
+    return zlib.crc32(trigram.encode('utf-8')) % n_features
+
+def _split_into_blocks(texts: Iterable[str], block_size: int) -> Iterator[list[str]]:
+    """
+    Lazily groups an iterable of strings into lists of at most block_size strings.
+    """
+    block = []
+    for text in texts:
+        block.append(text)
+        if len(block) >= block_size:
+            yield block
+            block = []
+    
+    if block:
+        yield block
+
+def _score_text_blocks(blocks: Iterator[list[str]], scorer: str, processes: int | None, n_features: int,
+                       resources_directory: str) -> Iterator[tuple[str | None, float]]:
+    """
+    Scores blocks of strings one after the other, or in worker processes. See score_texts.
+    """
+    if processes is None or processes <= 1:
+        for block in blocks:
+            yield from _score_block(block, scorer, n_features, resources_directory)
+        return
+
+    # Only keep a couple of blocks per worker in flight. Executor.map would
+    # otherwise consume the entire input up front.
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = deque()
+        for block in blocks:
+            pending.append(executor.submit(_score_block, block, scorer, n_features, resources_directory))
+            if len(pending) >= processes * 2:
+                yield from pending.popleft().result()
+        
+        while pending:
+            yield from pending.popleft().result()
+
+def _score_block(texts: list[str], scorer: str, n_features: int, resources_directory: str) -> list[tuple[str | None, float]]:
+    """
+    Scores a block of strings against every language with a single sparse
+    matrix product. Top-level function so it can run in a worker process.
+
+    Returns:
+        List of (best language, score) tuples, one per string.
+    """
+    profiles = load_language_profiles(resources_directory).hashed(n_features)
+    
+    if scorer == 'cosine':
+        weights = profiles.unit_rows
+    else:
+        weights = profiles.log_probabilities
+
+    # The block is built as a sparse matrix in coordinate form:
+    # feature (column) and count of every non-zero entry, plus where each
+    # string's entries begin. Strings without features are left out.
+    columns = []
+    values = []
+    row_starts = []
+    scored_rows = []
+    
+    # Many trigrams repeat within a block - only hash each of them once.
+    hash_cache = {}
+    
+    for index, text in enumerate(texts):
+        trigrams = {}
+        count_word_boundary_trigrams(text, trigrams)
+        
+        # Fold trigrams into hashed columns first, so a string's
+        # columns are unique (which the norm below relies on).
+        hashed_trigrams = {}
+        for trigram, count in trigrams.items():
+            column = hash_cache.get(trigram)
+            if column is None:
+                column = _hash_feature(trigram, n_features)
+                hash_cache[trigram] = column
+            hashed_trigrams[column] = hashed_trigrams.get(column, 0) + count
+
+        if not hashed_trigrams:
+            continue
+        
+        row_starts.append(len(columns))
+        scored_rows.append(index)
+        columns.extend(hashed_trigrams.keys())
+        values.extend(hashed_trigrams.values())
+    
+    results = [(None, 0.0)] * len(texts)
+    if not scored_rows:
+        return results
+    
+    if not profiles.languages:
+        # Nothing to compare against (there's no best of zero scores).
+        for row in scored_rows:
+            results[row] = (UNKNOWN_LANGUAGE, 0.0)
+        return results
+    
+    columns = np.array(columns, dtype=np.int64)
+    values = np.array(values, dtype=np.float64)
+    row_starts = np.array(row_starts, dtype=np.int64)
+
+    # (entries x languages): each entry's contribution to every language,
+    # summed per string. This is the sparse matrix-vector product, done for
+    # the whole block at once.
+    scores = np.add.reduceat(weights[:, columns].T * values[:, None], row_starts, axis=0)
+
+    if scorer == 'cosine':
+        norms = np.sqrt(np.add.reduceat(values * values, row_starts))
+        scores = scores / norms[:, None]
+    else:
+        # Softmax per string, shifted by the maximum to avoid overflowing exp()
+        shifted = np.exp(scores - scores.max(axis=1, keepdims=True))
+        scores = shifted / shifted.sum(axis=1, keepdims=True)
+
+    best = scores.argmax(axis=1)
+    for row, language_index, score in zip(scored_rows, best, scores[np.arange(len(best)), best]):
+        results[row] = (profiles.languages[language_index], float(score))
+
+    return results
@@ -22,18 +22,41 @@ from pathlib import Path  # ...for text file search and display
 import stex_filing as stex   # ...contains classes to track data on files
 import stex_json as serializer   # ...contains functions to serialize/deserialize data
 import stex_analysis as analyse
-import stex_plotting as plot # ...contains all matplotlib shenanigans
 import stex_pretty as pretty  # ...to get human-readable results
 import stex_tui as tui # ...for terminal user interface
+from stex_inventory import Inventory # ...keeps loaded files within a memory budget
 from stex_exceptions import OperationCancelled # ...custom exception
 
+# stex_plotting contains all matplotlib shenanigans. Importing matplotlib
+# (and NumPy) takes longer than everything else put together, so it's
+# deferred until the first chart is actually shown.
+def _plotting():
+    """
+    Helper function.
+    Imports stex_plotting on first use and returns the module.
+    """
+    import stex_plotting
+    return stex_plotting
+
 def _analyze_all(loaded_file: stex.TextFile) -> None:
-    print("Successfully loaded file! Starting analysis.")
+    print(f"Successfully loaded {loaded_file.shortname}! Starting analysis.")
     
+    # Files which can't be read back (e.g. in archives) are analysed in a
+    # single traversal instead, see analyse.ingest_file.
+    if not loaded_file.is_seekable():
+        print(" [1-5] Performing all analysis passes at once... ", end='')
+        analyse.ingest_file(loaded_file)
+        print("done!")
+        print("All analysis passes completed without issue.")
+        return
+
     print(" [1] Performing basic analysis... ", end='')
     basic_statistics = analyse.invoke_basic_statistics(loaded_file)
     loaded_file.append_basic_statistics(basic_statistics)
     print("done!")
+    if loaded_file.fallback_lines or loaded_file.replaced_bytes:
+        print(f"     Note: not entirely valid UTF-8, decoded as {loaded_file.get_encoding_description()} "
+              f"({loaded_file.replaced_bytes:,} undecodable bytes replaced).")
 
     print(" [2] Performing word frequency analysis... ", end='')
     word_statistics = analyse.invoke_word_frequency_statistics(loaded_file)
@@ -102,6 +125,7 @@ def execute(master_file_inventory: list[stex.TextFile], user_choice: str) -> Non
             
             i = identify language
             m = word frequency comparison 2 files
+            o = overlay distributions of all loaded files
 
     Does not return a value - delegates action and prints to screen.
     """
@@ -127,13 +151,27 @@ def execute(master_file_inventory: list[stex.TextFile], user_choice: str) -> Non
 
         case 'l': # Load file
             try:
-                loaded_file = tui.load_file_prompt(master_file_inventory)
+                loaded_files = tui.load_file_prompt()
             except OperationCancelled:
                 print("Cancelled.")
                 return
             
-            # Performs all exercise passes and saves data ("ingests" file)
-            _analyze_all(loaded_file)
+            # Performs all exercise passes and saves data ("ingests" file).
+            # An archive loads every text file in it, one after the other.
+            # Files are only added to the inventory once they hold their results,
+            # so that the inventory knows how much memory they take up.
+            # A truncated or corrupt file (or archive member) is reported and skipped,
+            # and a compressed archive can't be read any further after one.
+            try:
+                for loaded_file in loaded_files:
+                    try:
+                        _analyze_all(loaded_file)
+                    except stex.READ_ERRORS as e:
+                        print(f"\nCould not read {loaded_file.shortname}: {str(e) or type(e).__name__}")
+                        continue
+                    master_file_inventory.append(loaded_file)
+            except stex.READ_ERRORS as e:
+                print(f"Could not read the rest of the archive: {str(e) or type(e).__name__}")
             return
 
         case 'u': #Unload file
@@ -167,7 +205,7 @@ def execute(master_file_inventory: list[stex.TextFile], user_choice: str) -> Non
         case 'b': # Basic statistics
             result = pretty.fetch_basic_statistics(selected_file)
             print(result)
-            plot.plot_basic_analysis(selected_file)
+            _plotting().plot_basic_analysis(selected_file)
             return
         
         case 'w': # Word frequency statistics
@@ -177,10 +215,10 @@ def execute(master_file_inventory: list[stex.TextFile], user_choice: str) -> Non
             length_stats = pretty.fetch_word_length_statistics(selected_file)
             print(length_stats)
             
-            orphan_word_count = len(selected_file.get_orphan_words())
+            orphan_word_count = selected_file.get_orphan_word_count()
             print(f'Words appearing only once: {pretty._format_number(orphan_word_count)}')
             
-            plot.plot_word_analysis(selected_file, 10)
+            _plotting().plot_word_analysis(selected_file, 10)
             return
         
         case 's': # Sentence analysis
@@ -188,8 +226,10 @@ def execute(master_file_inventory: list[stex.TextFile], user_choice: str) -> Non
             print(frequency_table)
             sentence_stats = pretty.fetch_sentence_statistics(selected_file)
             print(sentence_stats)
+            longest_sentences = pretty.fetch_longest_sentences_table(selected_file)
+            print(longest_sentences)
             
-            plot.plot_sentence_analysis(selected_file)
+            _plotting().plot_sentence_analysis(selected_file)
             return
 
         case 'c': # Character analysis
@@ -198,13 +238,13 @@ def execute(master_file_inventory: list[stex.TextFile], user_choice: str) -> Non
             letter_type_distribution_table = pretty.fetch_character_type_distribution_table(selected_file)
             print(letter_type_distribution_table)
             
-            plot.plot_character_analysis(selected_file, 10)
+            _plotting().plot_character_analysis(selected_file, 10)
             return
         
         case 'i': # Identify language
             language_probability_table = pretty.fetch_language_guess_table(selected_file)
             print(language_probability_table)
-            plot.plot_language_confidence(selected_file)
+            _plotting().plot_language_confidence(selected_file)
             return
         
         case 'm': # Measure similarity between unique word distribution
@@ -222,6 +262,17 @@ def execute(master_file_inventory: list[stex.TextFile], user_choice: str) -> Non
             result = pretty.fetch_similarity_two_files(cosine_similarity)
             print(result)
 
+        case 'o': # Overlay distributions of every loaded file
+            if len(master_file_inventory) == 0:
+                print("No files are loaded! Load one with <L>")
+                return
+            
+            # One file at a time, so reading back files which were moved to
+            # disk doesn't take up more memory than the budget (see stex_inventory).
+            summaries = [file.get_distribution_summary() for file in master_file_inventory.use_each()]
+            _plotting().plot_comparison(summaries)
+            return
+
         case _:
             print('Invalid selection.')
             return
@@ -298,8 +349,8 @@ def main():
     
     print(intro_header)
 
-    # Instantiate the main list  of TextFiles
-    main_inventory = []
+    # Instantiate the main list  of TextFiles (see stex_inventory)
+    main_inventory = Inventory()
 
     # Transfer executon to main menu loop. Will return here (and exit) when the user quits.
     menu_loop(main_inventory)
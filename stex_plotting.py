@@ -6,18 +6,54 @@ Author: Daniel Lind
 
 This file contains all functionality related to matplotlib.
 
+Every plot_* function can either show its figure interactively (the default)
+or, given an output_path, save it to an image file instead. Each kind of plot
+reuses a single figure object between calls, rather than creating a new one.
+
+For batch runs, render_file_charts saves every chart of a TextFile without
+a display (see use_headless_backend), skipping charts whose underlying
+results haven't changed since they were last rendered.
+
 Function Prefix Legend:
-    plot_* : Generates and shows a matplotlib figure.
+    plot_* : Generates and shows (or saves) a matplotlib figure.
+    render_* : Saves figures to image files without showing them.
 
 """
 
 # Imports
+import hashlib
+import json
+import os
+import re
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import numpy as np
 import stex_filing as stex
-
-def plot_basic_analysis(file: stex.TextFile) -> None:
+import stex_json as serializer
+
+# plot_comparison draws one line per file up to this many files. Beyond that,
+# it draws the median and spread of all files instead, which stays readable
+# (and fast) even for a thousand files.
+MAXIMUM_INDIVIDUAL_FILES = 12
+
+# Distributions in plot_comparison are merged into wider bins if they would
+# otherwise have more than this many bins.
+MAXIMUM_BINS = 60
+
+# Charts saved by render_file_charts: name used in the file name, plot function,
+# and the serializer whose output the chart is drawn from (for cache keys).
+CHARTS = {
+    'basic': ('plot_basic_analysis', serializer.serialize_basic_statistics),
+    'words': ('plot_word_analysis', serializer.serialize_word_frequency_statistics),
+    'sentences': ('plot_sentence_analysis', serializer.serialize_sentence_statistics),
+    'characters': ('plot_character_analysis', serializer.serialize_character_statistics),
+    'language': ('plot_language_confidence', serializer.serialize_language_probabilities),
+}
+
+IMAGE_FORMATS = ('png', 'svg')
+
+def plot_basic_analysis(file: stex.TextFile, output_path: str | None = None) -> None:
     """
     Plots basic statistics: number of lines, words, characters, and spaces.
     Also shows a pie chart of characters vs spaces. 
@@ -25,6 +61,7 @@ def plot_basic_analysis(file: stex.TextFile) -> None:
 
     Arguments:
         file: TextFile object to analyze
+        output_path: if set, the figure is saved there (.png/.svg) instead of shown
     """
 
     # Fetch data
@@ -35,7 +72,7 @@ def plot_basic_analysis(file: stex.TextFile) -> None:
 
     # Prepare figure with 1 row, 2 columns.
     # One of these columns will be our bar chart, the other will be the pie chart.
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6), num='Basic Analysis', clear=True)
 
     # For text composition, we'll a basic bar chart.
     # Define categories/values
@@ -72,11 +109,10 @@ def plot_basic_analysis(file: stex.TextFile) -> None:
     ax2.axis('off')
 
     # Display figure
-    plt.tight_layout()
-    plt.show()
+    _finish_figure(fig, output_path)
 
 
-def plot_word_analysis(file: stex.TextFile, top_n: int = 10) -> None:
+def plot_word_analysis(file: stex.TextFile, top_n: int = 10, output_path: str | None = None) -> None:
     """
     Plots the most common words and a histogram of word lengths.
     Does not return - shows matplotlib figure.
@@ -84,9 +120,10 @@ def plot_word_analysis(file: stex.TextFile, top_n: int = 10) -> None:
     Arguments:
         file: TextFile object
         top_n: number of top words to display
+        output_path: if set, the figure is saved there (.png/.svg) instead of shown
     """
     # Define figure with two columns
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10,5))
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10,5), num='Word Analysis', clear=True)
 
     # Get data from textfile object
     top_words_dict = file.get_top_elements_of_dictionary(file.word_occurrences, top_n)
@@ -100,54 +137,49 @@ def plot_word_analysis(file: stex.TextFile, top_n: int = 10) -> None:
     ax1.tick_params(axis='x', rotation=45)
 
     # For our 2nd column, use a word length histogram.
-    # Get data from TextFile.
-    word_lengths_dict = file.word_length_occurrences
-    lengths = np.array(list(word_lengths_dict.keys()))
-    counts = np.array(list(word_lengths_dict.values()))
-    
-    # Calculate bins for the histogram.
-    # If there are no word lengths (somehow), use a dummy array.
-    # Note - using arange here is.. dubious. We're not filling our 
-    # range with floats. This is a holdover from some copied code.
-    # Buuut it works and might be faster, so there's no point in downgrading.
-    bins = np.arange(1, lengths.max() + 2) if lengths.size > 0 else np.array([0, 1])
-
-    # Add histogram to figure's 2nd column
-    ax2.hist(lengths, bins=bins, weights=counts, edgecolor='black')
+    # The TextFile already holds a dense histogram (index = length), which
+    # NumPy can use as-is without converting the dictionary every time.
+    counts = _as_numpy_histogram(file.word_length_histogram)
+    lengths = np.arange(len(counts))
+
+    # Add histogram to figure's 2nd column. Length 0 never occurs, so skip it.
+    # Each bar spans [length, length + 1), like the histogram bins used to.
+    ax2.bar(lengths[1:], counts[1:], width=1.0, align='edge', edgecolor='black')
     ax2.set_title('Word Length Distribution')
     ax2.set_xlabel('Word Length')
     ax2.set_ylabel('Frequency')
 
     # Show figure
-    plt.tight_layout()
-    plt.show(block=True)
+    _finish_figure(fig, output_path, block=True)
 
 
-def plot_sentence_analysis(file: stex.TextFile, top_n: int = 10) -> None:
+def plot_sentence_analysis(file: stex.TextFile, top_n: int = 10, output_path: str | None = None) -> None:
     """
     Plots sentence length distribution and the most common sentence lengths.
     Does not return value - shows matplotlib figure.
 
     Arguments:
         file: TextFile object
+        top_n: number of most common sentence lengths to display
+        output_path: if set, the figure is saved there (.png/.svg) instead of shown
     """
 
     # Same procedure as always. Initialize figure, two columns.
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10,5))
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10,5), num='Sentence Analysis', clear=True)
 
     sentence_length_dictionary = file.sentence_length_distribution
-    # Numpy array used because it provides lengths.min and lengths.max
-    # later on. This could be done without numpy but it'd be way uglier.
-    # For once I had to compromise only readability.
-    lengths = np.array(list(sentence_length_dictionary.keys()))
-    counts = np.array(list(sentence_length_dictionary.values()))
+    if not sentence_length_dictionary:
+        raise ValueError("No sentences to plot.")
+
+    # Dense histogram (index = length), viewed as a NumPy array without copying.
+    counts = _as_numpy_histogram(file.sentence_length_histogram)
     
-    # Calculate bins for the histogram.
-    # Note - 'np.arange' is like 'range' but float compatible. 
-    bins = np.arange(lengths.min() - 0.5, lengths.max() + 1.5, 1.0)
+    # Only plot from the shortest sentence length which actually occurs.
+    shortest = int(np.flatnonzero(counts)[0])
+    lengths = np.arange(shortest, len(counts))
 
-    # Add histogram to figure's 1st column 
-    ax1.hist(lengths, bins=bins, weights=counts, edgecolor='black')
+    # Add histogram to figure's 1st column, one bar centered on each length.
+    ax1.bar(lengths, counts[shortest:], width=1.0, edgecolor='black')
     ax1.set_title('Sentence Length Distribution')
     ax1.set_xlabel('Words per Sentence')
     ax1.set_ylabel('Frequency')
@@ -177,11 +209,10 @@ def plot_sentence_analysis(file: stex.TextFile, top_n: int = 10) -> None:
     ax2.set_ylabel("Frequency")
 
     # Show figure
-    plt.tight_layout()
-    plt.show(block=True)
+    _finish_figure(fig, output_path, block=True)
 
 
-def plot_character_analysis(file: stex.TextFile, top_n: int=10) -> None:
+def plot_character_analysis(file: stex.TextFile, top_n: int=10, output_path: str | None = None) -> None:
     """
     Plots the most common characters and a pie chart of character types.
     Does not return a value - shows matplotlib figure.
@@ -189,10 +220,11 @@ def plot_character_analysis(file: stex.TextFile, top_n: int=10) -> None:
     Arguments:
         file: TextFile object
         top_n: number of top characters to display
+        output_path: if set, the figure is saved there (.png/.svg) instead of shown
     """
 
     # You know the drill by now. Initialize figure, two columns
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10,5))
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10,5), num='Character Analysis', clear=True)
 
     # Top characters. Unconstrained, unlike the stex_pretty version.
     top_chars_dict = file.get_top_elements_of_dictionary(file.character_occurrences, top_n)
@@ -226,10 +258,9 @@ def plot_character_analysis(file: stex.TextFile, top_n: int=10) -> None:
     ax2.axis('off')
 
     # Display figure
-    plt.tight_layout()
-    plt.show()
+    _finish_figure(fig, output_path)
 
-def plot_language_confidence(file: stex.TextFile, top_n: int = 5) -> None:
+def plot_language_confidence(file: stex.TextFile, top_n: int = 5, output_path: str | None = None) -> None:
     """
     Plot the top-N language confidence scores as a bar chart.
     Does not return value - shows matplotlib figure.
@@ -237,6 +268,7 @@ def plot_language_confidence(file: stex.TextFile, top_n: int = 5) -> None:
     Arguments:
         file: TextFile object
         top_n: how many top matches to show (default 5)
+        output_path: if set, the figure is saved there (.png/.svg) instead of shown
     """
     confidences = file.language_probabilities
     
@@ -259,7 +291,7 @@ def plot_language_confidence(file: stex.TextFile, top_n: int = 5) -> None:
 
 
     # Plot - only one column in this figure as opposed to other plots.
-    fig, ax = plt.subplots(figsize=(8, 5))
+    fig, ax = plt.subplots(figsize=(8, 5), num='Language Confidence', clear=True)
     bars = ax.bar(languages, scores_percentages, edgecolor='black') 
 
     # Annotate each bar with percentage text above it
@@ -276,5 +308,187 @@ def plot_language_confidence(file: stex.TextFile, top_n: int = 5) -> None:
     ax.set_title(f"Top {len(languages)} Language Matches")
     
     # Display figure
-    plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    _finish_figure(fig, output_path)
+
+def plot_comparison(summaries: list[dict], output_path: str | None = None) -> None:
+    """
+    Overlays the word length, sentence length and character type
+    distributions of many files in one figure. All distributions are
+    shown as fractions of each file's total, so files of different
+    sizes can be compared.
+    Does not return value - shows matplotlib figure.
+
+    Arguments:
+        summaries: list of dictionaries as returned by TextFile.get_distribution_summary()
+        output_path: if set, the figure is saved there (.png/.svg) instead of shown
+    """
+    if not summaries:
+        raise ValueError("No files to compare.")
+
+    fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(16, 5), num='File Comparison', clear=True)
+    names = [summary['shortname'] for summary in summaries]
+
+    _plot_distribution_overlay(ax1, [summary['word_length_histogram'] for summary in summaries], names)
+    ax1.set_title('Word Length Distribution')
+    ax1.set_xlabel('Word Length')
+    ax1.set_ylabel('Share of Words')
+
+    _plot_distribution_overlay(ax2, [summary['sentence_length_histogram'] for summary in summaries], names)
+    ax2.set_title('Sentence Length Distribution')
+    ax2.set_xlabel('Words per Sentence')
+    ax2.set_ylabel('Share of Sentences')
+
+    # Character types: (files x types) matrix of fractions.
+    type_names = list(summaries[0]['character_types'].keys())
+    type_counts = np.array([list(summary['character_types'].values()) for summary in summaries], dtype=np.float64)
+    totals = type_counts.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    type_fractions = type_counts / totals
+
+    if len(summaries) <= MAXIMUM_INDIVIDUAL_FILES:
+        # One stacked bar per file.
+        y = np.arange(len(summaries))
+        left = np.zeros(len(summaries))
+        for column, type_name in enumerate(type_names):
+            ax3.barh(y, type_fractions[:, column], left=left, label=type_name, edgecolor='black')
+            left += type_fractions[:, column]
+        ax3.set_yticks(y)
+        ax3.set_yticklabels(names, fontsize=8)
+        ax3.legend(fontsize=8, loc='lower right')
+    else:
+        # Too many files for a bar each - show the spread per type instead.
+        ax3.boxplot(type_fractions, showfliers=False)
+        ax3.set_xticks(np.arange(1, len(type_names) + 1))
+        ax3.set_xticklabels(type_names)
+    ax3.set_title('Character Type Distribution')
+
+    # Display figure
+    _finish_figure(fig, output_path)
+
+def use_headless_backend() -> None:
+    """
+    Switches matplotlib to a non-interactive backend, so figures can be
+    rendered to files without a display (e.g. on a server or in worker processes).
+    """
+    plt.switch_backend('Agg')
+
+def render_file_charts(file: stex.TextFile, output_directory: str, image_format: str = 'png',
+                       base_name: str | None = None) -> list[str]:
+    """
+    Saves every chart of an analysed TextFile as an image file, named
+    [file name].[chart].[hash].[format]. The hash is taken over the results
+    each chart is drawn from, so a chart which already exists for the same
+    results is not rendered again.
+
+    Arguments:
+        file: analysed TextFile
+        output_directory: directory to save images in (created if missing)
+        image_format: 'png' or 'svg'
+        base_name: file name to use (default: file.get_base_name()). Must be
+                   unique among the files whose charts are in output_directory.
+
+    Returns:
+        List of paths to the images of this file (rendered or reused).
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format '{image_format}'. Expected one of: {', '.join(IMAGE_FORMATS)}")
+
+    os.makedirs(output_directory, exist_ok=True)
+    if base_name is None:
+        base_name = file.get_base_name()
+    image_paths = []
+
+    for chart, (plot_function_name, serialize) in CHARTS.items():
+        # Hash of the results this chart is drawn from.
+        data = json.dumps(serialize(file), sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+        image_path = os.path.join(output_directory, f'{base_name}.{chart}.{digest}.{image_format}')
+
+        if not os.path.exists(image_path):
+            try:
+                globals()[plot_function_name](file, output_path=image_path)
+            except ValueError:
+                # Nothing to plot (e.g. a file without sentences).
+                continue
+
+            # Remove images rendered from earlier results of the same file: exactly
+            # [file name].[chart].[hash].[format], so that the charts of a file whose
+            # name merely starts the same (e.g. "novel.word" and "novel") are left alone.
+            earlier_image = re.compile(rf'{re.escape(base_name)}\.{chart}\.[0-9a-f]{{{len(digest)}}}\.{image_format}')
+            for existing in os.listdir(output_directory):
+                if earlier_image.fullmatch(existing) and existing != os.path.basename(image_path):
+                    os.remove(os.path.join(output_directory, existing))
+
+        image_paths.append(image_path)
+
+    return image_paths
+
+# helper functions
+def _as_numpy_histogram(histogram) -> np.ndarray:
+    """
+    Views a dense histogram (array.array of unsigned 64-bit integers, see
+    stex_filing._dense_histogram) as a NumPy array, without copying it.
+    """
+    if len(histogram) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    return np.frombuffer(histogram, dtype=np.uint64)
+
+def _plot_distribution_overlay(ax: matplotlib.axes.Axes, histograms: list, names: list[str]) -> None:
+    """
+    Draws the distributions of many dense histograms on the same axes.
+
+    Every histogram is normalized to fractions of its own total. The longest
+    0.5% of the combined distribution is cut off (otherwise a single outlier
+    stretches the axis), and neighbouring lengths are merged into wider bins
+    if there would be more than MAXIMUM_BINS of them. Up to
+    MAXIMUM_INDIVIDUAL_FILES files get a line each; beyond that, only the
+    median and the 10th-90th percentile band across files are drawn.
+    """
+    longest = max(len(histogram) for histogram in histograms)
+    if longest == 0:
+        return
+
+    # (files x lengths) matrix of fractions.
+    matrix = np.zeros((len(histograms), longest), dtype=np.float64)
+    for row, histogram in enumerate(histograms):
+        matrix[row, :len(histogram)] = _as_numpy_histogram(histogram)
+    totals = matrix.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    matrix /= totals
+
+    # Cut off the far tail of the combined distribution.
+    cumulative = np.cumsum(matrix.sum(axis=0))
+    if cumulative[-1] > 0:
+        cutoff = int(np.searchsorted(cumulative, cumulative[-1] * 0.995)) + 1
+        matrix = matrix[:, :cutoff]
+
+    # Merge neighbouring lengths into wider bins if needed.
+    bin_width = max(1, -(-matrix.shape[1] // MAXIMUM_BINS))
+    bin_starts = np.arange(0, matrix.shape[1], bin_width)
+    if bin_width > 1:
+        matrix = np.add.reduceat(matrix, bin_starts, axis=1)
+    edges = np.append(bin_starts, bin_starts[-1] + bin_width)
+
+    if len(histograms) <= MAXIMUM_INDIVIDUAL_FILES:
+        for row, name in enumerate(names):
+            ax.stairs(matrix[row], edges, label=name)
+        ax.legend(fontsize=8)
+    else:
+        low, median, high = np.percentile(matrix, [10, 50, 90], axis=0)
+        ax.stairs(high, edges, baseline=low, fill=True, alpha=0.3, label='10th-90th percentile')
+        ax.stairs(median, edges, label=f'Median of {len(histograms):,} files')
+        ax.legend(fontsize=8)
+
+def _finish_figure(fig: matplotlib.figure.Figure, output_path: str | None, block: bool | None = None) -> None:
+    """
+    Lays out a finished figure, and either shows it or saves it to output_path.
+    The figure itself is kept (see the num= of each plot), to be reused by the next call.
+    """
+    fig.tight_layout()
+
+    if output_path is None:
+        plt.show(block=block)
+    else:
+        # The format follows the file extension (.png, .svg, ...)
+        fig.savefig(output_path)
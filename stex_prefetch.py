@@ -0,0 +1,98 @@
+"""
+
+1DV501 Final Project - SimpleTextAnalysis
+stex_prefetch.py
+
+Author: Daniel Lind
+
+Reads text files ahead of their analysis. On a network filesystem (NFS and
+the like), opening and reading a file mostly means waiting for the server,
+so analysing files one after the other leaves the CPU idle for much of the
+time. Here, a pool of threads reads the next few files into memory while the
+current one is analysed. Threads are fine for this, since Python releases
+the GIL while it waits for a read.
+
+Function Prefix Legend:
+    read_* : Reads files, handing them out as TextFile objects
+
+"""
+
+# Imports
+from collections import deque
+import stex_filing as stex
+
+# How many files are read at the same time, and how many bytes each read asks
+# for. Network filesystems tend to prefer large reads.
+DEFAULT_IO_CONCURRENCY = 8
+DEFAULT_READ_SIZE = 1024 * 1024
+
+# Files larger than this are not read ahead (they're read in blocks while they're
+# analysed, as usual), so that files waiting to be analysed never take up more
+# than (read ahead) * (this) bytes of memory. Reading such a file takes much
+# longer than waiting for it to open, anyway.
+DEFAULT_MAXIMUM_FILE_SIZE = 8 * 1024 * 1024
+
+def read_files_ahead(paths, concurrency: int = DEFAULT_IO_CONCURRENCY, read_size: int = DEFAULT_READ_SIZE,
+                     read_ahead: int | None = None, maximum_file_size: int = DEFAULT_MAXIMUM_FILE_SIZE,
+                     encoding: str | None = None, strict: bool = False):
+    """
+    Opens every file (see stex.TextFile) and reads it into memory in a thread pool,
+    keeping up to read_ahead files ahead of the one which is being handed out.
+
+    The files are handed out in the same order as paths, through a bounded queue:
+    once read_ahead files are waiting to be taken, no more are read until one is.
+
+    Arguments:
+        paths: text files to read
+        concurrency: maximum number of files being read at the same time (by this process)
+        read_size: how many bytes to ask for per read
+        read_ahead: maximum number of files read (or being read) ahead. Default: 2 * concurrency
+        maximum_file_size: larger files are only opened ahead, not read (see DEFAULT_MAXIMUM_FILE_SIZE)
+        encoding, strict: how to decode every file, see stex.TextFile
+
+    Returns:
+        Iterator of (path, TextFile or None, exception raised while opening the file or None)
+    """
+    # The thread pool is only imported when files are actually read ahead.
+    from concurrent.futures import ThreadPoolExecutor
+
+    if read_ahead is None:
+        read_ahead = 2 * concurrency
+    paths = iter(paths)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='stex-prefetch')
+    queue = deque()
+    try:
+        while True:
+            # Top the queue up. Reads are started in order, so the file which is
+            # needed next is always the first one to be read.
+            while len(queue) < max(1, read_ahead):
+                path = next(paths, None)
+                if path is None:
+                    break
+                queue.append((path, executor.submit(_open_file, path, read_size, maximum_file_size, encoding, strict)))
+
+            if not queue:
+                break
+
+            path, future = queue.popleft()
+            try:
+                file = future.result()
+            except stex.READ_ERRORS as e:
+                # E.g. a truncated compressed file (decompressed while it's read into
+                # memory) - handed out like any other failure, the rest go on.
+                yield path, None, e
+                continue
+            yield path, file, None
+    finally:
+        # If we're stopped early, don't bother reading the rest.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# helper functions
+def _open_file(path: str, read_size: int, maximum_file_size: int,
+               encoding: str | None, strict: bool) -> stex.TextFile:
+    """
+    Opens a file and reads it into memory (see read_files_ahead). Runs in a thread of the pool.
+    """
+    return stex.TextFile(path, encoding, strict, in_memory_limit=maximum_file_size, read_size=read_size)
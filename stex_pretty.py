@@ -13,6 +13,7 @@ intended to make that content human readable ("pretty".)
 """
 
 # Imports
+import math
 import string
 import stex_filing as stex
 
@@ -22,19 +23,33 @@ def fetch_basic_statistics(file: stex.TextFile) -> str:
     for the TextFile provided, including:
     Number of Lines, Number of Words, Number of Unique Words, 
     Characters, Average words in a line, characters in a word.
+
+    Estimates from the quick-estimate mode are marked as such.
     """
+    if file.is_estimated():
+        return _fetch_estimated_basic_statistics(file)
     
     # Initialize a dictionary of stats
     stats = {
         'Number of Lines': file.number_of_lines,
         'Number of Words': file.number_of_words,
-        'Unique Words': len(file.get_unique_words()),
+        'Unique Words': file.get_unique_word_count(),
         'Characters (excluding spaces)': file.number_of_characters,
         'Characters (including spaces)': file.number_of_characters_and_spaces,
         'Average words in a line': file.get_average_words_per_line(),
         'Average characters in a word': file.get_average_characters_per_word()
     }
     
+    # In the approximate analysis mode, the distinct word count is an estimate.
+    if file.is_approximate():
+        stats['Unique Words'] = f'~{_format_number(stats["Unique Words"])} (±{file.get_unique_word_count_error() * 100:.1f}%)'
+    
+    # How the file was decoded, and how much of it couldn't be.
+    if file.get_encoding_description() is not None:
+        stats['Encoding'] = file.get_encoding_description()
+        if file.replaced_bytes:
+            stats['Undecodable bytes (replaced)'] = file.replaced_bytes
+    
     result = _format_dictionary(stats)
     return result.strip()
 
@@ -64,19 +79,28 @@ def fetch_sentence_statistics(file: stex.TextFile) -> str:
     """
     sentence_count = file.total_sentences
     average = file.get_average_words_per_sentence(2) # Rounding to 2 decimals
-    shortest_sentence = file.shortest_sentence_text
-    longest_sentence = file.longest_sentence_text
+    shortest_span = file.shortest_sentence_span
+    longest_span = file.longest_sentence_span
+
+    # Only the spans are kept in memory; the text itself is read from disk here.
+    shortest_sentence = file.get_sentence_text(shortest_span)
+    longest_sentence = file.get_sentence_text(longest_span)
 
     stats = {
         'Total sentences': f'{_format_number(sentence_count)}',
         'Average words per sentence': f'{average}',
-        'Shortest sentence': f'{_format_number(len(shortest_sentence))} words',
-        'Longest sentence': f'{_format_number(len(longest_sentence))} words', 
-        '': '', # Blank line, for readability.
-        'Shortest sentence text': f'"{shortest_sentence}"',
-        'Longest sentence text': f'"{longest_sentence}"', 
+        'Shortest sentence': f'{_format_number(shortest_span[2] if shortest_span else 0)} words',
+        'Longest sentence': f'{_format_number(longest_span[2] if longest_span else 0)} words', 
     }
 
+    # Percentiles of sentence length, e.g. 90% of sentences are at most this long.
+    for percentile, length in file.get_sentence_length_percentiles().items():
+        stats[f'{percentile}th percentile length'] = f'{_format_number(length)} words'
+
+    stats[''] = '' # Blank line, for readability.
+    stats['Shortest sentence text'] = f'"{shortest_sentence}"'
+    stats['Longest sentence text'] = f'"{longest_sentence}"'
+
     result = _format_dictionary(stats)
     return result
 
@@ -180,6 +204,12 @@ def fetch_word_frequency_table(file: stex.TextFile, top_n_words: int = 10) -> st
     # Generate the table
     table = _gen_table(columns, rows)
     
+    if file.is_approximate():
+        error_bound, confidence = file.get_word_occurrence_error_bound()
+        certainty = 'guaranteed' if confidence == 1 else f'{confidence * 100:.1f}% confidence'
+        table += (f'\nOccurrences are estimates: at most {_format_number(math.ceil(error_bound))} too high '
+                  f'({certainty}), never too low.')
+    
     return table
 
 def fetch_sentence_length_distribution_table(file: stex.TextFile, top_n_sentences: int = 5) -> str:
@@ -216,6 +246,45 @@ def fetch_sentence_length_distribution_table(file: stex.TextFile, top_n_sentence
     table = _gen_table(columns, rows)
     return table
 
+def fetch_longest_sentences_table(file: stex.TextFile, top_n_sentences: int = 5, preview_length: int = 60) -> str:
+    """
+    Generates a table of the longest sentences in the file, with where they
+    start and the beginning of their text. Handy for spotting run-on sentences,
+    e.g. from OCR output which lost its punctuation.
+
+    Arguments:
+        file: TextFile to consider
+        top_n_sentences: How many sentences to list (at most the amount kept by the sentence analysis).
+        preview_length: How many characters of each sentence to show.
+
+    Returns:
+        Printable string.
+    """
+    columns = [
+        Column('Rank', '^'),
+        Column('Amount of Words', '>'),
+        Column('Byte Offset', '>'),
+        Column('Beginning', '<')
+    ]
+
+    rows = []
+
+    for rank, span in enumerate(file.longest_sentence_spans[:top_n_sentences], start=1):
+        # Only these few sentences are read back from disk.
+        text = file.get_sentence_text(span)
+        if len(text) > preview_length:
+            text = text[:preview_length - 3] + '...'
+
+        rows.append(Row({
+            'Rank': rank,
+            'Amount of Words': _format_number(span[2]),
+            'Byte Offset': _format_number(span[0]),
+            'Beginning': text
+        }))
+
+    table = _gen_table(columns, rows)
+    return table
+
 def fetch_common_letters_list(file: stex.TextFile, top_n_letters: int = 10) -> str:
 
     constraint = set(string.ascii_letters)
@@ -321,6 +390,43 @@ def _format_dictionary(dictionary: dict) -> str:
         
     return result
 
+def _fetch_estimated_basic_statistics(file: stex.TextFile) -> str:
+    """
+    Returns a printable string of the basic statistics estimated by the
+    quick-estimate mode (see stex_analysis.ingest_file_estimate), every
+    value marked as an estimate with the margin of its confidence interval.
+    """
+    # Including spaces is the sum of two estimates; adding up their intervals errs on the wide side.
+    characters_low, characters_high = file.get_estimate_interval('number_of_characters')
+    spaces_low, spaces_high = file.get_estimate_interval('number_of_spaces')
+
+    stats = {
+        'Number of Lines': _format_estimate(file.number_of_lines, file.get_estimate_interval('number_of_lines')),
+        'Number of Words': _format_estimate(file.number_of_words, file.get_estimate_interval('number_of_words')),
+        'Characters (excluding spaces)': _format_estimate(file.number_of_characters, (characters_low, characters_high)),
+        'Characters (including spaces)': _format_estimate(file.number_of_characters_and_spaces,
+                                                          (characters_low + spaces_low, characters_high + spaces_high)),
+        'Average words in a line': _format_estimate(file.get_average_words_per_line(),
+                                                    file.get_estimate_interval('average_words_per_line')),
+        'Average characters in a word': f'~{file.get_average_characters_per_word()}'
+    }
+
+    result = _format_dictionary(stats)
+    result += (f'\nEstimated from a {file.estimate_sampled_bytes / 1e6:,.1f} MB sample; '
+               f'± is the margin of a {file.estimate_confidence * 100:g}% confidence interval.')
+    return result.strip()
+
+def _format_estimate(value: float, interval: tuple[float, float] | None) -> str:
+    """
+    Formats an estimated value as e.g. "~12,345 (±1.2%)", with the
+    relative margin of its confidence interval (if there is one).
+    """
+    text = f'~{_format_number(value)}'
+    if interval is not None and value:
+        low, high = interval
+        text += f' (±{(high - low) / 2 / value * 100:.1f}%)'
+    return text
+
 def _format_number(number: int) -> str:
     """
     Converts an integer to a human-readable string with commas separating
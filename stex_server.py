@@ -0,0 +1,404 @@
+"""
+
+1DV501 Final Project - SimpleTextAnalysis
+stex_server.py
+
+Author: Daniel Lind
+
+A long-running analysis service. Rather than paying Python start-up,
+imports and language sample loading for every short job, this keeps
+everything warm in memory and answers requests over HTTP, either on a
+TCP port or a Unix socket.
+
+Endpoints (all POST, JSON in, JSON out):
+    /analyse-file     {"path": "..."}       full analysis of a text file on disk
+    /analyse-text     {"text": "..."}       full analysis of the provided text
+    /detect-language  {"texts": ["..."], "scorer": "cosine"}
+                                            best language and score per string
+and GET /health for a quick liveness check.
+
+CPU-bound work is handed to a pool of worker processes, so one large file
+doesn't stall every other client. Requests beyond max_pending are turned
+away with 503 rather than queueing without bound.
+
+Usage:
+    python3 stex_server.py --port 8501
+    python3 stex_server.py --unix /tmp/stex.sock
+
+"""
+
+# Imports
+import argparse
+import asyncio
+import io
+import json
+import os
+import stat
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import stex_analysis as analyse
+import stex_filing as stex
+import stex_json as serializer
+import stex_language as language
+
+# Requests larger than this are refused outright (413).
+MAXIMUM_BODY_SIZE = 64 * 1024 * 1024
+
+# Seconds a client may take to send the head of its request, and then its body,
+# before the connection is closed (408), so idle clients can't hold connections open.
+DEFAULT_REQUEST_TIMEOUT = 30
+
+HTTP_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    408: 'Request Timeout',
+    413: 'Payload Too Large',
+    422: 'Unprocessable Entity',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable'
+}
+
+class RequestError(Exception):
+    """
+    Raised while handling a request to answer with an HTTP error.
+    """
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class AnalysisServer:
+    """
+    Holds the state shared between requests: the worker pool,
+    the result cache and the limit on requests in flight.
+    """
+
+    def __init__(self, workers: int | None = None, max_pending: int = 64, cache_size: int = 256,
+                 request_timeout: float = DEFAULT_REQUEST_TIMEOUT) -> None:
+        """
+        Arguments:
+            workers: number of worker processes (default: one per CPU)
+            max_pending: requests allowed in flight before answering 503
+            cache_size: number of file analyses kept in the result cache
+            request_timeout: seconds to wait for the head, and then the body, of a request
+        """
+        self.request_timeout = request_timeout
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = self._create_executor()
+        self.max_pending = max_pending
+        self.pending = 0
+        self.cache_size = cache_size
+
+        # key: (real path, size, modification time), value: serialized results.
+        # Ordered, so the least recently used entry can be evicted first.
+        self.result_cache = OrderedDict()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8501, unix_path: str | None = None) -> None:
+        """
+        Starts listening and serves requests until cancelled.
+        Raises a ValueError if unix_path exists, but isn't a socket.
+        """
+        if unix_path is not None:
+            _check_unix_path(unix_path)
+
+        # Load the language samples here too (for /detect-language
+        # validation), and start every worker up front.
+        language.load_language_profiles()
+        await self.warm_up()
+
+        if unix_path is not None:
+            # A socket file left behind by a previous run would make binding fail.
+            # (Anything else at the path has been refused by _check_unix_path.)
+            if os.path.lexists(unix_path):
+                os.remove(unix_path)
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_path)
+            print(f'Listening on unix socket {unix_path}')
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            print(f'Listening on http://{host}:{port}')
+
+        async with server:
+            await server.serve_forever()
+
+    async def warm_up(self) -> None:
+        """
+        Makes sure every worker process is started and has loaded the language samples.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm_worker) for _ in range(self.workers)))
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # Every worker loads the language samples as it starts, see _warm_worker.
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Reads a single HTTP request from the connection, answers it and closes the connection.
+        """
+        try:
+            try:
+                method, path, length = await _wait_for(_read_request_head(reader), self.request_timeout)
+
+                # Backpressure is applied before the body is read, so that
+                # refused requests don't cost (up to MAXIMUM_BODY_SIZE of) memory.
+                if path != '/health' and self.pending >= self.max_pending:
+                    raise RequestError(503, 'Too many requests in flight, try again later')
+
+                body = await _wait_for(reader.readexactly(length), self.request_timeout) if length > 0 else b''
+                status, payload = await self.route(method, path, body)
+            except RequestError as e:
+                status, payload = e.status, {'error': e.message}
+            except Exception as e:
+                status, payload = 500, {'error': f'{type(e).__name__}: {e}'}
+
+            writer.write(_format_response(status, payload))
+            await writer.drain()
+        except ConnectionError:
+            # Client went away, nothing to answer.
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method: str, path: str, body: bytes) -> tuple[int, dict]:
+        """
+        Dispatches a request to its endpoint.
+
+        Returns:
+            Tuple of (HTTP status, JSON-serializable payload)
+        """
+        if path == '/health':
+            return 200, {'status': 'ok', 'pending': self.pending, 'cached_results': len(self.result_cache)}
+
+        endpoints = {
+            '/analyse-file': self.analyse_file,
+            '/analyse-text': self.analyse_text,
+            '/detect-language': self.detect_language
+        }
+        if path not in endpoints:
+            raise RequestError(404, f'No such endpoint: {path}')
+        if method != 'POST':
+            raise RequestError(405, f'{path} only accepts POST')
+
+        try:
+            request = json.loads(body or b'{}')
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise RequestError(400, 'Request body is not valid JSON')
+        if not isinstance(request, dict):
+            raise RequestError(400, 'Request body must be a JSON object')
+
+        # Backpressure: rather than letting work pile up without bound,
+        # tell the client to come back later. (Checked again here, since
+        # other requests may have come in while the body was read.)
+        if self.pending >= self.max_pending:
+            raise RequestError(503, 'Too many requests in flight, try again later')
+
+        self.pending += 1
+        try:
+            return 200, await endpoints[path](request)
+        finally:
+            self.pending -= 1
+
+    async def analyse_file(self, request: dict) -> dict:
+        path = _require(request, 'path', str)
+
+        # Only the (cheap) stat happens here. Opening the file, which sniffs its
+        # compression and may read it into memory, is left to the worker, so it
+        # doesn't hold up other clients.
+        try:
+            status = os.stat(path)
+        except FileNotFoundError:
+            raise RequestError(422, f'No such file: {path}')
+        except OSError as e:
+            raise RequestError(422, f'Cannot read {path}: {e.strerror or e}')
+
+        # The cache key includes size and modification time, so an edited
+        # file is analysed again rather than served stale.
+        key = (os.path.realpath(path), status.st_size, status.st_mtime_ns)
+        if key in self.result_cache:
+            self.result_cache.move_to_end(key)
+            return self.result_cache[key]
+
+        # Errors from opening the file in the worker come back here, so the client
+        # still gets a proper error.
+        try:
+            result = await self._run(_analyse_path, path)
+        except FileNotFoundError:
+            raise RequestError(422, f'No such file: {path}')
+        except ValueError as e:
+            raise RequestError(422, str(e))
+
+        self.result_cache[key] = result
+        if len(self.result_cache) > self.cache_size:
+            self.result_cache.popitem(last=False)
+
+        return result
+
+    async def analyse_text(self, request: dict) -> dict:
+        text = _require(request, 'text', str)
+        return await self._run(_analyse_text, text)
+
+    async def detect_language(self, request: dict) -> dict:
+        if 'text' in request:
+            texts = [_require(request, 'text', str)]
+        else:
+            texts = _require(request, 'texts', list)
+            if not all(isinstance(text, str) for text in texts):
+                raise RequestError(400, "'texts' must be a list of strings")
+
+        scorer = request.get('scorer', 'cosine')
+        if scorer not in language.SCORERS:
+            raise RequestError(400, f"'scorer' must be one of: {', '.join(language.SCORERS)}")
+
+        results = await self._run(_detect_languages, texts, scorer)
+        return {'results': [{'language': name, 'score': score} for name, score in results]}
+
+    async def _run(self, function, *arguments):
+        """
+        Runs a function in the worker pool without blocking the event loop.
+        If a worker process has died (e.g. killed for running out of memory), the
+        pool can't run anything anymore, so it is replaced with a new one.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            return await loop.run_in_executor(executor, function, *arguments)
+        except BrokenProcessPool:
+            # Several requests may fail on the same broken pool, but it's only replaced once.
+            if self.executor is executor:
+                self.executor = self._create_executor()
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise RequestError(503, 'A worker process failed, try again')
+
+
+# Worker functions. These run in the pool's processes, so they have to
+# live at the top level of the module.
+def _warm_worker() -> None:
+    """
+    Loads the language samples in a worker process, so the first
+    real request doesn't have to.
+    """
+    language.load_language_profiles()
+
+def _analyse_path(path: str) -> dict:
+    file = analyse.ingest_file(stex.TextFile(path))
+    return serializer.serialize_all_as_dict(file)
+
+def _analyse_text(text: str) -> dict:
+    # newline=None, so line breaks are treated just as they would be in a file.
+    file = analyse.ingest_stream(io.StringIO(text, newline=None), 'text.txt')
+    return serializer.serialize_all_as_dict(file)
+
+def _detect_languages(texts: list[str], scorer: str) -> list[tuple[str | None, float]]:
+    return list(language.score_texts(texts, scorer))
+
+
+# helper functions
+def _require(request: dict, key: str, expected_type: type):
+    """
+    Fetches a mandatory field of a request, raising 400 if it's missing or of the wrong type.
+    """
+    value = request.get(key)
+    if not isinstance(value, expected_type):
+        raise RequestError(400, f"Request must contain '{key}' ({expected_type.__name__})")
+    return value
+
+def _check_unix_path(unix_path: str) -> None:
+    """
+    Makes sure that whatever is at unix_path (if anything) is a socket, which
+    AnalysisServer.serve may replace. Raises a ValueError otherwise, so that a
+    mistyped --unix doesn't delete a regular file.
+    """
+    try:
+        mode = os.lstat(unix_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f'{unix_path} exists and is not a socket, refusing to replace it.')
+
+async def _wait_for(awaitable, timeout: float):
+    """
+    Awaits part of reading a request, answering 408 if the client takes longer than timeout seconds.
+    """
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise RequestError(408, f'Request not received within {timeout:g} seconds')
+
+async def _read_request_head(reader: asyncio.StreamReader) -> tuple[str, str, int]:
+    """
+    Reads the request line and headers of a (minimal) HTTP/1.x request.
+    The body is left to be read by the caller.
+
+    Returns:
+        Tuple of (method, path, length of the body in bytes)
+    """
+    request_line = await reader.readline()
+    try:
+        method, path, _ = request_line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise RequestError(400, 'Malformed request line')
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise RequestError(400, 'Invalid Content-Length')
+    if length > MAXIMUM_BODY_SIZE:
+        raise RequestError(413, f'Request body exceeds {MAXIMUM_BODY_SIZE} bytes')
+
+    # Ignore any query string.
+    return method.upper(), path.split('?', 1)[0], length
+
+def _format_response(status: int, payload: dict) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = (
+        f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}\r\n'
+        'Content-Type: application/json; charset=utf-8\r\n'
+        f'Content-Length: {len(body)}\r\n'
+    )
+    if status == 503:
+        head += 'Retry-After: 1\r\n'
+    head += 'Connection: close\r\n\r\n'
+    return head.encode('latin-1') + body
+
+def main(arguments: list[str]) -> int:
+    parser = argparse.ArgumentParser(description='Serves text analysis over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8501)
+    parser.add_argument('--unix', default=None, help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--max-pending', type=int, default=64, help='requests in flight before answering 503')
+    parser.add_argument('--cache-size', type=int, default=256, help='file analyses kept in the result cache')
+    parser.add_argument('--request-timeout', type=float, default=DEFAULT_REQUEST_TIMEOUT,
+                        help='seconds a client may take to send a request (default: %(default)s)')
+    options = parser.parse_args(arguments)
+
+    server = AnalysisServer(options.workers, options.max_pending, options.cache_size, options.request_timeout)
+    try:
+        asyncio.run(server.serve(options.host, options.port, options.unix))
+    except KeyboardInterrupt:
+        print('\nCtrl+C detected, exiting...\n')
+    except ValueError as e:
+        print(e)
+        return 1
+    finally:
+        server.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
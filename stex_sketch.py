@@ -0,0 +1,402 @@
+"""
+
+1DV501 Final Project - SimpleTextAnalysis
+stex_sketch.py
+
+Author: Daniel Lind
+
+Probabilistic data structures ("sketches") for the approximate analysis
+mode. Unlike a dictionary of every distinct word, each of these takes up
+a fixed amount of memory, chosen up front, no matter how much text goes
+into it. In exchange, the answers are estimates - with known error bounds.
+
+    CountMinSketch: estimated occurrences of any item. Never underestimates;
+                    overestimates by at most error * (total occurrences),
+                    with probability confidence.
+    HyperLogLog: estimated number of distinct items, with a relative
+                 standard error of 1.04 / sqrt(2^precision).
+    SpaceSaving: the most frequent items, by name, with guaranteed bounds
+                 on their counts. Can be merged across chunks and files.
+
+Items are hashed with BLAKE2b rather than hash(), since hash() differs between
+processes. This way, sketches built in different worker processes (or runs)
+can be merged, as long as they were created with the same dimensions.
+
+Only the standard library is used, so importing this file is cheap.
+
+"""
+
+# Imports
+import heapq
+import math
+import operator
+from array import array
+from hashlib import blake2b
+
+# Defaults used by the approximate analysis mode. With these, a CountMinSketch
+# takes 5 * 27,183 * 8 bytes (about 1 MB), and a HyperLogLog 16 KB.
+DEFAULT_ERROR = 0.0001
+DEFAULT_CONFIDENCE = 0.99
+DEFAULT_PRECISION = 14
+
+class CountMinSketch:
+    """
+    Estimates how many times each item was added, in fixed memory.
+
+    The sketch is a table of depth rows of width counters. Every item is
+    hashed to one counter per row, and adding it increments those counters.
+    Other items may share (some of) its counters, so every counter is at least
+    the item's true count; the smallest of them is the estimate.
+    """
+
+    def __init__(self, width: int, depth: int) -> None:
+        """
+        Arguments:
+            width: counters per row. The error is at most e / width of the total.
+            depth: number of rows. The error bound holds with probability 1 - e^-depth.
+        """
+        if width < 1 or depth < 1:
+            raise ValueError("A Count-Min sketch needs a width and depth of at least 1.")
+
+        self.width = width
+        self.depth = depth
+        # Sum of all counts added, needed for the error bound.
+        self.total = 0
+        # All rows in one flat array: row r occupies [r * width, (r + 1) * width)
+        self.table = array('Q', [0]) * (width * depth)
+
+    @classmethod
+    def from_error(cls, error: float = DEFAULT_ERROR, confidence: float = DEFAULT_CONFIDENCE) -> 'CountMinSketch':
+        """
+        Creates a sketch whose estimates are within error * (total occurrences)
+        of the true count, with probability confidence.
+        """
+        if not 0 < error < 1 or not 0 < confidence < 1:
+            raise ValueError("error and confidence must both be between 0 and 1.")
+
+        width = math.ceil(math.e / error)
+        depth = math.ceil(math.log(1 / (1 - confidence)))
+        return cls(width, depth)
+
+    @property
+    def error(self) -> float:
+        """Relative error of the estimates (as a fraction of total)."""
+        return math.e / self.width
+
+    @property
+    def confidence(self) -> float:
+        """Probability that an estimate is within the error bound."""
+        return 1 - math.exp(-self.depth)
+
+    @property
+    def error_bound(self) -> float:
+        """Maximum overestimate (in occurrences), with probability confidence."""
+        return self.error * self.total
+
+    def indices(self, item: str) -> list[int]:
+        """
+        Positions in self.table of the counters belonging to an item, one per row.
+        """
+        return self._indices(hash_item(item))
+
+    def add(self, item: str, count: int = 1) -> int:
+        """
+        Adds count occurrences of an item.
+
+        Returns:
+            The item's estimated occurrences afterwards (int)
+        """
+        return self.add_hash(hash_item(item), count)
+
+    def add_hash(self, hashed: int, count: int = 1) -> int:
+        """
+        Same as add(), for an item which was already hashed with hash_item.
+        Saves hashing the item twice when it also goes into a HyperLogLog.
+        """
+        table = self.table
+        estimate = None
+        for index in self._indices(hashed):
+            value = table[index] + count
+            table[index] = value
+            if estimate is None or value < estimate:
+                estimate = value
+
+        self.total += count
+        return estimate
+
+    def update(self, counts: dict[str, int]) -> None:
+        """
+        Adds a whole dictionary of occurrences (key: item, value: occurrences).
+        """
+        for item, count in counts.items():
+            self.add(item, count)
+
+    def estimate(self, item: str) -> int:
+        """
+        Returns the estimated occurrences of an item. Never less than the true count.
+        """
+        table = self.table
+        return min(table[index] for index in self.indices(item))
+
+    def inner_product(self, other: 'CountMinSketch') -> int:
+        """
+        Estimates the dot product of the two underlying occurrence vectors
+        (e.g. for cosine similarity). Like estimate(), never an underestimate.
+        """
+        self._check_compatible(other)
+
+        width = self.width
+        best = None
+        for row in range(self.depth):
+            row_slice = slice(row * width, (row + 1) * width)
+            product = sum(map(operator.mul, self.table[row_slice], other.table[row_slice]))
+            if best is None or product < best:
+                best = product
+        return best
+
+    def merge(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        """
+        Adds another sketch of the same dimensions to this one, in place.
+        The result is the sketch of everything added to either of them.
+
+        Returns:
+            self
+        """
+        self._check_compatible(other)
+
+        table = self.table
+        for index, value in enumerate(other.table):
+            if value:
+                table[index] += value
+        self.total += other.total
+        return self
+
+    def _indices(self, hashed: int) -> list[int]:
+        # Two independent 32-bit hashes out of one 64-bit hash; row r uses
+        # h1 + r * h2 (Kirsch-Mitzenmacher), which is as good as depth separate hashes.
+        h1 = hashed & 0xFFFFFFFF
+        h2 = (hashed >> 32) | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def _check_compatible(self, other: 'CountMinSketch') -> None:
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError(f"Cannot combine Count-Min sketches of different dimensions "
+                             f"({self.width}x{self.depth} and {other.width}x{other.depth}).")
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct items added, in fixed memory.
+
+    Every item is hashed; the first precision bits pick a register, and the
+    register remembers the longest run of leading zeros seen in the rest of
+    the hash. Long runs are rare, so they reveal how many distinct hashes
+    there must have been. Adding the same item again changes nothing.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION) -> None:
+        """
+        Arguments:
+            precision: between 4 and 18. Uses 2^precision bytes of memory.
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18.")
+
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @property
+    def relative_error(self) -> float:
+        """Relative standard error of the estimate."""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, item: str) -> None:
+        self.add_hash(hash_item(item))
+
+    def add_hash(self, hashed: int) -> None:
+        """
+        Same as add(), for an item which was already hashed with hash_item.
+        """
+        precision = self.precision
+
+        register = hashed >> (64 - precision)
+        remaining_bits = 64 - precision
+        remainder = hashed & ((1 << remaining_bits) - 1)
+        # Position of the first 1 bit, counting from the left (1-based).
+        rank = remaining_bits - remainder.bit_length() + 1
+
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def update(self, items) -> None:
+        """
+        Adds every item of an iterable (e.g. the keys of a dictionary).
+        """
+        for item in items:
+            self.add(item)
+
+    def cardinality(self) -> int:
+        """
+        Returns the estimated number of distinct items added.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+
+        raw_estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+
+        # For small cardinalities, counting the empty registers is more accurate
+        # (linear counting). With 64-bit hashes, no large range correction is needed.
+        empty_registers = self.registers.count(0)
+        if raw_estimate <= 2.5 * m and empty_registers > 0:
+            return round(m * math.log(m / empty_registers))
+
+        return round(raw_estimate)
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """
+        Combines another HyperLogLog of the same precision into this one, in place.
+        The result estimates the distinct items added to either of them.
+
+        Returns:
+            self
+        """
+        if self.precision != other.precision:
+            raise ValueError(f"Cannot merge HyperLogLogs of different precision "
+                             f"({self.precision} and {other.precision}).")
+
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+
+class SpaceSaving:
+    """
+    Keeps track of the most frequent items (heavy hitters), in fixed memory,
+    using the Space-Saving algorithm (Metwally et al.).
+
+    At most capacity items are tracked, each with a count and an error. When a
+    new item arrives and every slot is taken, the item with the lowest count is
+    replaced, and the newcomer inherits that count (as its error). This means:
+        - a tracked item's true count is between count - error and count,
+        - an untracked item's true count is at most minimum(), which is
+          at most total / capacity,
+    so any item more frequent than total / capacity is guaranteed to be tracked.
+    Unlike the sketches above, items are kept by name, so no hashing is needed.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Arguments:
+            capacity: number of items to track. For an accurate top K, use a few times K.
+        """
+        if capacity < 1:
+            raise ValueError("Space-Saving needs a capacity of at least 1.")
+
+        self.capacity = capacity
+        self.total = 0
+        # key: item, value: [count, error]
+        self.counters = {}
+        # Min-heap of (count, item) to find the item to replace. Entries go stale
+        # whenever an item's count grows, and are skipped (or cleared out) later.
+        self._heap = []
+
+    @property
+    def error_bound(self) -> int:
+        """Maximum overestimate of any tracked count, and maximum true count of any untracked item."""
+        return self.minimum()
+
+    def minimum(self) -> int:
+        """
+        Returns the lowest tracked count, or 0 if there are still free slots.
+        """
+        if len(self.counters) < self.capacity:
+            return 0
+
+        heap = self._heap
+        # Drop stale entries until the root is up to date.
+        while heap[0][0] != self.counters.get(heap[0][1], (None,))[0]:
+            heapq.heappop(heap)
+        return heap[0][0]
+
+    def add(self, item: str, count: int = 1) -> None:
+        """
+        Adds count occurrences of an item.
+        """
+        self.total += count
+        counters = self.counters
+
+        entry = counters.get(item)
+        if entry is not None:
+            entry[0] += count
+        elif len(counters) < self.capacity:
+            entry = counters[item] = [count, 0]
+        else:
+            # Replace the least frequent item; the newcomer may have occurred
+            # up to that many times without being tracked.
+            minimum = self.minimum()
+            _, evicted = heapq.heappop(self._heap)
+            del counters[evicted]
+            entry = counters[item] = [minimum + count, minimum]
+
+        heapq.heappush(self._heap, (entry[0], item))
+
+        # Stale entries pile up as counts grow, so clear them out now and then.
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def update(self, counts: dict[str, int]) -> None:
+        """
+        Adds a whole dictionary of occurrences (key: item, value: occurrences).
+        """
+        for item, count in counts.items():
+            self.add(item, count)
+
+    def top(self, k: int | None = None) -> list[tuple[str, int, int]]:
+        """
+        Returns the k most frequent tracked items (all of them if k is None).
+
+        Returns:
+            List of (item, count, error), most frequent first. The true count
+            is between count - error and count.
+        """
+        items = sorted(((item, count, error) for item, (count, error) in self.counters.items()),
+                       key=lambda entry: entry[1], reverse=True)
+        return items if k is None else items[:k]
+
+    def merge(self, other: 'SpaceSaving') -> 'SpaceSaving':
+        """
+        Combines another summary into this one, in place (e.g. of another chunk
+        or file). The guarantees above still hold for the combined stream.
+        (Mergeable summaries, Agarwal et al.)
+
+        Returns:
+            self
+        """
+        # An item missing from a summary may have occurred up to its minimum times there.
+        own_minimum = self.minimum()
+        other_minimum = other.minimum()
+
+        combined = {}
+        for item in self.counters.keys() | other.counters.keys():
+            own_count, own_error = self.counters.get(item, (own_minimum, own_minimum))
+            other_count, other_error = other.counters.get(item, (other_minimum, other_minimum))
+            combined[item] = [own_count + other_count, own_error + other_error]
+
+        # Keep the most frequent ones.
+        kept = sorted(combined.items(), key=lambda entry: entry[1][0], reverse=True)[:self.capacity]
+        self.counters = dict(kept)
+        self.total += other.total
+        self._rebuild_heap()
+        return self
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(count, item) for item, (count, _) in self.counters.items()]
+        heapq.heapify(self._heap)
+
+
+def hash_item(item: str) -> int:
+    """
+    Stable 64-bit hash of a string, the same in every process.
+    Every sketch in this file hashes items with this.
+    """
+    return int.from_bytes(blake2b(item.encode('utf-8', errors='surrogatepass'), digest_size=8).digest(), 'little')
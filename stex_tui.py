@@ -4,6 +4,7 @@
 from stex_exceptions import OperationCancelled
 from pathlib import Path
 import stex_filing as stex
+import stex_inventory
 import os
 
 def generate_stylized_content_box(header_text: str, padding: int = 2) -> str:
@@ -73,6 +74,14 @@ def print_menu_prompt(options_menu_content: str, inventory: list[stex.TextFile])
     status = "No file is selected. Choose one by selecting <L>." if current_selected == None else f"Currently working with:\n{", ".join(current_selected)}"
     print(status)
 
+    # How much memory the results of the loaded files take up (see stex_inventory).
+    if isinstance(inventory, stex_inventory.Inventory) and len(inventory) > 0:
+        used, budget, spilled_files = inventory.get_memory_usage()
+        usage = f"Memory used by results: {used / 2**20:.1f} MiB of {budget / 2**20:.1f} MiB"
+        if spilled_files:
+            usage += f" ({spilled_files} file{'s' if spilled_files != 1 else ''} moved to disk until selected)"
+        print(usage)
+
 
 def get_prompt_file_contents(template_path: str) -> str:
     """
@@ -105,28 +114,36 @@ def get_prompt_file_contents(template_path: str) -> str:
 
     return options_menu_content
 
-def load_file_prompt(inventory: list[stex.TextFile]) -> stex.TextFile:
+def load_file_prompt():
     """
-    Provides an interactive prompt to load a text file by path.
-    Appends selected file to provided inventory.
+    Provides an interactive prompt to load a text file (or an archive of them) by path.
+
+    Returns:
+        Iterable of TextFile objects: just the one, or one per text file in an
+        archive (see stex.read_archive). The members of some archives can only be
+        read one after the other, so each should be analysed before taking the next.
     """
-    loaded_file = None
-    while loaded_file == None:
-        user_input = input("Enter path to text file:")
+    loaded_files = None
+    while loaded_files == None:
+        user_input = input("Enter path to text file (or tar/zip archive of them):")
         try:
             # Cancel if the user just presses Enter.
             if len(user_input) == 0:
                 raise OperationCancelled
             
-            candidate_file = stex.TextFile(user_input)
-            inventory.append(candidate_file)
-            loaded_file = candidate_file
+            if stex.is_archive(user_input):
+                loaded_files = stex.read_archive(user_input)
+            else:
+                loaded_files = [stex.TextFile(user_input)]
         except FileNotFoundError:
             print("No such file could be found.")
         except ValueError:
-            print("Please provide a valid .TXT file")
+            print("Please provide a valid .TXT file, or a tar/zip archive of them")
+        except stex.READ_ERRORS as e:
+            # E.g. a file which can't be opened, or a truncated compressed one.
+            print(f"Could not read {os.path.basename(user_input)}: {str(e) or type(e).__name__}")
     
-    return loaded_file
+    return loaded_files
 
 def save_file_prompt(content: str) -> str:
     """
@@ -173,9 +190,10 @@ def select_file_prompt(inventory: list[stex.TextFile]) -> stex.TextFile:
     print("C. Cancel Operation")
 
     # List every tracked file and ask them which one to remove.
+    # (Iterating rather than indexing, which would count as using every file, see stex_inventory.)
     number_of_files = len(inventory)
-    for i in range(number_of_files):
-        print(f"{i}. {inventory[i].shortname}")
+    for i, file in enumerate(inventory):
+        print(f"{i}. {file.shortname}")
         
     print("==========================")
     user_choice = -1
@@ -199,11 +217,13 @@ def select_file_prompt(inventory: list[stex.TextFile]) -> stex.TextFile:
 def list_text_files() -> str:
     """
     Lists the files in the current working directory and returns a string
-    of all files ending in .txt, separated by newline
+    of all files ending in .txt (or .txt.gz etc., see stex.TEXT_FILE_PATTERNS),
+    and archives of them (see stex.ARCHIVE_PATTERNS), separated by newline
     """
     txt_files = []
 
-    for path in Path('.').rglob('*.txt'):
-        txt_files.append(str(path))
+    for pattern in stex.TEXT_FILE_PATTERNS + stex.ARCHIVE_PATTERNS:
+        for path in Path('.').rglob(pattern):
+            txt_files.append(str(path))
 
     return '\n'.join(txt_files)
@@ -0,0 +1,215 @@
+"""
+
+1DV501 Final Project - SimpleTextAnalysis
+stex_vocabulary.py
+
+Author: Daniel Lind
+
+A vocabulary shared by every TextFile in this process. Each distinct word
+is stored once, and given an integer id; a TextFile only keeps the ids and
+counts of its words, in two arrays. With many files loaded, memory then
+grows with the total vocabulary rather than with files times vocabulary,
+and word counts can be compared by id rather than by rehashing strings.
+
+    Vocabulary: maps words to ids and back. Only grows while it's in use.
+    WordCounts: read-only dictionary of word -> occurrences, most frequent
+                first, stored as arrays of ids and counts.
+
+The shared vocabulary (see get_shared_vocabulary) only lives as long as some
+WordCounts use it. Once the last of them is released (e.g. every file has been
+unloaded, or a long-running server has answered its requests), so are all its
+words, and the next WordCounts start a new vocabulary.
+
+Function Prefix Legend:
+    get_* : Return the vocabulary which is currently shared
+
+Ids mean nothing outside the process that handed them out, so WordCounts
+are pickled (e.g. sent to another process) with their words instead.
+
+Only the standard library is used, so importing this file is cheap.
+
+"""
+
+# Imports
+import sys
+import threading
+import weakref
+from array import array
+from bisect import bisect_left
+from collections.abc import ItemsView, Mapping, ValuesView
+
+class Vocabulary:
+    """
+    Hands out an integer id for every distinct word, and remembers which
+    word each id stands for.
+    """
+
+    def __init__(self) -> None:
+        # Key: word, value: id. The id is the word's index in _words.
+        self._ids = {}
+        self._words = []
+
+        # In case files are analysed in several threads at once.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def intern(self, word: str) -> int:
+        """
+        Returns the id of a word, adding the word if it's new.
+        """
+        return self.intern_all((word,))[0]
+
+    def intern_all(self, words) -> array:
+        """
+        Returns the ids of many words at once, adding the ones which are new.
+
+        Arguments:
+            words: iterable of words
+
+        Returns:
+            Array of ids, in the same order as words
+        """
+        ids = self._ids
+        known_words = self._words
+        result = array('I')
+
+        with self._lock:
+            for word in words:
+                word_id = ids.get(word)
+                if word_id is None:
+                    word_id = ids[word] = len(known_words)
+                    known_words.append(word)
+                result.append(word_id)
+
+        return result
+
+    def lookup(self, word: str) -> int | None:
+        """
+        Returns the id of a word, or None if it has never been seen (without adding it).
+        """
+        return self._ids.get(word)
+
+    def word(self, word_id: int) -> str:
+        """
+        Returns the word with the given id.
+        """
+        return self._words[word_id]
+
+    def words(self, word_ids) -> map:
+        """
+        Returns (an iterator of) the words with the given ids.
+        """
+        return map(self._words.__getitem__, word_ids)
+
+# The vocabulary currently shared by every TextFile in this process, see
+# get_shared_vocabulary. Only WordCounts hold on to it, so it's a weak reference.
+_shared_vocabulary = None
+_shared_vocabulary_lock = threading.Lock()
+
+def get_shared_vocabulary() -> Vocabulary:
+    """
+    Returns the vocabulary shared by every TextFile in this process, or a new
+    one if no WordCounts use the previous one anymore.
+    """
+    global _shared_vocabulary
+    with _shared_vocabulary_lock:
+        vocabulary = _shared_vocabulary() if _shared_vocabulary is not None else None
+        if vocabulary is None:
+            vocabulary = Vocabulary()
+            _shared_vocabulary = weakref.ref(vocabulary)
+        return vocabulary
+
+class WordCounts(Mapping):
+    """
+    Dictionary of word -> occurrences, in the order it was created in (most
+    frequent first, for word frequency statistics), without keeping any words
+    of its own: only two arrays of ids (see Vocabulary) and counts.
+
+    Iterating, len() and the items()/keys()/values() views are as cheap as
+    for a dictionary. Looking up a single word is a binary search, through
+    the ids sorted once, on the first lookup.
+    """
+
+    __slots__ = ('ids', 'counts', 'vocabulary', '_sorted_ids', '_sorted_positions')
+
+    def __init__(self, occurrences: Mapping[str, int] | None = None, vocabulary: Vocabulary | None = None) -> None:
+        """
+        Arguments:
+            occurrences: dictionary with key: word, value: occurrences
+            vocabulary: Vocabulary to intern the words in (default: the shared one, see get_shared_vocabulary)
+        """
+        occurrences = occurrences or {}
+        self.vocabulary = vocabulary if vocabulary is not None else get_shared_vocabulary()
+        self.ids = self.vocabulary.intern_all(occurrences.keys())
+        self.counts = array('Q', occurrences.values())
+
+        # Built on the first lookup, see __getitem__.
+        self._sorted_ids = None
+        self._sorted_positions = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self):
+        return self.vocabulary.words(self.ids)
+
+    def __getitem__(self, word: str) -> int:
+        word_id = self.vocabulary.lookup(word)
+        if word_id is None:
+            raise KeyError(word)
+
+        if self._sorted_ids is None:
+            # The ids sorted, and where each of them is in self.ids
+            # (8 bytes per word, rather than a whole dictionary).
+            positions = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+            self._sorted_positions = array('I', positions)
+            self._sorted_ids = array('I', (self.ids[position] for position in positions))
+
+        index = bisect_left(self._sorted_ids, word_id)
+        if index == len(self._sorted_ids) or self._sorted_ids[index] != word_id:
+            raise KeyError(word)
+        return self.counts[self._sorted_positions[index]]
+
+    def items(self) -> ItemsView:
+        return _WordCountItems(self)
+
+    def values(self) -> ValuesView:
+        return _WordCountValues(self)
+
+    def id_counts(self) -> dict[int, int]:
+        """
+        Returns a dictionary of word id -> occurrences, for comparing word counts
+        of the same vocabulary without hashing any words (see stex_analysis.invoke_cosine_similarity).
+        """
+        return dict(zip(self.ids, self.counts))
+
+    def __reduce__(self):
+        # Ids are only valid in this process, so pickle the words themselves.
+        return (WordCounts, (dict(self.items()),))
+
+    def __sizeof__(self) -> int:
+        # The arrays, but not the words, which are in the (shared) vocabulary.
+        arrays = (self.ids, self.counts, self._sorted_ids, self._sorted_positions)
+        return object.__sizeof__(self) + sum(sys.getsizeof(values) for values in arrays if values is not None)
+
+    def __repr__(self) -> str:
+        return f'WordCounts({len(self)} words)'
+
+# helper classes
+class _WordCountItems(ItemsView):
+    """
+    items() of a WordCounts, iterated straight off its arrays
+    (the default would look every word up again).
+    """
+    def __iter__(self):
+        counts = self._mapping
+        return zip(counts.vocabulary.words(counts.ids), counts.counts)
+
+class _WordCountValues(ValuesView):
+    """
+    values() of a WordCounts, iterated straight off its counts.
+    """
+    def __iter__(self):
+        return iter(self._mapping.counts)
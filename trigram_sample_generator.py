@@ -5,60 +5,358 @@ Author: Daniel Lind
 An auxiliary file used to generate standalone JSON files containing the trigram occurrences
 in text files.
 
+If the output path ends in .npy, a hashed character n-gram profile
+(lang_ngrams_*.npy, see stex_language.py) is generated instead.
+
+Any number of text files and/or directories (searched for .txt files, which
+may be compressed) can be given. Files are decompressed and decoded just as the
+main program reads them (see TextFile.read_lines). Large files are split into chunks, all chunks are counted in parallel
+worker processes, and the counts are merged into a single profile. With
+--update, the counts are added to an existing profile rather than replacing it.
+
+Usage:
+    python3 trigram_sample_generator.py [input paths...] [output_path] <options>
+
 """
 import sys
+import io
 import json
 import os
-from stex_analysis import invoke_trigram_analysis
-from stex_filing import TextFile
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import stex_language as language
+from stex_filing import TextFile, TEXT_FILE_PATTERNS
+
+# Files are split into chunks of roughly this many bytes, so that a single
+# huge file can still keep every worker busy.
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Chunks are read (and decoded) this many bytes (rounded up to whole lines) at a time.
+_READ_SIZE = 1024 * 1024
+
+def main(arguments: list[str]) -> int:
+    """
+    Parses command line arguments, builds the profile and saves it.
+
+    Returns:
+        Exit code (0 on success)
+    """
+    parser = argparse.ArgumentParser(
+        description='Generates a language sample from one or more text files.')
+    parser.add_argument('inputs', nargs='+', help='text files, or directories to search for .txt files')
+    parser.add_argument('output', help='output path (.json for trigrams, .npy for hashed n-grams)')
+    parser.add_argument('--max-words', type=int, default=None,
+                        help='only process this many words per file (default: everything)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--top-k', type=int, default=None,
+                        help='only keep the K most common trigrams (.json output only)')
+    parser.add_argument('--update', action='store_true',
+                        help='add the counts to the existing profile at the output path')
+    parser.add_argument('--yes', '-y', action='store_true',
+                        help='overwrite the output without asking')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='split files into chunks of roughly this many bytes')
+    options = parser.parse_args(arguments)
+
+    # The old calling convention was [input] [output] [maximum words].
+    if options.output.isdigit():
+        parser.error('the maximum amount of words is now given with --max-words')
+
+    hashed = options.output.lower().endswith('.npy')
+    if hashed and options.top_k is not None:
+        parser.error('--top-k only applies to .json (trigram) profiles')
+
+    paths = _find_text_files(options.inputs)
+    if not paths:
+        print('No text files found.')
+        return 1
+
+    start_time = time.perf_counter()
+    try:
+        profile, processed_words, number_of_tasks = build_profile(
+            paths, hashed, options.max_words, options.workers, options.chunk_size)
+
+        if processed_words == 0:
+            print('No text found in the input files.')
+            return 1
+
+        if options.update and os.path.exists(options.output):
+            profile = merge_profiles(profile, load_profile(options.output))
+    except FileNotFoundError as e:
+        print(f'No such file could be found: {e.filename}')
+        return 1
+    except (ValueError, OSError) as e:
+        # Includes json.JSONDecodeError, for an existing profile which isn't valid JSON.
+        print(f'Invalid input: {e}')
+        return 1
+
+    if not hashed and options.top_k is not None:
+        profile = prune_profile(profile, options.top_k)
+
+    elapsed = time.perf_counter() - start_time
+    print(f'Processed {processed_words:,} words from {len(paths):,} files ({number_of_tasks:,} chunks) in {elapsed:.2f}s.')
+
+    if hashed:
+        # The raw counts are saved (so --update can add to them later), and
+        # frequent n-grams in a large corpus easily pass 2^24, beyond which
+        # float32 can't hold every whole number. float64 holds them exactly.
+        buffer = io.BytesIO()
+        np.save(buffer, profile.astype(np.float64))
+        data = buffer.getvalue()
+    else:
+        data = json.dumps(profile, ensure_ascii=False, indent=4)
+
+    # Updating an existing profile implies that it may be replaced.
+    confirmed = options.yes or options.update
+    return 0 if save_output(data, options.output, confirmed) else 1
+
+def build_profile(paths: list[str], hashed: bool, maximum_words: int | None, workers: int, chunk_size: int) -> tuple:
+    """
+    Counts the features of every file in parallel and merges the results.
+
+    Arguments:
+        paths: text files to count
+        hashed: count hashed character n-grams instead of word boundary trigrams
+        maximum_words: words to process per file, or None for everything
+        workers: number of worker processes
+        chunk_size: approximate size of each chunk, in bytes
+
+    Returns:
+        Tuple containing:
+            merged profile (trigram dictionary or np.ndarray)
+            number of words processed (int)
+            number of chunks counted (int)
+    """
+    tasks = []
+    for path in paths:
+        if maximum_words is None:
+            tasks.extend((path, start, end, None) for _, start, end in _split_file(path, chunk_size))
+        else:
+            # A word limit applies to a file as a whole, so the file can't be split.
+            tasks.extend((path, start, end, maximum_words) for _, start, end in _split_file(path, None))
+
+    # Starting from an empty profile, so that files without any text (which
+    # have no chunks at all) still give a profile, just an empty one.
+    profile = None
+    if not tasks:
+        profile = np.zeros(language.DEFAULT_NGRAM_FEATURES, dtype=np.float64) if hashed else {}
+    processed_words = 0
+
+    # Counting in this process avoids the pool start-up cost for small jobs.
+    if workers is None or workers <= 1 or len(tasks) == 1:
+        results = (_count_chunk(task, hashed) for task in tasks)
+        for partial_profile, partial_words in results:
+            profile = merge_profiles(profile, partial_profile)
+            processed_words += partial_words
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_count_chunk, tasks, [hashed] * len(tasks))
+            for partial_profile, partial_words in results:
+                profile = merge_profiles(profile, partial_profile)
+                processed_words += partial_words
+
+    if not hashed:
+        profile = dict(sorted(profile.items(), key=lambda item: item[1], reverse=True))
+
+    return profile, processed_words, len(tasks)
+
+def merge_profiles(a, b):
+    """
+    Adds profile b to profile a. Either may be None.
+    Trigram dictionaries are merged by key; n-gram vectors element-wise.
+    Note that a is modified in place (and returned), to avoid copying
+    a large profile for every merged chunk.
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+
+    if isinstance(a, dict):
+        for trigram, count in b.items():
+            a[trigram] = a.get(trigram, 0) + count
+        return a
+
+    if len(a) != len(b):
+        raise ValueError(f'Cannot merge n-gram profiles of different sizes ({len(a)} and {len(b)}).')
+    a += b
+    return a
 
-def main(input_path: str, output_path: str, maximum_words_to_parse: int = 65536) -> None:
-    dummy_file = TextFile(input_path)
-    trigram_dictionary = invoke_trigram_analysis(dummy_file, maximum_words_to_parse)
-    json_trigrams = json.dumps(trigram_dictionary, ensure_ascii=False, indent=4)
-    
-    save_output(json_trigrams, output_path)
+def prune_profile(profile: dict[str, int], top_k: int) -> dict[str, int]:
+    """
+    Keeps only the top_k most common trigrams, sorted by occurrences.
+    """
+    sorted_profile = sorted(profile.items(), key=lambda item: item[1], reverse=True)
+    return dict(sorted_profile[:top_k])
+
+def load_profile(path: str):
+    """
+    Loads an existing trigram (.json) or n-gram (.npy) profile.
+    """
+    if path.lower().endswith('.npy'):
+        return np.load(path).astype(np.float64)
 
-def save_output(data: str, output_path: str) -> bool:
+    with open(path, 'r', encoding='utf-8') as f:
+        profile = json.load(f)
+    if not isinstance(profile, dict):
+        raise ValueError(f'{path} is not a trigram profile (expected a JSON object).')
+    return profile
+
+def save_output(data: str | bytes, output_path: str, confirmed: bool = False) -> bool:
     """
     Saves the data to the output path, handles overwriting confirmation,
     and prompts for a new path on error.
-    
+
+    If confirmed is True, an existing file is overwritten without asking.
+    When not attached to a terminal, nothing is ever asked - the save
+    simply fails instead.
+
     Returns:
         True on successful save, False otherwise.
     """
+    interactive = sys.stdin.isatty()
+
     while True:
         # Check if the file exists and prompt for overwrite
-        if os.path.exists(output_path):
+        if os.path.exists(output_path) and not confirmed:
+            if not interactive:
+                print(f"File '{output_path}' already exists. Re-run with --yes to overwrite it.")
+                return False
+
             response = input(f"File '{output_path}' already exists. Overwrite? (y/N) ").lower()
             if response != 'y':
                 print("Output cancelled by user. Please re-run with a different path.")
                 return False
 
         try:
-            # Attempt to save the data
-            with open(output_path, 'w') as f:
-                f.write(data)
+            # Attempt to save the data. Binary data (n-gram profiles) is written as-is.
+            if isinstance(data, bytes):
+                with open(output_path, 'wb') as f:
+                    f.write(data)
+            else:
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
             print(f"Successfully saved trigrams to: {output_path}")
             return True
-            
+
         except IOError as e:
             print(f"Error writing to {output_path}: {e}")
+            if not interactive:
+                return False
+
             new_path = input("Please enter a new output path to retry.\n> ")
-        
+
             # Update the path and loop to retry
             output_path = new_path
+            confirmed = False
         except Exception as e:
             # Catch other potential errors (e.g., permission denied)
             print(f"An unexpected error occurred: {e}")
             return False
 
+# helper functions
+def _find_text_files(inputs: list[str]) -> list[str]:
+    """
+    Expands directories into the .txt files (compressed or not, see
+    TEXT_FILE_PATTERNS) they contain (recursively). Files are passed through as-is.
+    """
+    paths = []
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            found = {path for pattern in TEXT_FILE_PATTERNS for path in Path(input_path).rglob(pattern)}
+            paths.extend(str(path) for path in sorted(found))
+        else:
+            paths.append(input_path)
+    return paths
+
+def _split_file(path: str, chunk_size: int | None) -> list[tuple[str, int, int]]:
+    """
+    Splits a file into (path, start, end) byte ranges of roughly chunk_size
+    bytes. Every range starts at the beginning of a line.
+    A chunk_size of None returns the whole file as a single range, as does
+    a compressed file, which can only be read from the beginning.
+    """
+    # Validates the path the same way the main program does.
+    if not os.path.exists(path):
+        raise FileNotFoundError(2, 'No such file', path)
+    text_file = TextFile(path)
+
+    size = os.path.getsize(path)
+    if chunk_size is None or text_file.compression is not None:
+        return [(path, 0, size)]
+
+    chunks = []
+    start = 0
+
+    with open(path, 'rb') as f:
+        while start < size:
+            end = start + chunk_size
+            if end < size:
+                # Move the boundary forward to the next line break.
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            else:
+                end = size
+            chunks.append((path, start, end))
+            start = end
+
+    return chunks
+
+def _count_chunk(task: tuple[str, int, int, int | None], hashed: bool) -> tuple:
+    """
+    Counts the features of a single byte range of a file, optionally
+    stopping after a maximum amount of words.
+    Top-level function so it can run in a worker process.
+
+    Returns:
+        Tuple of (partial profile, number of words)
+    """
+    path, start, end, maximum_words = task
+    lines = _read_lines_in_range(path, start, end)
+
+    if hashed:
+        # Words are counted as for trigrams (see count_word_boundary_trigrams), up to the limit.
+        return language.count_hashed_ngrams(lines, maximum_words=maximum_words, return_words=True)
+
+    trigrams = {}
+    processed_words = 0
+    for line in lines:
+        if maximum_words is not None and processed_words > maximum_words:
+            # We've reached our limit, abort.
+            break
+        processed_words += language.count_word_boundary_trigrams(line, trigrams)
+    return trigrams, processed_words
+
+def _read_lines_in_range(path: str, start: int, end: int):
+    """
+    Yields the decoded lines of a file which start between the byte offsets start and end
+    (see _split_file). Lines are decoded the same way the main program does, with the
+    fallback encoding for lines which aren't valid UTF-8 (see TextFile.read_lines).
+    """
+    text_file = TextFile(path)
+    if text_file.compression is not None or (start == 0 and end >= os.path.getsize(path)):
+        # The whole file, decompressed if need be.
+        yield from text_file.read_lines()
+        return
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            # Whole lines at a time. The range ends at the beginning of a line,
+            # so finishing the last line read never goes past it.
+            raw_block = f.read(min(_READ_SIZE, end - position))
+            if not raw_block:
+                break
+            if position + len(raw_block) < end:
+                raw_block += f.readline()
+            position += len(raw_block)
+            yield from io.StringIO(text_file.decode(raw_block), newline=None).readlines()
+
 if __name__ == '__main__':
-    if len(sys.argv) < 3 or len(sys.argv) > 4:
-        print("Usage: python3 trigram_sample_generator.py [input_path] [output_path] <maximum words>")
-        sys.exit(1)
-    
-    if(len(sys.argv) == 4):
-        main(sys.argv[1], sys.argv[2], sys.argv[3])
-    else:
-        main(sys.argv[1], sys.argv[2])
+    sys.exit(main(sys.argv[1:]))